@@ -0,0 +1,94 @@
+"""
+Benchmark the max flow stage of CommuterNetworkAnalyzer.run_analysis.
+
+Compares the original path (nx.maximum_flow, then edmonds_karp once more each for
+critical and bottleneck detection) with solving once via solve_max_flow, on
+synthetic networks of increasing size, and checks that all agree.
+
+Usage (from the repository root):
+    python -m benchmarks.network_flow
+    python -m benchmarks.network_flow --sizes 500:5000 3000:100000 --repeat 3
+"""
+import argparse
+import time
+from typing import Callable, List, Set, Tuple
+
+import networkx as nx
+
+from benchmarks.synthetic import make_commuter_network
+from citibike.networks.analysis import CommuterNetworkAnalyzer
+from citibike.networks.flow import solve_max_flow
+
+SUPER_SOURCE = "super_source"
+SUPER_SINK = "super_sink"
+
+
+def original_flow_stage(G: nx.DiGraph) -> Tuple[float, Set[str], Set[str]]:
+    """The flow work run_analysis did before solve_max_flow: three separate solves"""
+    flow_value, _ = nx.maximum_flow(G, SUPER_SOURCE, SUPER_SINK)
+    reach = []
+    for _ in range(2):
+        residual = nx.algorithms.flow.edmonds_karp(G, SUPER_SOURCE, SUPER_SINK)
+        positive_residual = residual.edge_subgraph([
+            (u, v) for u, v, data in residual.edges(data=True)
+            if data["capacity"] > data["flow"]
+        ])
+        reach.append((nx.descendants(positive_residual, SUPER_SOURCE), nx.ancestors(positive_residual, SUPER_SINK)))
+    return flow_value, reach[0][0], reach[1][1]
+
+
+def _time(fn: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _build_flow_network(hubs_df, edges_df) -> nx.DiGraph:
+    analyzer = CommuterNetworkAnalyzer.__new__(CommuterNetworkAnalyzer)  # no BigQuery client needed
+    analyzer.SUPER_SOURCE, analyzer.SUPER_SINK = SUPER_SOURCE, SUPER_SINK
+    analyzer.capacity_column = "capacity"
+    return analyzer._build_flow_network(hubs_df, edges_df)
+
+
+def run(sizes: List[Tuple[int, int]], repeat: int, skip_original_above: int) -> None:
+    print(f"{'stations':>8} {'edges':>8} {'original':>10} {'preflow':>10} {'scipy':>10} {'speedup':>8}  flow")
+    for num_stations, num_edges in sizes:
+        hubs_df, edges_df = make_commuter_network(num_stations, num_edges)
+        G = _build_flow_network(hubs_df, edges_df)
+
+        scipy_seconds, scipy_result = _time(lambda: solve_max_flow(G, SUPER_SOURCE, SUPER_SINK, "scipy"), repeat)
+        preflow_seconds, preflow_result = _time(lambda: solve_max_flow(G, SUPER_SOURCE, SUPER_SINK, "preflow_push"), repeat)
+        assert scipy_result.flow_value == preflow_result.flow_value
+        assert scipy_result.source_side == preflow_result.source_side
+        assert scipy_result.sink_side == preflow_result.sink_side
+
+        original = "skipped"
+        speedup = ""
+        if len(edges_df) <= skip_original_above:
+            original_seconds, (flow_value, source_side, sink_side) = _time(lambda: original_flow_stage(G), repeat)
+            assert flow_value == scipy_result.flow_value
+            assert source_side - {SUPER_SOURCE} == scipy_result.source_side - {SUPER_SOURCE}
+            assert sink_side - {SUPER_SINK} == scipy_result.sink_side - {SUPER_SINK}
+            original = f"{original_seconds:.3f}s"
+            speedup = f"{original_seconds / scipy_seconds:.0f}x"
+
+        print(f"{len(hubs_df):>8} {len(edges_df):>8} {original:>10} {preflow_seconds:>9.3f}s {scipy_seconds:>9.3f}s {speedup:>8}  {scipy_result.flow_value:g}")
+
+
+def _parse_size(value: str) -> Tuple[int, int]:
+    num_stations, num_edges = value.split(":")
+    return int(num_stations), int(num_edges)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=_parse_size, default=[(300, 2_000), (1_000, 20_000), (2_000, 100_000), (3_000, 300_000)],
+                        help="stations:edges pairs")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per measurement; the best is reported")
+    parser.add_argument("--skip-original-above", type=int, default=150_000,
+                        help="don't time the original path on networks with more edges than this")
+    args = parser.parse_args()
+    run(args.sizes, args.repeat, args.skip_original_above)
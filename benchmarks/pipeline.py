@@ -0,0 +1,234 @@
+"""
+Offline benchmark of trip ingestion and network analysis, with no S3 or BigQuery.
+
+Ingestion: synthetic trip month zips (legacy and current CSV layouts, including the
+nested yearly zips, with their month zips stored and deflated) are served from a
+LocalHTTPServer and run through download_trip_month and load_trip_month into an
+in-memory BigQuery stand-in, once per ingest configuration. Analysis: run_analysis on synthetic commuter networks.
+
+Every case runs in a fresh process, so its peak RSS is its own. Stage timings come
+from the pipeline's metrics spans (citibike.utils.metrics). Results are printed as a
+table; --output appends them as JSON lines to compare runs over time.
+
+Usage (from the repository root):
+    python -m benchmarks.pipeline
+    python -m benchmarks.pipeline ingestion --trip-rows 1000000 --years 2019 2024
+    python -m benchmarks.pipeline analysis --networks 1000:20000 --output bench.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import pyarrow as pa
+
+from benchmarks.synthetic import NESTED_ZIP_COMPRESSION, make_commuter_network, write_trip_month_zip
+from citibike.database.local_client import LocalBigQueryClient
+from citibike.networks.analysis import CommuterNetworkAnalyzer
+from citibike.networks.centrality import CentralityOptions
+from citibike.utils.local_http import LocalHTTPServer
+from citibike.utils.metrics import collect_spans
+
+# Ingest configurations compared at each scale: name -> TripIngestOptions arguments
+INGEST_CASES: Dict[str, Dict[str, Any]] = {
+    "pandas": {},
+    "pandas-chunked": {"max_chunk_mb": 64},
+    "arrow": {"engine": "arrow"},
+    "arrow-stream-zip": {"engine": "arrow", "stream_from_zip": True},
+    "arrow-parallel": {"engine": "arrow", "stream_from_zip": True, "max_workers": 2},
+}
+
+# Stages reported per ingestion case, in pipeline order
+INGEST_STAGES = [
+    "trip.download", "trip.extract", "trip.read_csv", "trip.validate_and_cast",
+    "trip.read_and_cast_arrow", "staging.load", "staging.merge",
+]
+
+
+class DiscardingBigQueryClient(LocalBigQueryClient):
+    """
+    LocalBigQueryClient that keeps staging tables but only counts the rows written to
+    other tables, so the loaded month doesn't count towards a case's peak memory.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rows_written: Counter = Counter()
+
+    def _write(self, table_id: str, table: pa.Table, append: bool) -> None:
+        if "_staging" not in table_id:
+            self.rows_written[table_id] += table.num_rows
+            table = table.slice(0, 0)
+        super()._write(table_id, table, append)
+
+
+def run_ingestion_case(base_url: str, year: int, month: int, options_kwargs: Dict[str, Any], work_dir: str) -> Dict[str, Any]:
+    """Worker process: download and load one synthetic month, and summarize its spans"""
+    os.environ.update(GCP_PROJECT_ID="benchmark", BQ_DATASET="benchmark", TRIP_DATA_URL=base_url)
+    os.environ.pop("PIPELINE_METRICS_FILE", None)
+    from citibike.ingestion.trips import TripIngestOptions, download_trip_month, load_trip_month
+    from citibike.utils.metrics import peak_rss_mb
+    from citibike.utils.storage import LocalStorage
+
+    options = TripIngestOptions(**options_kwargs)
+    storage = LocalStorage(work_dir)
+    client = DiscardingBigQueryClient()
+
+    _silence_stdout()
+    start = time.perf_counter()
+    with collect_spans() as spans:
+        downloader = download_trip_month(year, month, storage, options)
+        table_batch_keys = load_trip_month(year, month, downloader, client, storage, options)
+    seconds = time.perf_counter() - start
+    csv_bytes = sum(_csv_sizes(downloader))
+    storage.cleanup(downloader.get_all_files_for_cleanup())
+
+    rows = sum(client.rows_written[f"benchmark.benchmark.{table_name}"] for table_name in table_batch_keys)
+    return {
+        "seconds": seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds,
+        "csv_mb_per_second": csv_bytes / 1024 / 1024 / seconds,
+        # Of the case's own process: the parse workers of the parallel case aren't included
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": _stage_seconds(spans),
+    }
+
+
+def run_analysis_case(num_stations: int, num_edges: int, centrality_mode: str) -> Dict[str, Any]:
+    """Worker process: run_analysis on one synthetic network, and summarize its spans"""
+    os.environ.update(GCP_PROJECT_ID="benchmark", BQ_DATASET="benchmark")
+    from citibike.utils.metrics import peak_rss_mb
+
+    hubs_df, edges_df = make_commuter_network(num_stations, num_edges)
+    analyzer = CommuterNetworkAnalyzer(client=LocalBigQueryClient(), centrality_options=CentralityOptions(mode=centrality_mode))
+
+    _silence_stdout()
+    start = time.perf_counter()
+    with collect_spans() as spans:
+        results_df = analyzer.run_analysis(hubs_df, edges_df)
+    seconds = time.perf_counter() - start
+
+    return {
+        "seconds": seconds,
+        "stations": len(hubs_df),
+        "edges": len(edges_df),
+        "result_rows": len(results_df),
+        "edges_per_second": len(edges_df) / seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": _stage_seconds(spans),
+    }
+
+
+def run_ingestion(trip_rows: List[int], years: List[int], cases: List[str], files_per_month: int,
+                  nested_compressions: List[str]) -> List[Dict[str, Any]]:
+    results = []
+    data_dir = tempfile.mkdtemp(prefix="citibike-bench-")
+    try:
+        stage_columns = " ".join(f"{stage.split('.')[-1][:10]:>10}" for stage in INGEST_STAGES)
+        print(f"{'year':>4} {'rows':>9} {'nested':>8} {'case':<17} {'seconds':>8} {'rows/s':>9} {'MB/s':>6} {'peak MB':>8}  {stage_columns}")
+        for num_rows in trip_rows:
+            for year in years:
+                # Only the yearly zips before 2024 nest month zips
+                for nested_compression in (nested_compressions if year < 2024 else [None]):
+                    month_dir = os.path.join(data_dir, f"{year}-{num_rows}-{nested_compression}")
+                    write_trip_month_zip(month_dir, year, 1, num_rows, files_per_month, nested_compression=nested_compression or "stored")
+                    with LocalHTTPServer(month_dir) as server:
+                        for case in cases:
+                            work_dir = os.path.join(data_dir, "work")
+                            result = _in_fresh_process(run_ingestion_case, server.url, year, 1, INGEST_CASES[case], work_dir)
+                            shutil.rmtree(work_dir, ignore_errors=True)
+                            if result["rows"] != num_rows:
+                                raise AssertionError(f"{case} loaded {result['rows']} of {num_rows} rows for {year}")
+
+                            stages = " ".join(f"{result['stages'].get(stage, 0):>10.2f}" for stage in INGEST_STAGES)
+                            print(f"{year:>4} {num_rows:>9} {nested_compression or '-':>8} {case:<17} {result['seconds']:>8.2f} "
+                                  f"{result['rows_per_second']:>9.0f} {result['csv_mb_per_second']:>6.1f} {result['peak_rss_mb']:>8.0f}  {stages}")
+                            results.append({"benchmark": "ingestion", "year": year, "trip_rows": num_rows,
+                                            "nested_compression": nested_compression, "case": case, **result})
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def run_analysis(networks: List[Tuple[int, int]], centrality_mode: str) -> List[Dict[str, Any]]:
+    results = []
+    print(f"{'stations':>8} {'edges':>8} {'seconds':>8} {'edges/s':>9} {'peak MB':>8} {'max_flow':>9} {'centrality':>11}")
+    for num_stations, num_edges in networks:
+        result = _in_fresh_process(run_analysis_case, num_stations, num_edges, centrality_mode)
+        print(f"{result['stations']:>8} {result['edges']:>8} {result['seconds']:>8.2f} {result['edges_per_second']:>9.0f} "
+              f"{result['peak_rss_mb']:>8.0f} {result['stages'].get('network.max_flow', 0):>9.2f} "
+              f"{result['stages'].get('network.centrality', 0):>11.2f}")
+        results.append({"benchmark": "analysis", "centrality_mode": centrality_mode, **result})
+    return results
+
+
+def _in_fresh_process(fn, *args) -> Dict[str, Any]:
+    # spawn: the child starts with nothing allocated, so its peak RSS is the case's own
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def _silence_stdout() -> None:
+    """Send this process's stdout, and its children's, to /dev/null; results are returned, not printed"""
+    sys.stdout.flush()
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+def _stage_seconds(spans: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Total wall time per span name (stages running in worker processes aren't collected)"""
+    seconds: Counter = Counter()
+    for span_record in spans:
+        seconds[span_record["name"]] += span_record["wall_seconds"]
+    return dict(seconds)
+
+
+def _csv_sizes(downloader) -> List[int]:
+    if downloader.csv_files_created:
+        return [os.path.getsize(path) for path in downloader.csv_files_created]
+    sizes = []
+    for member in downloader.csv_members:
+        with member.open() as stream:
+            sizes.append(sum(len(block) for block in iter(lambda: stream.read(1 << 20), b"")))
+    return sizes
+
+
+def _parse_size(value: str) -> Tuple[int, int]:
+    num_stations, num_edges = value.split(":")
+    return int(num_stations), int(num_edges)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", nargs="?", choices=["all", "ingestion", "analysis"], default="all")
+    parser.add_argument("--trip-rows", nargs="+", type=int, default=[100_000, 500_000], help="trips per synthetic month")
+    parser.add_argument("--years", nargs="+", type=int, default=[2019, 2024],
+                        help="years to generate months for (before 2020: legacy layout; before 2024: nested yearly zip)")
+    parser.add_argument("--cases", nargs="+", choices=list(INGEST_CASES), default=list(INGEST_CASES), help="ingest configurations")
+    parser.add_argument("--nested-compression", nargs="+", choices=list(NESTED_ZIP_COMPRESSION), default=list(NESTED_ZIP_COMPRESSION),
+                        help="how the nested month zips of years before 2024 are compressed in their yearly zip")
+    parser.add_argument("--files-per-month", type=int, default=3, help="batch CSVs (_N files) per month")
+    parser.add_argument("--networks", nargs="+", type=_parse_size, default=[(300, 2_000), (1_000, 10_000), (2_000, 40_000)],
+                        help="stations:edges pairs")
+    parser.add_argument("--centrality-mode", choices=["exact", "approximate"], default="approximate")
+    parser.add_argument("--output", help="append results to this JSON lines file")
+    args = parser.parse_args()
+
+    results = []
+    if args.benchmark in ("all", "ingestion"):
+        results += run_ingestion(args.trip_rows, args.years, args.cases, args.files_per_month, args.nested_compression)
+    if args.benchmark in ("all", "analysis"):
+        results += run_analysis(args.networks, args.centrality_mode)
+
+    if args.output:
+        recorded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps({"recorded_at": recorded_at, **result}) + "\n")
@@ -0,0 +1,276 @@
+"""
+Synthetic inputs for the benchmarks, shaped like the pipeline's real tables.
+"""
+import calendar
+import hashlib
+import io
+import json
+import os
+import zipfile
+from typing import BinaryIO, Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from citibike.ingestion.borough_boundaries import prepare_boundary_rows
+from citibike.ingestion.csv_layouts import TRIP_CSV_LAYOUTS, TripCsvLayout
+
+BOROUGHS = ["Manhattan", "Brooklyn", "Queens", "Bronx"]
+
+# Stations trips are drawn from, and the share of trips that are docked e-bike rides
+# ending away from a station (blank end station in the current layout)
+TRIP_STATIONS = 2000
+UNDOCKED_TRIP_SHARE = 0.01
+
+# How a yearly zip can hold its nested month zips
+NESTED_ZIP_COMPRESSION = {"stored": zipfile.ZIP_STORED, "deflated": zipfile.ZIP_DEFLATED}
+
+
+def make_commuter_network(num_stations: int, num_edges: int, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (hubs_df, edges_df) with the columns of gold_commuter_hubs and gold_commuter_edges.
+
+    Edge endpoints are drawn with a skew towards low station indexes, so a few busy
+    hubs collect most of the trips like in the real network, and about one station
+    in ten only sends or only receives trips (the flow network's sources and sinks).
+    """
+    rng = np.random.default_rng(seed)
+    station_ids = np.array([f"{5000 + i // 10}.{i % 10:d}0" for i in range(num_stations)])
+
+    popularity = 1.0 / np.arange(1, num_stations + 1) ** 0.6
+    popularity /= popularity.sum()
+    starts = rng.choice(num_stations, size=num_edges, p=popularity)
+    ends = rng.choice(num_stations, size=num_edges, p=popularity)
+
+    # Pure sources never receive, pure sinks never send
+    role = rng.random(num_stations)
+    is_source, is_sink = role < 0.05, (role >= 0.05) & (role < 0.10)
+    keep = (starts != ends) & ~is_sink[starts] & ~is_source[ends]
+
+    edges_df = pd.DataFrame({
+        "start_station_id": station_ids[starts[keep]],
+        "end_station_id": station_ids[ends[keep]],
+    }).drop_duplicates(ignore_index=True)
+    edges_df["num_trips"] = rng.integers(1, 400, len(edges_df))
+    edges_df["avg_duration"] = rng.uniform(120, 3600, len(edges_df))
+    edges_df["distance_meters"] = rng.uniform(200, 8000, len(edges_df))
+
+    out_degree = edges_df.groupby("start_station_id").size()
+    in_degree = edges_df.groupby("end_station_id").size()
+    hubs_df = pd.DataFrame({
+        "station_id": station_ids,
+        "lat": rng.uniform(40.63, 40.88, num_stations),
+        "lon": rng.uniform(-74.03, -73.85, num_stations),
+        "name": [f"Station {i}" for i in range(num_stations)],
+        "borough": rng.choice(BOROUGHS, num_stations),
+        "capacity": rng.integers(10, 80, num_stations),
+    })
+    hubs_df["in_degree"] = hubs_df["station_id"].map(in_degree).fillna(0).astype(int)
+    hubs_df["out_degree"] = hubs_df["station_id"].map(out_degree).fillna(0).astype(int)
+    hubs_df["total_degree"] = hubs_df["in_degree"] + hubs_df["out_degree"]
+    weighted_out_degree = edges_df.groupby("start_station_id")["num_trips"].sum()
+    weighted_in_degree = edges_df.groupby("end_station_id")["num_trips"].sum()
+    hubs_df["weighted_in_degree"] = hubs_df["station_id"].map(weighted_in_degree).fillna(0).astype(int)
+    hubs_df["weighted_out_degree"] = hubs_df["station_id"].map(weighted_out_degree).fillna(0).astype(int)
+    hubs_df["weighted_total_degree"] = hubs_df["weighted_in_degree"] + hubs_df["weighted_out_degree"]
+
+    # gold_commuter_hubs only has stations with at least one edge
+    hubs_df = hubs_df[hubs_df["total_degree"] > 0].reset_index(drop=True)
+    return hubs_df, edges_df
+
+
+def trip_csv_layout(year: int, month: int) -> TripCsvLayout:
+    """The layout of TRIP_CSV_LAYOUTS Citibike published a month's CSVs in"""
+    layouts = {layout.name: layout for layout in TRIP_CSV_LAYOUTS}
+    if (year, month) >= (2021, 2):
+        return layouts["current"]
+    if (2016, 10) <= (year, month) <= (2017, 3):
+        return layouts["legacy_title_case"]
+    return layouts["legacy"]
+
+
+def make_trip_table(year: int, month: int, num_rows: int, seed: int = 0) -> pa.Table:
+    """
+    A month of trips with the header columns of that month's layout (see
+    trip_csv_layout), sorted by start time. Timestamps and the legacy \\N birth
+    years are strings formatted the way the Citibike files write them.
+    """
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, TRIP_STATIONS + 1) ** 0.6
+    popularity /= popularity.sum()
+    station_ids, station_names, station_lat, station_lng = _trip_stations(rng)
+    starts = rng.choice(TRIP_STATIONS, size=num_rows, p=popularity)
+    ends = rng.choice(TRIP_STATIONS, size=num_rows, p=popularity)
+
+    month_start = np.datetime64(f"{year:04d}-{month:02d}-01", "us")
+    month_seconds = calendar.monthrange(year, month)[1] * 24 * 3600
+    started_at = month_start + np.sort(rng.uniform(0, month_seconds * 1e6, num_rows)).astype("timedelta64[us]")
+    duration_seconds = np.clip(rng.lognormal(6.5, 0.7, num_rows), 60, 6 * 3600)
+    ended_at = started_at + (duration_seconds * 1e6).astype("timedelta64[us]")
+
+    layout = trip_csv_layout(year, month)
+    if layout.table_name == "raw_trips_legacy":
+        birth_year = rng.integers(1940, 2004, num_rows).astype(str).astype(object)
+        birth_year[rng.random(num_rows) < 0.01] = "\\N"
+        header_names = {schema_column: file_column for file_column, schema_column in layout.renamed_columns.items()}
+        table = pa.table({
+            "tripduration": duration_seconds.astype(int),
+            # Legacy timestamps carry four fractional digits: 2019-01-01 00:01:47.4010
+            "starttime": _format_timestamps(started_at, fraction_digits=4),
+            "stoptime": _format_timestamps(ended_at, fraction_digits=4),
+            "start station id": (starts + 72).astype(str),
+            "start station name": station_names[starts],
+            "start station latitude": station_lat[starts],
+            "start station longitude": station_lng[starts],
+            "end station id": (ends + 72).astype(str),
+            "end station name": station_names[ends],
+            "end station latitude": station_lat[ends],
+            "end station longitude": station_lng[ends],
+            "bikeid": rng.integers(14000, 40000, num_rows),
+            "usertype": rng.choice(["Subscriber", "Customer"], num_rows, p=[0.85, 0.15]),
+            "birth year": pa.array(birth_year, pa.string()),
+            "gender": rng.choice([0, 1, 2], num_rows, p=[0.1, 0.65, 0.25]),
+        })
+        return table.rename_columns([header_names.get(column, column) for column in table.column_names])
+
+    is_electric = rng.random(num_rows) < 0.4
+    undocked = is_electric & (rng.random(num_rows) < UNDOCKED_TRIP_SHARE / 0.4)
+    # E-bike positions are GPS fixes near the station, classic bikes report the dock
+    jitter = np.where(is_electric, 0.0005, 0.0)
+    return pa.table({
+        "ride_id": np.char.upper(np.char.mod("%016x", rng.integers(0, 2**63, num_rows))),
+        "rideable_type": np.where(is_electric, "electric_bike", "classic_bike"),
+        "started_at": _format_timestamps(started_at, fraction_digits=3),
+        "ended_at": _format_timestamps(ended_at, fraction_digits=3),
+        "start_station_name": station_names[starts],
+        "start_station_id": station_ids[starts],
+        "end_station_name": np.where(undocked, "", station_names[ends]),
+        "end_station_id": np.where(undocked, "", station_ids[ends]),
+        "start_lat": (station_lat[starts] + rng.normal(0, 1, num_rows) * jitter).round(6),
+        "start_lng": (station_lng[starts] + rng.normal(0, 1, num_rows) * jitter).round(6),
+        "end_lat": (station_lat[ends] + rng.normal(0, 1, num_rows) * jitter).round(6),
+        "end_lng": (station_lng[ends] + rng.normal(0, 1, num_rows) * jitter).round(6),
+        "member_casual": rng.choice(["member", "casual"], num_rows, p=[0.8, 0.2]),
+    })
+
+
+def make_station_rows(ingested_at: pd.Timestamp, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (raw_stations, raw_station_fingerprints) rows for a GBFS snapshot of the stations
+    make_trip_table draws trips from (same seed): short_name is the current layout's
+    station id and name the legacy layout's station name, so trips of both join.
+    """
+    rng = np.random.default_rng(seed)
+    station_ids, station_names, station_lat, station_lng = _trip_stations(rng)
+    capacity = np.random.default_rng(seed + 1).integers(10, 80, TRIP_STATIONS)
+    gbfs_ids = [f"synthetic-{i:05d}" for i in range(TRIP_STATIONS)]
+    station_data = [
+        json.dumps({
+            "station_id": gbfs_ids[i],
+            "short_name": station_ids[i],
+            "name": station_names[i],
+            "region_id": "71",
+            "lat": float(station_lat[i]),
+            "lon": float(station_lng[i]),
+            "capacity": int(capacity[i]),
+            "station_type": "classic",
+            "has_kiosk": True,
+        })
+        for i in range(TRIP_STATIONS)
+    ]
+    stations_df = pd.DataFrame({
+        "station_id": gbfs_ids,
+        "station_data": station_data,
+        "api_last_updated": ingested_at,
+        "api_version": "2.3",
+        "_ingested_at": ingested_at,
+    })
+    fingerprints_df = pd.DataFrame({
+        "station_id": gbfs_ids,
+        "fingerprint": [hashlib.sha256(data.encode()).hexdigest() for data in station_data],
+        "last_changed_at": ingested_at,
+    })
+    return stations_df, fingerprints_df
+
+
+def make_borough_boundary_rows(ingested_at: pd.Timestamp) -> pd.DataFrame:
+    """
+    raw_nyc_borough_boundaries rows splitting the area stations are drawn from into one
+    rectangle per BOROUGHS entry (quadrants), as GeoJSON features
+    """
+    lat_bounds, lng_bounds = (40.6, 40.755, 40.9), (-74.05, -73.94, -73.8)
+    features = []
+    for code, name in enumerate(BOROUGHS, start=1):
+        lat_0, lat_1 = lat_bounds[(code - 1) // 2], lat_bounds[(code - 1) // 2 + 1]
+        lng_0, lng_1 = lng_bounds[(code - 1) % 2], lng_bounds[(code - 1) % 2 + 1]
+        ring = [[lng_0, lat_0], [lng_1, lat_0], [lng_1, lat_1], [lng_0, lat_1], [lng_0, lat_0]]
+        feature = {
+            "type": "Feature",
+            "properties": {"BoroCode": code, "BoroName": name},
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+        }
+        features.append(feature)
+    return pd.DataFrame(prepare_boundary_rows(features, ingested_at))
+
+
+def write_trip_month_zip(directory: str, year: int, month: int, num_rows: int, num_files: int = 3, seed: int = 0,
+                         nested_compression: str = "deflated") -> str:
+    """
+    Write a synthetic month of trips as the zip the Citibike bucket serves for it, and
+    return its path. The month is split into batch CSVs named YYYYMM-citibike-tripdata_N.csv.
+
+    From 2024 the CSVs sit directly in YYYYMM-citibike-tripdata.zip; before that the
+    year's zip (YYYY-citibike-tripdata.zip) holds one nested YYYYMM zip per month,
+    compressed with nested_compression (one of NESTED_ZIP_COMPRESSION): deflated like
+    the real yearly archives, or stored, which streaming reads in place.
+    """
+    trips = make_trip_table(year, month, num_rows, seed)
+    # Legacy files quote every string value; current ones quote nothing
+    is_legacy = trip_csv_layout(year, month).table_name == "raw_trips_legacy"
+    write_options = pa_csv.WriteOptions(quoting_style="needed" if is_legacy else "none")
+    prefix = f"{year:04d}{month:02d}-citibike-tripdata"
+
+    csv_files = {}
+    bounds = np.linspace(0, num_rows, num_files + 1).astype(int)
+    for batch_number, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]), start=1):
+        buffer = io.BytesIO()
+        pa_csv.write_csv(trips.slice(start, end - start), buffer, write_options)
+        csv_files[f"{prefix}_{batch_number}.csv"] = buffer.getvalue()
+
+    os.makedirs(directory, exist_ok=True)
+    if year >= 2024:
+        zip_path = os.path.join(directory, f"{prefix}.zip")
+        _write_zip(zip_path, csv_files)
+        return zip_path
+
+    month_zip = io.BytesIO()
+    _write_zip(month_zip, csv_files)
+    zip_path = os.path.join(directory, f"{year:04d}-citibike-tripdata.zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr(f"{year:04d}-citibike-tripdata/{prefix}.zip", month_zip.getvalue(),
+                         compress_type=NESTED_ZIP_COMPRESSION[nested_compression], compresslevel=1)
+    return zip_path
+
+
+def _trip_stations(rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(station ids, names, latitudes, longitudes) of the synthetic trip stations; the first draws from rng"""
+    station_ids = np.array([f"{5000 + i // 10}.{i % 10:d}0" for i in range(TRIP_STATIONS)])
+    station_names = np.array([f"Station {i}" for i in range(TRIP_STATIONS)])
+    station_lat = rng.uniform(40.63, 40.88, TRIP_STATIONS).round(6)
+    station_lng = rng.uniform(-74.03, -73.85, TRIP_STATIONS).round(6)
+    return station_ids, station_names, station_lat, station_lng
+
+
+def _format_timestamps(values: np.ndarray, fraction_digits: int) -> pa.Array:
+    """Microsecond timestamps as "YYYY-MM-DD HH:MM:SS.ffffff" strings, cut to fraction_digits"""
+    formatted = pa.array(values, pa.timestamp("us")).cast(pa.string())
+    return pc.utf8_slice_codeunits(formatted, 0, 20 + fraction_digits)
+
+
+def _write_zip(target: Union[str, BinaryIO], files: Dict[str, bytes]) -> None:
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
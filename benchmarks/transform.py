@@ -0,0 +1,127 @@
+"""
+Offline run of the dbt silver and gold models on the local DuckDB target, timed per model.
+
+A synthetic month of trips goes through download_trip_month and load_trip_month into a
+LocalBigQueryClient, together with synthetic stations and borough boundaries. Its raw
+tables are written as the Parquet files the `local` dbt target reads
+(citibike.dbt.local.write_local_sources), and the dashboard models and the commuter
+network models are built on DuckDB. Model timings come from dbt's run_results.json.
+
+--compare-target runs the same dbt commands on another target too (e.g. dev, on
+BigQuery, over whatever its dataset holds for the month), for a side-by-side of model
+timings. Needs dbt-duckdb (and dbt-bigquery for a BigQuery target).
+
+Usage (from the repository root):
+    python -m benchmarks.transform
+    python -m benchmarks.transform --year 2019 --month 6 --trip-rows 2000000
+    python -m benchmarks.transform --year 2024 --month 5 --compare-target dev --output bench.jsonl
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from benchmarks.synthetic import make_borough_boundary_rows, make_station_rows, write_trip_month_zip
+from citibike.database.local_client import LocalBigQueryClient
+from citibike.dbt import run_dbt_command
+from citibike.dbt.local import write_local_sources
+from citibike.utils.local_http import LocalHTTPServer
+
+# dbt runs of one transformation, in order: the same selection as run_transform_data,
+# then the commuter network models the network flow analysis reads
+DBT_RUNS = [
+    ["seed"],
+    ["run", "--selector", "dashboard_models"],
+    ["run", "--select", "gold_commuter_edges", "gold_commuter_hubs"],
+]
+
+
+def load_synthetic_month(year: int, month: int, num_rows: int, files_per_month: int, data_dir: str) -> LocalBigQueryClient:
+    """Load a synthetic month of trips, a station snapshot and borough boundaries into a LocalBigQueryClient"""
+    os.environ.update(GCP_PROJECT_ID="benchmark", BQ_DATASET="benchmark")
+    from citibike.ingestion.trips import TripIngestOptions, download_trip_month, load_trip_month
+    from citibike.utils.storage import LocalStorage
+
+    client = LocalBigQueryClient()
+    month_dir = os.path.join(data_dir, "zips")
+    write_trip_month_zip(month_dir, year, month, num_rows, files_per_month)
+    storage = LocalStorage(os.path.join(data_dir, "work"))
+    options = TripIngestOptions(engine="arrow", stream_from_zip=True)
+    with LocalHTTPServer(month_dir) as server:
+        os.environ["TRIP_DATA_URL"] = server.url
+        downloader = download_trip_month(year, month, storage, options)
+        load_trip_month(year, month, downloader, client, storage, options)
+    storage.cleanup(downloader.get_all_files_for_cleanup())
+
+    ingested_at = pd.Timestamp(year=year, month=month, day=1) + pd.offsets.MonthEnd(1)
+    stations_df, fingerprints_df = make_station_rows(ingested_at)
+    client.load_table_from_dataframe(stations_df, "benchmark.benchmark.raw_stations")
+    client.load_table_from_dataframe(fingerprints_df, "benchmark.benchmark.raw_station_fingerprints")
+    client.load_table_from_dataframe(make_borough_boundary_rows(ingested_at.tz_localize("UTC")), "benchmark.benchmark.raw_nyc_borough_boundaries")
+    return client
+
+
+def run_transformation(target: str, month_key: str, target_path: str) -> Dict[str, Any]:
+    """Run DBT_RUNS on a dbt target; returns the total wall time and each model's execution time"""
+    dbt_vars = json.dumps({"month_key": month_key})
+    model_seconds: Dict[str, float] = {}
+    start = time.perf_counter()
+    for dbt_args in DBT_RUNS:
+        run_dbt_command(["dbt", "--quiet", *dbt_args, "--target", target, "--target-path", target_path, "--vars", dbt_vars])
+        with open(os.path.join(target_path, "run_results.json")) as f:
+            for result in json.load(f)["results"]:
+                model_seconds[result["unique_id"].split(".")[-1]] = result["execution_time"]
+    return {"seconds": time.perf_counter() - start, "models": model_seconds}
+
+
+def run(year: int, month: int, num_rows: int, files_per_month: int, targets: List[str]) -> List[Dict[str, Any]]:
+    month_key = f"{year:04d}-{month:02d}"
+    work_dir = tempfile.mkdtemp(prefix="citibike-transform-")
+    try:
+        start = time.perf_counter()
+        client = load_synthetic_month(year, month, num_rows, files_per_month, work_dir)
+        parquet_dir = os.path.join(work_dir, "raw")
+        write_local_sources(client, parquet_dir)
+        del client
+        print(f"Loaded {num_rows} synthetic trips for {month_key} in {time.perf_counter() - start:.1f}s")
+
+        os.environ.update(LOCAL_PARQUET_DIR=parquet_dir, DUCKDB_PATH=os.path.join(work_dir, "citibike.duckdb"))
+        results = [
+            {"benchmark": "transform", "target": target, "month_key": month_key, "trip_rows": num_rows,
+             **run_transformation(target, month_key, os.path.join(work_dir, f"target-{target}"))}
+            for target in targets
+        ]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    models = list(dict.fromkeys(model for result in results for model in result["models"]))
+    print(f"{'model':<40} " + " ".join(f"{result['target']:>10}" for result in results))
+    for model in models:
+        print(f"{model:<40} " + " ".join(f"{result['models'].get(model, float('nan')):>10.2f}" for result in results))
+    print(f"{'total (wall)':<40} " + " ".join(f"{result['seconds']:>10.2f}" for result in results))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--month", type=int, default=1)
+    parser.add_argument("--trip-rows", type=int, default=500_000, help="trips in the synthetic month")
+    parser.add_argument("--files-per-month", type=int, default=3, help="batch CSVs (_N files) per month")
+    parser.add_argument("--compare-target", help="dbt target to also run and time, e.g. dev")
+    parser.add_argument("--output", help="append results to this JSON lines file")
+    args = parser.parse_args()
+
+    targets = ["local"] + ([args.compare_target] if args.compare_target else [])
+    results = run(args.year, args.month, args.trip_rows, args.files_per_month, targets)
+
+    if args.output:
+        recorded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps({"recorded_at": recorded_at, **result}) + "\n")
@@ -1,6 +1,24 @@
 import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import bigquery
 from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
+
+# Connections kept per host by the shared HTTP session (requests' default is 10).
+# Parallel loaders need at least one per worker thread; BQ_HTTP_POOL_SIZE overrides it.
+# The pool is sized once, when a process's client is created.
+DEFAULT_HTTP_POOL_SIZE = 10
+
+# Process-wide registry: one set of credentials per key file, one client per
+# (project, key file), so every task and loader in a process reuses warm connections
+# and a single access token
+_REGISTRY_LOCK = threading.Lock()
+_CREDENTIALS: Dict[str, service_account.Credentials] = {}
+_CLIENTS: Dict[Tuple[str, str], bigquery.Client] = {}
+_POOL_SIZES: Dict[Tuple[str, str], int] = {}
 
 def initialize_bigquery_client(validate_connection: bool = False) -> bigquery.Client:
     """Initialize BigQuery client using environment variables
@@ -33,4 +51,51 @@ def initialize_bigquery_client(validate_connection: bool = False) -> bigquery.Cl
         except Exception as e:
             raise Exception(f"BigQuery connection validation failed: {e}")
     
-    return client
\ No newline at end of file
+    return client
+
+def get_bigquery_client(pool_size: Optional[int] = None) -> bigquery.Client:
+    """Shared BigQuery client for this process, built on first use from the same
+    environment variables as initialize_bigquery_client
+
+    The client sends its requests through an AuthorizedSession built here, with its
+    connection pool mounted before the session is handed to bigquery.Client through
+    the private _http argument (google-cloud-bigquery has no public way to size its
+    pool). The session is never remounted afterwards, since other threads may be
+    using it.
+
+    Args:
+        pool_size: Minimum HTTP connections the client should keep (e.g. the number
+            of threads that will use it). Only the call creating the client sizes the
+            pool; later calls asking for more get a warning, and their extra
+            connections are opened per request instead of reused.
+
+    Returns:
+        bigquery.Client: The process-wide client for GCP_PROJECT_ID
+    """
+    project_id = os.environ['GCP_PROJECT_ID']
+    credentials_path = os.environ['GOOGLE_APPLICATION_CREDENTIALS']
+    key = (project_id, credentials_path)
+    pool_size = max(pool_size or 0, int(os.environ.get("BQ_HTTP_POOL_SIZE", DEFAULT_HTTP_POOL_SIZE)))
+
+    with _REGISTRY_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            session = AuthorizedSession(_shared_credentials(credentials_path))
+            session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+            client = bigquery.Client(project=project_id, credentials=session.credentials, _http=session)
+            _CLIENTS[key] = client
+            _POOL_SIZES[key] = pool_size
+        elif pool_size > _POOL_SIZES[key]:
+            print(f"BigQuery client already created with {_POOL_SIZES[key]} pooled connections; "
+                  f"{pool_size} requested (set BQ_HTTP_POOL_SIZE to size the pool up front)")
+
+        return client
+
+def _shared_credentials(credentials_path: str) -> service_account.Credentials:
+    """Scoped credentials for a key file, read once; every client using them shares one
+    access token, refreshed by whichever request finds it expired. Call with the lock held."""
+    credentials = _CREDENTIALS.get(credentials_path)
+    if credentials is None:
+        credentials = service_account.Credentials.from_service_account_file(credentials_path, scopes=bigquery.Client.SCOPE)
+        _CREDENTIALS[credentials_path] = credentials
+    return credentials
@@ -0,0 +1,264 @@
+import re
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, BinaryIO, Dict, Optional, Sequence, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from citibike.database.staging import batch_key_to_date
+
+# Batch filters StagingTableLoader generates: DATE(col) = DATE(@p) or col = DATE(@p)
+_BATCH_PREDICATE = r"(?:DATE\((?P<alias>\w+\.)?(?P<column>[^)]+)\)|(?:\w+\.)?(?P<date_column>\w+))\s*=\s*DATE\(@(?P<param>\w+)\)"
+_DELETE_BATCH_SQL = re.compile(
+    r"DELETE\s+FROM\s+`(?P<table>[^`]+)`\s+WHERE\s+" + _BATCH_PREDICATE,
+    re.IGNORECASE,
+)
+_INSERT_SELECT_SQL = re.compile(
+    r"INSERT\s+INTO\s+`(?P<target>[^`]+)`\s*(?:\((?P<columns>[^)]*)\))?\s*SELECT\s+.*?\s+FROM\s+`(?P<source>[^`]+)`",
+    re.IGNORECASE | re.DOTALL,
+)
+_MERGE_REPLACE_SQL = re.compile(
+    r"MERGE\s+`(?P<target>[^`]+)`\s+\w+\s+USING\s+`(?P<source>[^`]+)`\s+\w+\s+ON\s+FALSE\s+"
+    r"WHEN\s+NOT\s+MATCHED\s+BY\s+SOURCE\s+AND\s+" + _BATCH_PREDICATE + r"\s+THEN\s+DELETE\s+"
+    r"WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s+(?:ROW|\((?P<columns>[^)]*)\)\s+VALUES\s+\([^)]*\))",
+    re.IGNORECASE,
+)
+
+
+class LocalJob:
+    """Completed job returned by LocalBigQueryClient; mirrors the parts of a BigQuery job we read"""
+
+    def __init__(self, job_type: str, destination: Optional[str] = None, rows: int = 0):
+        self.job_id = f"local_{job_type}_{uuid.uuid4().hex[:12]}"
+        self.job_type = job_type
+        self.destination = destination
+        self.state = "DONE"
+        self.output_rows = rows
+        self.num_dml_affected_rows = rows
+
+    def result(self) -> "LocalJob":
+        return self
+
+
+class LocalTable:
+    """Table metadata returned by LocalBigQueryClient.get_table; mirrors the parts of bigquery.Table we read"""
+
+    def __init__(self, table_id: str, table: pa.Table, modified: datetime):
+        self.table_id = table_id
+        self.schema = [bigquery.SchemaField(field.name, _bigquery_type(field.type)) for field in table.schema]
+        self.modified = modified
+        self.num_rows = table.num_rows
+
+
+class LocalRowIterator:
+    """Rows returned by LocalBigQueryClient.list_rows"""
+
+    def __init__(self, table: pa.Table):
+        self._table = table
+
+    def to_arrow(self, **kwargs) -> pa.Table:
+        return self._table
+
+    def to_dataframe(self, **kwargs) -> pd.DataFrame:
+        return self._table.to_pandas()
+
+
+class LocalBigQueryClient:
+    """
+    In-memory stand-in for bigquery.Client, for running the loaders offline.
+
+    Tables are arrow tables keyed by table id. It supports load jobs from
+    dataframes and Parquet files (with WRITE_TRUNCATE / WRITE_TRUNCATE_DATA /
+    WRITE_APPEND), table copies (including into a daily partition), table
+    metadata and row reads (get_table / list_rows), and exactly the SQL
+    statements StagingTableLoader issues; any other query raises
+    NotImplementedError.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, pa.Table] = {}
+        self.modified: Dict[str, datetime] = {}
+        self.jobs: list[LocalJob] = []
+
+    def table(self, table_id: str) -> pa.Table:
+        """Current contents of a table"""
+        return self.tables[table_id]
+
+    def load_table_from_dataframe(self, dataframe: pd.DataFrame, destination: str, job_config: Optional[bigquery.LoadJobConfig] = None) -> LocalJob:
+        return self._load(pa.Table.from_pandas(dataframe, preserve_index=False), destination, job_config)
+
+    def load_table_from_file(self, file_obj: BinaryIO, destination: str, job_config: Optional[bigquery.LoadJobConfig] = None) -> LocalJob:
+        if job_config is not None and job_config.source_format not in (None, bigquery.SourceFormat.PARQUET):
+            raise NotImplementedError(f"LocalBigQueryClient only loads Parquet files, got {job_config.source_format}")
+        return self._load(pq.read_table(file_obj), destination, job_config)
+
+    def get_table(self, table: str) -> LocalTable:
+        if table not in self.tables:
+            raise NotFound(f"Table {table} not found")
+        return LocalTable(table, self.tables[table], self.modified[table])
+
+    def list_rows(self, table: Union[str, LocalTable], selected_fields: Optional[Sequence[bigquery.SchemaField]] = None) -> LocalRowIterator:
+        table_id = table if isinstance(table, str) else table.table_id
+        if table_id not in self.tables:
+            raise NotFound(f"Table {table_id} not found")
+        rows = self.tables[table_id]
+        if selected_fields is not None:
+            rows = rows.select([field.name for field in selected_fields])
+        return LocalRowIterator(rows)
+
+    def delete_table(self, table: str, not_found_ok: bool = False) -> None:
+        if table not in self.tables and not not_found_ok:
+            raise KeyError(f"Table {table} not found")
+        self.tables.pop(table, None)
+        self.modified.pop(table, None)
+
+    def query(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> LocalJob:
+        params = self._query_params(job_config)
+
+        delete_match = _DELETE_BATCH_SQL.search(query)
+        if delete_match:
+            table_id = delete_match["table"]
+            deleted = self._delete_batch(table_id, delete_match, params)
+            return self._record(LocalJob("query", table_id, deleted))
+
+        merge_match = _MERGE_REPLACE_SQL.search(query)
+        if merge_match:
+            target = merge_match["target"]
+            deleted = self._delete_batch(target, merge_match, params)
+            source = _select_columns(self.tables[merge_match["source"]], merge_match["columns"])
+            self._write(target, source, append=True)
+            return self._record(LocalJob("query", target, deleted + source.num_rows))
+
+        insert_match = _INSERT_SELECT_SQL.search(query)
+        if insert_match:
+            source = _select_columns(self.tables[insert_match["source"]], insert_match["columns"])
+            self._write(insert_match["target"], source, append=True)
+            return self._record(LocalJob("query", insert_match["target"], source.num_rows))
+
+        raise NotImplementedError(f"LocalBigQueryClient does not support this query: {query.strip()}")
+
+    def copy_table(self, sources: str, destination: str, job_config: Optional[bigquery.CopyJobConfig] = None) -> LocalJob:
+        """
+        Copy a table. A "table$YYYYMMDD" destination replaces that daily partition
+        (WRITE_TRUNCATE) or appends to it, as with load jobs.
+        """
+        source = self.tables[sources]
+        disposition = job_config.write_disposition if job_config is not None else None
+        table_id = self._write_destination(destination, source, disposition)
+        return self._record(LocalJob("copy", table_id, source.num_rows))
+
+    def _delete_batch(self, table_id: str, predicate: re.Match, params: Dict[str, Any]) -> int:
+        """Delete the rows selected by a batch predicate match; returns the number of rows deleted"""
+        table = self.tables.get(table_id)
+        if table is None:
+            return 0
+
+        column = (predicate["column"] or predicate["date_column"]).strip()
+        target_date = _to_date(params[predicate["param"]])
+        row_dates = [_to_date(value) for value in table.column(column).to_pylist()]
+        self.tables[table_id] = table.filter(pa.array([row_date != target_date for row_date in row_dates], pa.bool_()))
+        self.modified[table_id] = datetime.now(timezone.utc)
+        return table.num_rows - self.tables[table_id].num_rows
+
+    def _load(self, table: pa.Table, destination: str, job_config: Optional[bigquery.LoadJobConfig]) -> LocalJob:
+        disposition = job_config.write_disposition if job_config is not None else None
+        table_id = self._write_destination(destination, table, disposition)
+        return self._record(LocalJob("load", table_id, table.num_rows))
+
+    def _write_destination(self, destination: str, table: pa.Table, disposition: Optional[str]) -> str:
+        """
+        Write a copy or load job's rows. A "table$YYYYMMDD" destination replaces that
+        daily partition (WRITE_TRUNCATE) or appends to it; the partition column is
+        taken to be the first DATE column of the rows. Returns the table id written.
+        """
+        table_id, _, partition_id = destination.partition("$")
+
+        if partition_id and disposition == bigquery.WriteDisposition.WRITE_TRUNCATE:
+            table = _normalize(table)
+            partition_date = datetime.strptime(partition_id, "%Y%m%d").date()
+            column = next(field.name for field in table.schema if pa.types.is_date(field.type))
+            existing = self.tables.get(table_id)
+            if existing is not None:
+                self.tables[table_id] = existing.filter(pc.not_equal(existing.column(column), pa.scalar(partition_date, pa.date32())))
+            self._write(table_id, table, append=True)
+        else:
+            self._write(table_id, table, append=disposition == bigquery.WriteDisposition.WRITE_APPEND)
+
+        return table_id
+
+    def _write(self, table_id: str, table: pa.Table, append: bool) -> None:
+        table = _normalize(table)
+        existing = self.tables.get(table_id)
+        if append and existing is not None:
+            # Columns are matched by name; ones the rows lack are filled with nulls,
+            # and ones the table lacks fail, as in BigQuery
+            unknown = [name for name in table.column_names if name not in existing.column_names]
+            if unknown:
+                raise ValueError(f"No such field: {', '.join(unknown)} in {table_id}")
+            columns = [
+                table.column(field.name) if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+                for field in existing.schema
+            ]
+            table = pa.concat_tables([existing, pa.Table.from_arrays(columns, names=existing.column_names).cast(existing.schema)])
+        self.tables[table_id] = table
+        self.modified[table_id] = datetime.now(timezone.utc)
+
+    def _record(self, job: LocalJob) -> LocalJob:
+        self.jobs.append(job)
+        return job
+
+    @staticmethod
+    def _query_params(job_config: Optional[bigquery.QueryJobConfig]) -> Dict[str, Any]:
+        if job_config is None:
+            return {}
+        return {param.name: param.value for param in job_config.query_parameters}
+
+
+def _select_columns(table: pa.Table, column_list: Optional[str]) -> pa.Table:
+    """The columns of an INSERT column list, like "(`a`, `b c`)", or every column without one"""
+    if column_list is None:
+        return table
+    return table.select([column.strip().strip("`") for column in column_list.split(",")])
+
+
+def _normalize(table: pa.Table) -> pa.Table:
+    """Store columns the way BigQuery would: plain strings and microsecond timestamps"""
+    columns = []
+    for column in table.columns:
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        elif pa.types.is_timestamp(column.type) and column.type.unit != "us":
+            column = pc.cast(column, pa.timestamp("us", column.type.tz), safe=False)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def _bigquery_type(arrow_type: pa.DataType) -> str:
+    """BigQuery column type a load job would give an arrow column"""
+    if pa.types.is_boolean(arrow_type):
+        return "BOOL"
+    if pa.types.is_integer(arrow_type):
+        return "INT64"
+    if pa.types.is_floating(arrow_type):
+        return "FLOAT64"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMP"
+    return "STRING"
+
+
+def _to_date(value: Any) -> Optional[date]:
+    """Python equivalent of BigQuery DATE() over the batch key values we store"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return batch_key_to_date(str(value))
@@ -1,73 +1,500 @@
+import io
+import os
+import re
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import Future, ThreadPoolExecutor, wait as futures_wait
+from datetime import date
+from typing import Iterable, List, Optional, Tuple, Union
 from google.cloud import bigquery
 
+from citibike.utils.metrics import record, span
+from citibike.utils.storage import StorageLocation
+
+# A batch can be handed to the loader as a pandas DataFrame or an arrow table
+BatchData = Union[pd.DataFrame, pa.Table]
+
+# Parquet layout of spill files: zstd compresses trip data well and decodes fast,
+# and ~1M-row row groups keep the writer's buffered memory bounded
+DEFAULT_PARQUET_COMPRESSION = "zstd"
+DEFAULT_PARQUET_ROW_GROUP_SIZE = 1_000_000
+
+# How a batch in staging replaces the same batch in the main table:
+# "delete_insert": DELETE the batch, then INSERT ... SELECT * from staging (two query jobs);
+#     the batch is found by DATE(batch_key_column), so it works on any table
+# "merge": one atomic MERGE that deletes the old batch rows and inserts the staged ones;
+#     with a partition_column, the batch is found (and pruned) by it
+# "partition_overwrite": copy staging over the batch's daily partition with WRITE_TRUNCATE
+#     (a copy job: atomic, and scans no bytes); needs partition_column
+REPLACE_STRATEGIES = ("delete_insert", "merge", "partition_overwrite")
+
+_BATCH_KEY_DATE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})")
+
 class StagingTableLoader:
     """
     Loads a dataframe to a staging table in big query,
     and then merges the staging data into the main table.
+
+    If spill_storage is given, each batch is first written to a compressed Parquet
+    spill file in that storage and loaded with a single load job. The load and merge
+    run on a background thread (one batch at a time, in submission order), so the
+    caller can parse the next batch meanwhile; call wait_for_loads() before relying
+    on the main table. A spill file is only removed once its batch has merged, so a
+    failed batch can be retried with load_and_merge_spill_file without re-reading
+    the source data.
+
+    If partition_column is given, the loader fills that DATE column with
+    DATE(batch_key_value) on every row, and the merge and partition_overwrite
+    strategies replace the batch by it, so when the main table is partitioned on
+    that column they only touch the batch's own partition (see REPLACE_STRATEGIES).
+    delete_insert keeps filtering on the batch key.
+
+    If column_order is given (the main table's columns, in its DDL order), every
+    batch is reordered to it before it is loaded or spilled, whatever path or
+    engine produced it, and the replace statements name these columns instead of
+    relying on their position, so every path writes the same row layout.
     """
-    def __init__(self, client: bigquery.Client, main_table_id: str, batch_key_column: str, staging_table_suffix: str = "_staging"):
+    def __init__(self,
+                 client: bigquery.Client,
+                 main_table_id: str,
+                 batch_key_column: str,
+                 staging_table_suffix: str = "_staging",
+                 spill_storage: Optional[StorageLocation] = None,
+                 parquet_compression: str = DEFAULT_PARQUET_COMPRESSION,
+                 parquet_row_group_size: int = DEFAULT_PARQUET_ROW_GROUP_SIZE,
+                 replace_strategy: str = "delete_insert",
+                 partition_column: Optional[str] = None,
+                 column_order: Optional[List[str]] = None):
+        if replace_strategy not in REPLACE_STRATEGIES:
+            raise ValueError(f"Unknown replace strategy {replace_strategy!r}; expected one of {REPLACE_STRATEGIES}")
+        if replace_strategy == "partition_overwrite" and not partition_column:
+            raise ValueError("The partition_overwrite replace strategy needs a partition_column")
+
         self.client = client
         self.main_table_id = main_table_id
         self.staging_table_id = f"{main_table_id}{staging_table_suffix}"
         self.batch_key_column = batch_key_column
+        self.spill_storage = spill_storage
+        self.parquet_compression = parquet_compression
+        self.parquet_row_group_size = parquet_row_group_size
+        self.replace_strategy = replace_strategy
+        self.partition_column = partition_column
+        self.column_order = column_order
+        self._load_executor: Optional[ThreadPoolExecutor] = None
+        self._pending_loads: List[Tuple[str, str, Future]] = []  # (batch_key_value, spill_path, future)
     
     def load_and_merge_df(self, df: pd.DataFrame, batch_key_value: str) -> None:
+        df = self.prepare_batch(df, batch_key_value)
+        if self.spill_storage:
+            self._spill_and_submit([df], batch_key_value)
+            return
+
         self._load_df_to_staging(df)
         self._merge_staging_to_main(batch_key_value)
+
+    def load_and_merge_table(self, table: pa.Table, batch_key_value: str) -> None:
+        """Same as load_and_merge_df, for an arrow table (loaded as Parquet, without converting to pandas)"""
+        table = self.prepare_batch(table, batch_key_value)
+        if self.spill_storage:
+            self._spill_and_submit([table], batch_key_value)
+            return
+
+        self._load_arrow_to_staging(table)
+        self._merge_staging_to_main(batch_key_value)
+
+    def load_and_merge_chunks(self, chunks: Iterable[BatchData], batch_key_value: str) -> None:
+        """
+        Load a batch that arrives as a sequence of dataframes, then merge it as one batch.
+
+        The first chunk truncates the staging table and the rest are appended to it,
+        so only one chunk needs to be held in memory at a time. The merge into the
+        main table runs once, after the last chunk, so the batch is still replaced
+        as a single unit. In spill mode the chunks become row groups of one spill file.
+        """
+        chunks = (self.prepare_batch(chunk, batch_key_value) for chunk in chunks)
+        if self.spill_storage:
+            self._spill_and_submit(chunks, batch_key_value)
+            return
+
+        write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE_DATA
+        total_rows = 0
+        for chunk in chunks:
+            if isinstance(chunk, pa.Table):
+                self._load_arrow_to_staging(chunk, write_disposition)
+            else:
+                self._load_df_to_staging(chunk, write_disposition)
+            write_disposition = bigquery.WriteDisposition.WRITE_APPEND
+            total_rows += len(chunk)
+
+        if write_disposition == bigquery.WriteDisposition.WRITE_TRUNCATE_DATA:
+            # Nothing was loaded, so the staging table still holds a previous batch
+            print(f"No chunks received for batch {batch_key_value}; skipping merge")
+            return
+
+        print(f"Loaded {total_rows} rows in chunks for batch {batch_key_value}")
+        self._merge_staging_to_main(batch_key_value)
     
-    def _load_df_to_staging(self, df: pd.DataFrame):
-        """Load pandas df into staging table, overwriting previous values in staging table"""
+    def prepare_batch(self, data: BatchData, batch_key_value: str) -> BatchData:
+        """
+        Fill partition_column with DATE(batch_key_value), if the loader has one and data
+        lacks it, then put the columns in column_order (if the loader has one)
+        """
+        if self.partition_column:
+            data = with_partition_column(data, self.partition_column, batch_key_to_date(batch_key_value))
+        if self.column_order:
+            data = with_column_order(data, self.column_order)
+        return data
+
+    def spill_path(self, batch_key_value: str) -> str:
+        """Path of the Parquet spill file for a batch"""
+        if not self.spill_storage:
+            raise ValueError("StagingTableLoader was created without spill_storage")
+        table_name = self.main_table_id.split(".")[-1]
+        return self.spill_storage.get_temp_path(f"{table_name}__{batch_key_value}.parquet")
+
+    def write_spill_file(self, chunks: Iterable[BatchData], batch_key_value: str) -> Optional[str]:
+        """
+        Write a batch to its Parquet spill file, one chunk after another.
+
+        Returns:
+            The spill file path, or None if there were no chunks
+        """
+        return write_parquet_spill_file(
+            chunks,
+            self.spill_path(batch_key_value),
+            compression=self.parquet_compression,
+            row_group_size=self.parquet_row_group_size,
+            column_order=self.column_order,
+        )
+
+    def load_and_merge_spill_file(self, spill_path: str, batch_key_value: str) -> None:
+        """
+        Load a Parquet spill file into the staging table with one load job and merge it
+        into the main table. The spill file is removed once the merge succeeds.
+        """
+        self.load_spill_file_to_staging(spill_path, batch_key_value)
+        self._merge_staging_to_main(batch_key_value)
+
+        if self.spill_storage:
+            self.spill_storage.cleanup([spill_path])
+
+    def load_spill_file_to_staging(self, spill_path: str, batch_key_value: str, staging_table_id: Optional[str] = None) -> None:
+        """
+        Load a Parquet spill file into a staging table with one load job, replacing its contents.
+
+        Args:
+            staging_table_id: Staging table to load into (default the shared staging table).
+                Pass batch_staging_table_id(batch_key_value) to give the batch its own table.
+        """
+        staging_table_id = staging_table_id or self.staging_table_id
         try:
-            # Configure job to truncate staging table
             job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
                 write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE_DATA
             )
 
-            # Load dataframe to staging table
-            job = self.client.load_table_from_dataframe(
-                dataframe=df,
-                destination=self.staging_table_id,
-                job_config=job_config
+            with span("staging.load", table=staging_table_id, batch_key=batch_key_value, source="spill_file") as load_span, \
+                    open(spill_path, "rb") as f:
+                job = self.client.load_table_from_file(
+                    f,
+                    destination=staging_table_id,
+                    job_config=job_config
+                )
+                job.result()
+                load_span.add(rows=job.output_rows or 0, bytes=os.path.getsize(spill_path))
+                load_span.add_job(job)
+
+            print(f"Loaded spill file {spill_path} to staging table {staging_table_id}")
+
+        except Exception as e:
+            raise Exception(f"Load operation failed; rerun load_and_merge_spill_file('{spill_path}', '{batch_key_value}') to retry. Error: {e}")
+
+    def merge_batch_staging_table(self, batch_key_value: str) -> None:
+        """Merge a batch's own staging table (see batch_staging_table_id) into the main table, then drop it"""
+        staging_table_id = self.batch_staging_table_id(batch_key_value)
+        self._merge_staging_to_main(batch_key_value, staging_table_id)
+        self.client.delete_table(staging_table_id, not_found_ok=True)
+
+    def batch_staging_table_id(self, batch_key_value: str) -> str:
+        """
+        Staging table reserved for one batch, so batches can be loaded concurrently
+        without overwriting each other in the shared staging table.
+        """
+        return f"{self.staging_table_id}_{re.sub(r'[^0-9A-Za-z_]', '_', batch_key_value)}"
+
+    def wait_for_loads(self) -> None:
+        """
+        Block until every submitted spill file has been loaded and merged.
+
+        Raises:
+            Exception: Listing each batch that failed and the spill file it can be retried from
+        """
+        pending, self._pending_loads = self._pending_loads, []
+        failures = []
+        for batch_key_value, spill_path, future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                failures.append(f"batch {batch_key_value} (spill file {spill_path}): {e}")
+
+        if failures:
+            raise Exception(f"{len(failures)} batch load(s) failed; retry with load_and_merge_spill_file. " + "; ".join(failures))
+
+    def _spill_and_submit(self, chunks: Iterable[BatchData], batch_key_value: str) -> None:
+        """Write a batch's spill file now, and queue its load and merge on the background thread"""
+        # Don't overwrite a spill file that a queued load of the same batch is still reading
+        for pending_key, _, future in self._pending_loads:
+            if pending_key == batch_key_value:
+                futures_wait([future])
+
+        spill_path = self.write_spill_file(chunks, batch_key_value)
+        if spill_path is None:
+            print(f"No chunks received for batch {batch_key_value}; skipping merge")
+            return
+
+        if self._load_executor is None:
+            # A single worker keeps merges in submission order and the staging table unshared
+            self._load_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="staging-load")
+        future = self._load_executor.submit(self.load_and_merge_spill_file, spill_path, batch_key_value)
+        self._pending_loads.append((batch_key_value, spill_path, future))
+
+    def _load_df_to_staging(self, df: pd.DataFrame, write_disposition: str = bigquery.WriteDisposition.WRITE_TRUNCATE_DATA):
+        """Load pandas df into staging table, overwriting previous values in staging table by default"""
+        try:
+            # Configure job to truncate (or append to) staging table
+            job_config = bigquery.LoadJobConfig(
+                write_disposition=write_disposition
             )
 
-            # Wait for completion
-            job.result()
+            # Load dataframe to staging table
+            with span("staging.load", table=self.staging_table_id, source="dataframe") as load_span:
+                job = self.client.load_table_from_dataframe(
+                    dataframe=df,
+                    destination=self.staging_table_id,
+                    job_config=job_config
+                )
+
+                # Wait for completion
+                job.result()
+                load_span.add(rows=len(df))
+                load_span.add_job(job)
 
             print(f"Loaded {len(df)} rows to staging table {self.staging_table_id}")
 
         except Exception as e:
             raise Exception(f"Load operation failed; rerun load_and_merge_df method to retry. Error: {e}")
 
+    def _load_arrow_to_staging(self, table: pa.Table, write_disposition: str = bigquery.WriteDisposition.WRITE_TRUNCATE_DATA):
+        """Load arrow table into staging table as an in-memory Parquet file"""
+        try:
+            buffer = io.BytesIO()
+            pq.write_table(table, buffer)
+            buffer.seek(0)
+
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                write_disposition=write_disposition
+            )
+
+            with span("staging.load", table=self.staging_table_id, source="arrow") as load_span:
+                job = self.client.load_table_from_file(
+                    buffer,
+                    destination=self.staging_table_id,
+                    job_config=job_config
+                )
+
+                # Wait for completion
+                job.result()
+                load_span.add(rows=table.num_rows, bytes=buffer.getbuffer().nbytes)
+                load_span.add_job(job)
+
+            print(f"Loaded {table.num_rows} rows to staging table {self.staging_table_id}")
 
-    def _merge_staging_to_main(self, batch_key_value):
+        except Exception as e:
+            raise Exception(f"Load operation failed; rerun load_and_merge_table method to retry. Error: {e}")
+
+    def _merge_staging_to_main(self, batch_key_value, staging_table_id: Optional[str] = None):
         """
         Replaces the data in the main table with the given batch_key_value with
-        the corresponding data in the staging table.
+        the corresponding data in the staging table, using the loader's replace_strategy.
         """
+        staging_table_id = staging_table_id or self.staging_table_id
         try:
-            # Step 1: Delete existing batch
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ScalarQueryParameter("batch_key_value", "STRING", batch_key_value)
-                ]
-            )
-            delete_sql = f"""
-            DELETE FROM `{self.main_table_id}`
-            WHERE DATE({self.batch_key_column}) = DATE(@batch_key_value);
-            """
-            job = self.client.query(delete_sql, job_config=job_config)
-            job.result()
-            print(f"Deleted batch {batch_key_value} from {self.main_table_id}")
-
-            # Step 2: Insert all staging data
-            insert_sql = f"""
-            INSERT INTO `{self.main_table_id}`
-            SELECT * FROM `{self.staging_table_id}`
-            """
-            self.client.query(insert_sql).result()
-            print(f"Inserted new data from batch {batch_key_value} into {self.main_table_id}")
+            with span("staging.merge", table=self.main_table_id, batch_key=batch_key_value, strategy=self.replace_strategy):
+                if self.replace_strategy == "merge":
+                    self._merge_with_single_statement(batch_key_value, staging_table_id)
+                elif self.replace_strategy == "partition_overwrite":
+                    self._overwrite_batch_partition(batch_key_value, staging_table_id)
+                else:
+                    self._delete_then_insert(batch_key_value, staging_table_id)
 
         except Exception as e:
             # Log error, let caller decide whether to retry
             raise Exception(f"Merge operation failed; rerun load_and_merge_* method to retry. Error: {e}")
+
+    def _delete_then_insert(self, batch_key_value: str, staging_table_id: str) -> None:
+        # Step 1: Delete existing batch
+        delete_sql = f"""
+        DELETE FROM `{self.main_table_id}`
+        WHERE {self._batch_predicate()};
+        """
+        job = self.client.query(delete_sql, job_config=self._batch_query_config(batch_key_value))
+        job.result()
+        record(job=job)
+        print(f"Deleted batch {batch_key_value} from {self.main_table_id}")
+
+        # Step 2: Insert all staging data
+        insert_sql = f"""
+        INSERT INTO `{self.main_table_id}`{self._insert_columns()}
+        SELECT {self._select_columns()} FROM `{staging_table_id}`
+        """
+        job = self.client.query(insert_sql)
+        job.result()
+        record(rows=job.num_dml_affected_rows or 0, job=job)
+        print(f"Inserted new data from batch {batch_key_value} into {self.main_table_id}")
+
+    def _merge_with_single_statement(self, batch_key_value: str, staging_table_id: str) -> None:
+        # ON FALSE never matches, so every target row of the batch is deleted and every
+        # staged row inserted, in one atomic statement. The constant batch filter on the
+        # target lets BigQuery prune to the batch's partition.
+        merge_sql = f"""
+        MERGE `{self.main_table_id}` T
+        USING `{staging_table_id}` S
+        ON FALSE
+        WHEN NOT MATCHED BY SOURCE AND {self._batch_predicate("T.")} THEN DELETE
+        WHEN NOT MATCHED THEN {self._merge_insert()}
+        """
+        job = self.client.query(merge_sql, job_config=self._batch_query_config(batch_key_value))
+        job.result()
+        record(job=job)
+        print(f"Merged batch {batch_key_value} into {self.main_table_id}")
+
+    def _overwrite_batch_partition(self, batch_key_value: str, staging_table_id: str) -> None:
+        partition_id = batch_key_to_date(batch_key_value).strftime("%Y%m%d")
+        job_config = bigquery.CopyJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+        )
+        job = self.client.copy_table(staging_table_id, f"{self.main_table_id}${partition_id}", job_config=job_config)
+        job.result()
+        record(job=job)
+        print(f"Overwrote partition {partition_id} of {self.main_table_id} with batch {batch_key_value}")
+
+    def _batch_predicate(self, alias: str = "") -> str:
+        """SQL condition selecting the rows of one batch (the batch key is bound as @batch_key_value)"""
+        if self.partition_column and self.replace_strategy != "delete_insert":
+            return f"{alias}{self.partition_column} = DATE(@batch_key_value)"
+        return f"DATE({alias}{self.batch_key_column}) = DATE(@batch_key_value)"
+
+    def _insert_columns(self) -> str:
+        """Column list of the INSERT into the main table (none without column_order: all columns, by position)"""
+        return f" ({self._select_columns()})" if self.column_order else ""
+
+    def _select_columns(self, alias: str = "") -> str:
+        if not self.column_order:
+            return "*"
+        return ", ".join(f"{alias}`{column}`" for column in self.column_order)
+
+    def _merge_insert(self) -> str:
+        if not self.column_order:
+            return "INSERT ROW"
+        return f"INSERT ({self._select_columns()}) VALUES ({self._select_columns('S.')})"
+
+    @staticmethod
+    def _batch_query_config(batch_key_value: str) -> bigquery.QueryJobConfig:
+        return bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("batch_key_value", "STRING", batch_key_value)
+            ]
+        )
+
+
+def write_parquet_spill_file(chunks: Iterable[BatchData],
+                             path: str,
+                             compression: str = DEFAULT_PARQUET_COMPRESSION,
+                             row_group_size: int = DEFAULT_PARQUET_ROW_GROUP_SIZE,
+                             column_order: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Write chunks of one batch to a single Parquet file, each chunk as one or more row groups.
+
+    Needs no BigQuery client, so it can run in worker processes.
+
+    Args:
+        column_order: Write columns in this order (e.g. the table's DDL order), so the file
+            can be loaded into a table created from its own schema and then INSERT ... SELECT *'ed
+
+    Returns:
+        The spill file path, or None if there were no chunks
+    """
+    writer: Optional[pq.ParquetWriter] = None
+    total_rows = 0
+    try:
+        for chunk in chunks:
+            table = chunk if isinstance(chunk, pa.Table) else pa.Table.from_pandas(chunk, preserve_index=False)
+            if column_order:
+                table = with_column_order(table, column_order)
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    path,
+                    table.schema,
+                    compression=compression,
+                    # BigQuery reads microsecond timestamps; pandas frames carry nanoseconds
+                    coerce_timestamps="us",
+                    allow_truncated_timestamps=True,
+                )
+            writer.write_table(table.cast(writer.schema), row_group_size=row_group_size)
+            total_rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        return None
+
+    print(f"Spilled {total_rows} rows to {path}")
+    record(rows=total_rows, bytes=os.path.getsize(path))
+    return path
+
+
+def batch_key_to_date(batch_key_value: str) -> date:
+    """
+    Python equivalent of DATE(batch_key_value) in BigQuery, for batch keys such as
+    "2024-01-3" (trips, one batch per day of the month) or "2024-01-05 08:00:00" (stations).
+    """
+    match = _BATCH_KEY_DATE.match(str(batch_key_value))
+    if not match:
+        raise ValueError(f"Batch key {batch_key_value!r} does not start with a YYYY-M-D date")
+    return date(int(match[1]), int(match[2]), int(match[3]))
+
+
+def with_partition_column(data: BatchData, column: str, partition_date: date) -> BatchData:
+    """
+    Append a constant DATE column to a dataframe or arrow table (no-op if it is already there).
+    Dataframes get the column in place; arrow tables are immutable, so a new table is returned.
+    """
+    if isinstance(data, pa.Table):
+        if column in data.column_names:
+            return data
+        return data.append_column(column, pa.repeat(pa.scalar(partition_date, pa.date32()), data.num_rows))
+
+    if column in data.columns:
+        return data
+    data[column] = partition_date
+    return data
+
+
+def with_column_order(data: BatchData, column_order: List[str]) -> BatchData:
+    """
+    Put the columns of a dataframe or arrow table in column_order (unchanged if they
+    already are). Arrow tables are reordered without copying; dataframes are copied.
+
+    Raises:
+        KeyError: If data lacks one of the columns
+    """
+    columns = data.column_names if isinstance(data, pa.Table) else list(data.columns)
+    if columns == column_order:
+        return data
+    missing = [column for column in column_order if column not in columns]
+    if missing:
+        raise KeyError(f"Batch is missing columns {missing} of column order {column_order}")
+    return data.select(column_order) if isinstance(data, pa.Table) else data[column_order]
@@ -0,0 +1,108 @@
+import hashlib
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+from citibike.utils.storage import LocalStorage, StorageLocation
+
+# Subdirectory of the storage location holding cached table reads
+TABLE_CACHE_DIR = "table_cache"
+
+
+class TableCache:
+    """
+    Local Parquet copies of BigQuery tables, for analyses that re-read the same
+    tables many times (e.g. while tuning the network analysis).
+
+    Each entry is keyed by the table, the columns read (the projection query text)
+    and the table's last-modified time, so a dbt run that rebuilds the table makes
+    the next read() fetch it again. Fetches go through the BigQuery Storage Read
+    API, reading only the requested columns, when google-cloud-bigquery-storage is
+    installed (and the REST tabledata API otherwise).
+
+    read() normally costs one metadata call (get_table) on a hit. With offline=True
+    it makes no BigQuery calls at all and returns the newest cached copy.
+    """
+
+    def __init__(self, storage: StorageLocation, offline: bool = False, use_storage_api: bool = True):
+        self.storage = storage
+        self.offline = offline
+        self.use_storage_api = use_storage_api
+        self.cache_dir = Path(storage.get_temp_path(TABLE_CACHE_DIR))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["TableCache"]:
+        """Cache configured by NETWORK_QUERY_CACHE_* environment variables (see config/*.env.example); None when disabled"""
+        cache_dir = os.environ.get("NETWORK_QUERY_CACHE_DIR")
+        if not cache_dir:
+            return None
+        return cls(
+            LocalStorage(cache_dir),
+            offline=os.environ.get("NETWORK_QUERY_CACHE_OFFLINE", "false").lower() == "true",
+        )
+
+    def read(self, client: bigquery.Client, table_ref: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Contents of table_ref (only `columns`, in that order, if given), from the cache when it is current"""
+        query_key = _query_key(table_ref, columns)
+
+        if self.offline:
+            cached = self._latest_entry(table_ref, query_key)
+            if cached is None:
+                raise FileNotFoundError(f"No cached copy of {table_ref} in {self.cache_dir}; read it once with offline=False first")
+            print(f"Reading {table_ref} from cache {cached} (offline)")
+            return pq.read_table(cached).to_pandas()
+
+        table = client.get_table(table_ref)
+        entry = self._entry_path(table_ref, query_key, table.modified)
+        if entry.exists():
+            print(f"Reading {table_ref} from cache {entry}")
+            return pq.read_table(entry).to_pandas()
+
+        arrow_table = self._fetch(client, table, columns)
+        self._store(arrow_table, entry, table_ref, query_key)
+        print(f"Fetched {arrow_table.num_rows} rows of {table_ref} into cache {entry}")
+        return arrow_table.to_pandas()
+
+    def _fetch(self, client: bigquery.Client, table: bigquery.Table, columns: Optional[Sequence[str]]) -> pa.Table:
+        selected_fields = None
+        if columns is not None:
+            fields_by_name = {field.name: field for field in table.schema}
+            missing = [column for column in columns if column not in fields_by_name]
+            if missing:
+                raise KeyError(f"Columns {missing} not in {table.table_id}")
+            selected_fields = [fields_by_name[column] for column in columns]
+
+        rows = client.list_rows(table, selected_fields=selected_fields)
+        return rows.to_arrow(create_bqstorage_client=self.use_storage_api)
+
+    def _store(self, arrow_table: pa.Table, entry: Path, table_ref: str, query_key: str) -> None:
+        """Write atomically, then drop older versions of the same read"""
+        tmp_path = entry.with_name(f"{entry.name}.tmp")
+        pq.write_table(arrow_table, tmp_path)
+        os.replace(tmp_path, entry)
+        self.storage.cleanup([str(path) for path in self._entries(table_ref, query_key) if path != entry])
+
+    def _entry_path(self, table_ref: str, query_key: str, modified: datetime) -> Path:
+        version = int(modified.timestamp() * 1_000_000)
+        return self.cache_dir / f"{table_ref}.{query_key}.{version}.parquet"
+
+    def _entries(self, table_ref: str, query_key: str) -> List[Path]:
+        return list(self.cache_dir.glob(f"{table_ref}.{query_key}.*.parquet"))
+
+    def _latest_entry(self, table_ref: str, query_key: str) -> Optional[Path]:
+        entries = self._entries(table_ref, query_key)
+        return max(entries, key=lambda path: path.stat().st_mtime) if entries else None
+
+
+def _query_key(table_ref: str, columns: Optional[Sequence[str]]) -> str:
+    """Short hash of the projection query text, so different column sets of a table are cached separately"""
+    projection = ", ".join(columns) if columns is not None else "*"
+    query_text = f"SELECT {projection} FROM {table_ref}"
+    return hashlib.sha256(query_text.encode()).hexdigest()[:16]
@@ -0,0 +1,89 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from citibike.database.local_client import LocalBigQueryClient
+
+PACKAGE_DIR = Path(__file__).parent.parent
+DBT_DIR = PACKAGE_DIR.parent / "dbt_transformations"
+RAW_DDL_DIR = PACKAGE_DIR.parent / "sql" / "ddl" / "templates" / "raw"
+
+# Same default as the local target in dbt_transformations/profiles.yml (relative to the dbt project)
+DEFAULT_LOCAL_PARQUET_DIR = "../local_warehouse/raw"
+
+_DDL_COLUMN = re.compile(r"^\s*(?:`(?P<quoted>[^`]+)`|(?P<name>\w+))\s+(?P<type>[A-Z0-9]+)\b")
+
+_ARROW_TYPES = {
+    "STRING": pa.string(),
+    "INT64": pa.int64(),
+    "FLOAT64": pa.float64(),
+    "BOOL": pa.bool_(),
+    "DATE": pa.date32(),
+    "DATETIME": pa.timestamp("us"),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+
+def local_parquet_dir() -> Path:
+    """
+    Directory the local dbt target reads the raw tables from (LOCAL_PARQUET_DIR).
+    A relative path is relative to the dbt project, as it is for dbt.
+    """
+    return (DBT_DIR / os.environ.get("LOCAL_PARQUET_DIR", DEFAULT_LOCAL_PARQUET_DIR)).resolve()
+
+
+def raw_table_names() -> List[str]:
+    return sorted(path.stem for path in RAW_DDL_DIR.glob("*.sql"))
+
+
+def raw_table_schema(table_name: str) -> pa.Schema:
+    """Arrow schema of a raw table, read from its DDL template in sql/ddl/templates/raw"""
+    fields = []
+    with open(RAW_DDL_DIR / f"{table_name}.sql") as f:
+        for line in f:
+            match = _DDL_COLUMN.match(line)
+            if match and match["type"] in _ARROW_TYPES:
+                fields.append(pa.field(match["quoted"] or match["name"], _ARROW_TYPES[match["type"]]))
+    return pa.schema(fields)
+
+
+def write_local_sources(client: LocalBigQueryClient, directory: Optional[str] = None) -> Dict[str, int]:
+    """
+    Write the raw tables held by a LocalBigQueryClient (e.g. after running the
+    loaders offline) as the Parquet files the local dbt target reads:
+    <directory>/<table_name>/data.parquet, in the table's BigQuery schema.
+
+    Every raw table gets a file, empty if the client doesn't hold it, so models
+    reading sources that weren't loaded still run. Returns rows written per table.
+    """
+    root = Path(directory) if directory else local_parquet_dir()
+    rows_written = {}
+    for table_name in raw_table_names():
+        schema = raw_table_schema(table_name)
+        table = _find_table(client, table_name)
+        if table is None:
+            table = schema.empty_table()
+        else:
+            columns = [
+                table[field.name].cast(field.type) if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+                for field in schema
+            ]
+            table = pa.Table.from_arrays(columns, schema=schema)
+
+        table_dir = root / table_name
+        table_dir.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, table_dir / "data.parquet")
+        rows_written[table_name] = table.num_rows
+        print(f"Wrote {table.num_rows} rows of {table_name} to {table_dir}")
+    return rows_written
+
+
+def _find_table(client: LocalBigQueryClient, table_name: str) -> Optional[pa.Table]:
+    for table_id, table in client.tables.items():
+        if table_id.split(".")[-1] == table_name:
+            return table
+    return None
@@ -0,0 +1,146 @@
+import os
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, shape
+from shapely.validation import make_valid
+
+BOUNDARIES_FILE_PATH = os.path.join(os.path.dirname(__file__), "../data/nyc_borough_boundaries.json")
+
+# Side of the lookup grid cells, in degrees (~0.5 km at NYC's latitude). Cells fully
+# inside one borough answer their points directly; only points in cells crossed by a
+# boundary are tested against the polygons.
+DEFAULT_CELL_DEGREES = 0.005
+
+# Borough index of points outside every borough
+NO_BOROUGH = -1
+
+
+def load_borough_features(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """GeoJSON features of the borough boundaries file"""
+    with open(path or BOUNDARIES_FILE_PATH, "r") as f:
+        return json.load(f)["features"]
+
+
+def clean_borough_geometry(geometry: Dict[str, Any], simplify_tolerance: float = 0.0):
+    """Shapely (multi)polygon of a GeoJSON geometry, repaired if invalid and optionally simplified"""
+    geom = shape(geometry)
+    if not geom.is_valid:
+        # make_valid can split a polygon into a collection; keep only its polygonal parts
+        geom = make_valid(geom)
+        if geom.geom_type == "GeometryCollection":
+            geom = MultiPolygon([
+                polygon for part in geom.geoms if part.geom_type in ("Polygon", "MultiPolygon")
+                for polygon in getattr(part, "geoms", [part])
+            ])
+    if simplify_tolerance > 0:
+        geom = geom.simplify(simplify_tolerance, preserve_topology=True)
+    return geom
+
+
+class BoroughLocator:
+    """
+    Point-in-polygon borough lookup for arrays of coordinates, the Python counterpart
+    of the point_within join on silver_nyc_borough_boundaries.
+
+    The boroughs' polygons (each island of a borough separately) go into an STRtree,
+    which classifies the cells of a regular grid over the boroughs once: cells inside
+    a single polygon, cells touching no polygon, and boundary cells with the polygons
+    they intersect. A lookup bins the points into cells with array arithmetic, takes
+    the answer of the inside and empty cells as is, and tests the points of boundary
+    cells with shapely.contains_xy against the prepared polygons of their cell.
+    """
+
+    def __init__(self, features: List[Dict[str, Any]], cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.borough_codes = [int(feature["properties"]["BoroCode"]) for feature in features]
+        self.borough_names = [feature["properties"]["BoroName"] for feature in features]
+
+        parts, part_boroughs = [], []
+        for borough, feature in enumerate(features):
+            geom = clean_borough_geometry(feature["geometry"])
+            for polygon in getattr(geom, "geoms", [geom]):
+                parts.append(polygon)
+                part_boroughs.append(borough)
+        self.parts = np.array(parts, dtype=object)
+        self.part_boroughs = np.array(part_boroughs, dtype=np.int16)
+        shapely.prepare(self.parts)
+        tree = shapely.STRtree(self.parts)
+
+        min_lng, min_lat, max_lng, max_lat = shapely.total_bounds(self.parts)
+        self.cell_degrees = cell_degrees
+        self.origin = (min_lng, min_lat)
+        self.shape = (int(np.ceil((max_lat - min_lat) / cell_degrees)) or 1,
+                      int(np.ceil((max_lng - min_lng) / cell_degrees)) or 1)
+
+        rows, cols = np.divmod(np.arange(self.shape[0] * self.shape[1]), self.shape[1])
+        cells = shapely.box(min_lng + cols * cell_degrees, min_lat + rows * cell_degrees,
+                            min_lng + (cols + 1) * cell_degrees, min_lat + (rows + 1) * cell_degrees)
+
+        # Borough of each cell lying inside one polygon, NO_BOROUGH elsewhere
+        self.cell_boroughs = np.full(len(cells), NO_BOROUGH, dtype=np.int16)
+        inside_cells, inside_parts = tree.query(cells, predicate="within")
+        self.cell_boroughs[inside_cells] = self.part_boroughs[inside_parts]
+
+        # Polygons to test for the points of each boundary cell, as cell -> part pairs
+        candidate_cells, candidate_parts = tree.query(cells, predicate="intersects")
+        is_boundary = self.cell_boroughs[candidate_cells] == NO_BOROUGH
+        candidate_cells, candidate_parts = candidate_cells[is_boundary], candidate_parts[is_boundary]
+        self.is_boundary_cell = np.zeros(len(cells), dtype=bool)
+        self.is_boundary_cell[candidate_cells] = True
+        # ... grouped by polygon: (part, its boundary cells)
+        order = np.argsort(candidate_parts, kind="stable")
+        splits = np.flatnonzero(np.diff(candidate_parts[order])) + 1
+        self.part_cells = list(zip(np.unique(candidate_parts), np.split(candidate_cells[order], splits)))
+
+    @classmethod
+    def from_geojson_file(cls, path: Optional[str] = None, cell_degrees: float = DEFAULT_CELL_DEGREES) -> "BoroughLocator":
+        """Locator over the borough boundaries file (default: the one boundaries_pipeline loads)"""
+        return cls(load_borough_features(path), cell_degrees)
+
+    def locate(self, lng: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """
+        Borough of each point, as an index into borough_names (NO_BOROUGH for points
+        outside every borough or with a missing coordinate)
+        """
+        lng = np.asarray(lng, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        boroughs = np.full(len(lng), NO_BOROUGH, dtype=np.int16)
+
+        # NaN coordinates fail both comparisons, so they stay out of the grid too
+        col = np.floor((lng - self.origin[0]) / self.cell_degrees)
+        row = np.floor((lat - self.origin[1]) / self.cell_degrees)
+        on_grid = np.flatnonzero((col >= 0) & (col < self.shape[1]) & (row >= 0) & (row < self.shape[0]))
+        cell = row[on_grid].astype(np.int64) * self.shape[1] + col[on_grid].astype(np.int64)
+        boroughs[on_grid] = self.cell_boroughs[cell]
+
+        boundary = self.is_boundary_cell[cell]
+        points, cell = on_grid[boundary], cell[boundary]
+        if not len(points):
+            return boroughs
+
+        # Test each point against the polygons of its cell, one polygon at a time;
+        # with the points sorted by cell, a polygon's points are one slice per cell
+        order = np.argsort(cell, kind="stable")
+        sorted_cells = cell[order]
+        for part, cells_of_part in self.part_cells:
+            starts = np.searchsorted(sorted_cells, cells_of_part, side="left")
+            lengths = np.searchsorted(sorted_cells, cells_of_part, side="right") - starts
+            total = lengths.sum()
+            if not total:
+                continue
+            offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+            near = points[order[offsets]]
+            inside = near[shapely.contains_xy(self.parts[part], lng[near], lat[near])]
+            boroughs[inside] = self.part_boroughs[part]
+        return boroughs
+
+
+@lru_cache(maxsize=1)
+def default_borough_locator() -> BoroughLocator:
+    """BoroughLocator over the borough boundaries file, built once per process"""
+    locator = BoroughLocator.from_geojson_file()
+    print(f"Built borough locator over {len(locator.parts)} polygons of {len(locator.borough_names)} boroughs")
+    return locator
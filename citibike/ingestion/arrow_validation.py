@@ -0,0 +1,140 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+from typing import Any, Dict, Iterator, Optional
+
+from citibike.ingestion.csv_layouts import TripCsvFormat, sniff_trip_csv_stream
+from citibike.ingestion.schemas import TRIP_CSV_NULL_VALUES, to_arrow_column_types
+from citibike.ingestion.validation import check_trip_columns
+from citibike.ingestion.zip_stream import CsvSource, open_csv_source
+from citibike.utils.metrics import record, timed
+
+# Schema dtypes parsed as numbers; like validate_and_cast_trip_schema, cells that
+# aren't numbers become null instead of failing the file
+NUMERIC_DTYPES = ('int64', 'Int64', 'float64')
+
+# What pd.to_numeric accepts, once surrounding whitespace is trimmed
+_NUMBER_PATTERN = r"(?i)^[+-]?((\d+\.?\d*|\.\d+)(e[+-]?\d+)?|inf(inity)?|nan)$"
+
+
+@timed("trip.read_and_cast_arrow")
+def read_and_cast_trip_csv(csv_path: CsvSource, schema: Dict[str, Any]) -> pa.Table:
+    """
+    Parse a trip CSV straight into a typed arrow table.
+
+    This is the arrow counterpart of pd.read_csv + validate_and_cast_trip_schema:
+    columns are typed by the CSV reader itself (no object-dtype intermediate),
+    and rideable_type / member_casual are dictionary-encoded. The header is
+    sniffed first (see csv_layouts), and the reader names the columns with
+    their schema names and tries the file's timestamp format first. Numeric
+    columns are read as strings and cast afterwards, so cells that aren't
+    numbers become null, as with the pandas engine.
+
+    Raises:
+        ValueError: If columns are missing, unexpected, or can't be cast
+    """
+    with open_csv_source(csv_path) as stream:
+        csv_format = sniff_trip_csv_stream(stream)
+        check_trip_columns(csv_format.column_names, schema)
+
+        try:
+            table = pa_csv.read_csv(stream, read_options=_read_options(csv_format), convert_options=_convert_options(schema, csv_format))
+        except pa.ArrowInvalid as e:
+            raise ValueError(f"Failed to cast trip CSV {csv_path} to schema: {e}")
+
+    table = _cast_numeric_columns(table, schema)
+    record(rows=table.num_rows, bytes=table.nbytes)
+    return table
+
+
+def iter_trip_csv_batches(csv_path: CsvSource, schema: Dict[str, Any], block_size_bytes: int) -> Iterator[pa.RecordBatch]:
+    """
+    Stream a trip CSV as typed arrow record batches of roughly block_size_bytes of CSV text each.
+
+    Raises:
+        ValueError: If columns are missing, unexpected, or can't be cast
+    """
+    with open_csv_source(csv_path) as stream:
+        csv_format = sniff_trip_csv_stream(stream)
+        check_trip_columns(csv_format.column_names, schema)
+
+        try:
+            # Close the reader explicitly; leaving its readahead threads to the
+            # garbage collector can abort the interpreter at shutdown
+            with pa_csv.open_csv(
+                stream,
+                read_options=_read_options(csv_format, block_size=block_size_bytes),
+                convert_options=_convert_options(schema, csv_format),
+            ) as reader:
+                for batch in reader:
+                    yield _cast_numeric_columns(batch, schema)
+        except pa.ArrowInvalid as e:
+            raise ValueError(f"Failed to cast trip CSV {csv_path} to schema: {e}")
+
+
+def add_metadata_columns_arrow(table: pa.Table | pa.RecordBatch,
+                               batch_key_value: str,
+                               batch_key_col: str = "_batch_key",
+                               ingested_at: Optional[pd.Timestamp] = None) -> pa.Table:
+    """
+    Append the _ingested_at and batch key columns to an arrow table or record batch.
+
+    Same semantics as add_metadata_columns; the existing columns are not copied.
+    """
+    if isinstance(table, pa.RecordBatch):
+        table = pa.Table.from_batches([table])
+
+    if ingested_at is None:
+        ingested_at = pd.Timestamp.now(tz='America/New_York').tz_localize(None)
+
+    num_rows = table.num_rows
+    table = table.append_column("_ingested_at", pa.repeat(pa.scalar(ingested_at, pa.timestamp('us')), num_rows))
+    table = table.append_column(batch_key_col, pa.repeat(pa.scalar(batch_key_value, pa.string()), num_rows))
+    return table
+
+
+def _read_options(csv_format: TripCsvFormat, **kwargs: Any) -> pa_csv.ReadOptions:
+    # Naming the columns in place of the header row renames them without a copy
+    return pa_csv.ReadOptions(column_names=csv_format.column_names, skip_rows=1, **kwargs)
+
+
+def _convert_options(schema: Dict[str, Any], csv_format: TripCsvFormat) -> pa_csv.ConvertOptions:
+    column_types = to_arrow_column_types(schema)
+    # Numbers are cast after parsing (see _cast_numeric_columns)
+    column_types.update({column: pa.string() for column, dtype in schema.items() if dtype in NUMERIC_DTYPES})
+    return pa_csv.ConvertOptions(
+        column_types=column_types,
+        timestamp_parsers=csv_format.timestamp_parsers,
+        null_values=TRIP_CSV_NULL_VALUES,
+        strings_can_be_null=True,
+    )
+
+
+def _cast_numeric_columns(data: pa.Table | pa.RecordBatch, schema: Dict[str, Any]) -> pa.Table | pa.RecordBatch:
+    """Cast the numeric columns of a table or record batch, read as strings, to their schema types"""
+    column_types = to_arrow_column_types(schema)
+    columns = [
+        _to_numbers(data.column(i), column_types[name]) if schema.get(name) in NUMERIC_DTYPES else data.column(i)
+        for i, name in enumerate(data.column_names)
+    ]
+    return type(data).from_arrays(columns, names=data.column_names)
+
+
+def _to_numbers(column: pa.Array | pa.ChunkedArray, arrow_type: pa.DataType) -> pa.Array | pa.ChunkedArray:
+    """
+    Arrow counterpart of pd.to_numeric(errors="coerce").astype(...) for a string column:
+    values that aren't numbers (or, for integer columns, aren't finite) become null.
+    Non-integral values of integer columns are truncated.
+    """
+    try:
+        return pc.cast(column, arrow_type)
+    except pa.ArrowInvalid:
+        pass
+
+    trimmed = pc.utf8_trim_whitespace(column)
+    numbers = pc.cast(pc.if_else(pc.match_substring_regex(trimmed, _NUMBER_PATTERN), trimmed, None), pa.float64())
+    if pa.types.is_integer(arrow_type):
+        numbers = pc.if_else(pc.is_finite(numbers), numbers, None)
+        return pc.cast(numbers, arrow_type, safe=False)
+    return numbers
@@ -0,0 +1,205 @@
+import json
+import os
+import re
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from citibike.database.bigquery import get_bigquery_client
+from citibike.dbt import run_dbt_command
+from citibike.ingestion.downloader import TripDataDownloader
+from citibike.ingestion.range_download import DEFAULT_CONNECTIONS, RangeRequestDownloader
+from citibike.ingestion.trips import TripIngestOptions, download_trip_month, load_trip_month
+from citibike.utils.date_helpers import DATETIME_STR_FORMAT, now_nyc_datetime
+from citibike.utils.storage import LocalStorage
+
+# Per-month progress of backfills, kept in LocalStorage so reruns skip finished months
+BACKFILL_STATE_FILENAME = "trip_backfill_state.json"
+
+# Month states, in order: raw trips loaded, then silver/gold rebuilt by dbt
+MONTH_LOADED = "loaded"
+MONTH_TRANSFORMED = "transformed"
+MONTH_FAILED = "failed"
+
+# A month_key: "YYYY-MM", month 01-12
+_MONTH_KEY = re.compile(r"(\d{4})-(0[1-9]|1[0-2])")
+
+
+class BackfillState:
+    """Completion state of each month_key ("YYYY-MM"), persisted as JSON"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.months: Dict[str, Dict[str, Any]] = json.load(f)
+        except FileNotFoundError:
+            self.months = {}
+
+    def status(self, month_key: str) -> Optional[str]:
+        return self.months.get(month_key, {}).get("status")
+
+    def mark(self, month_key: str, status: str, **details: Any) -> None:
+        """Set a month's status; details from earlier marks are kept, except a past error"""
+        previous = {key: value for key, value in self.months.get(month_key, {}).items() if key != "error"}
+        self.months[month_key] = {**previous, "status": status, "updated_at": now_nyc_datetime().strftime(DATETIME_STR_FORMAT), **details}
+        self._save()
+
+    def months_with_status(self, status: str, month_keys: List[str]) -> List[str]:
+        return [month_key for month_key in month_keys if self.status(month_key) == status]
+
+    def _save(self) -> None:
+        # Write atomically so an interrupted run can't corrupt the state of earlier months
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.months, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def month_range(start_month_key: str, end_month_key: str) -> List[Tuple[int, int]]:
+    """(year, month) for every month from start to end inclusive, given "YYYY-MM" keys"""
+    start_year, start_month = parse_month_key(start_month_key)
+    end_year, end_month = parse_month_key(end_month_key)
+    if (start_year, start_month) > (end_year, end_month):
+        raise ValueError(f"Backfill start {start_month_key} is after end {end_month_key}")
+
+    months = []
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def parse_month_key(month_key: str) -> Tuple[int, int]:
+    """(year, month) of a "YYYY-MM" key; raises ValueError on anything else, e.g. a month outside 01-12"""
+    match = _MONTH_KEY.fullmatch(month_key)
+    if not match:
+        raise ValueError(f"Month key {month_key!r} is not a YYYY-MM month")
+    return int(match[1]), int(match[2])
+
+
+def backfill_trip_data(start_month_key: str,
+                       end_month_key: str,
+                       options: Optional[TripIngestOptions] = None,
+                       prefetch_months: int = 1,
+                       force: bool = False,
+                       state: Optional[BackfillState] = None) -> List[str]:
+    """
+    Ingest every month of trips from start_month_key to end_month_key ("YYYY-MM").
+
+    Months are loaded one at a time, in order, while the downloads of up to
+    prefetch_months later months run in the background, so the network and the
+    parse/load work overlap while disk use stays bounded. Each month's outcome is
+    recorded in BackfillState; months already loaded (or transformed) are skipped
+    unless force=True. A failed month is recorded and the backfill moves on.
+
+    Downloads always go through the RangeRequestDownloader cache, since pre-2024
+    months share one yearly zip; a cached zip is evicted once every month it
+    holds has loaded.
+
+    Does not run dbt; call transform_backfilled_months afterwards.
+
+    Returns:
+        The month keys loaded by this call
+
+    Raises:
+        Exception: If any month failed, after all other months were attempted
+    """
+    options = options or TripIngestOptions()
+    if prefetch_months < 0:
+        raise ValueError(f"prefetch_months must be at least 0, got {prefetch_months}")
+
+    storage = LocalStorage()
+    state = state or BackfillState(storage.get_temp_path(BACKFILL_STATE_FILENAME))
+    client = get_bigquery_client(pool_size=options.max_workers)
+    download_engine = RangeRequestDownloader(storage, connections=options.download_connections or DEFAULT_CONNECTIONS)
+    options = replace(options, download_connections=download_engine.connections)
+
+    months = [
+        (year, month) for year, month in month_range(start_month_key, end_month_key)
+        if force or state.status(_month_key(year, month)) not in (MONTH_LOADED, MONTH_TRANSFORMED)
+    ]
+    print(f"Backfilling {len(months)} month(s) between {start_month_key} and {end_month_key}")
+
+    # How many pending months each zip still has to serve, to know when to evict it
+    url_of = TripDataDownloader(storage, os.environ["TRIP_DATA_URL"]).month_url
+    months_left_per_url = Counter(url_of(year, month) for year, month in months)
+
+    loaded: List[str] = []
+    failed: List[str] = []
+    failed_urls = set()  # Keep these zips cached so a rerun doesn't download them again
+
+    # One download thread: pre-2024 months of a year would otherwise fetch the same zip at once
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="trip-prefetch") as download_pool:
+        downloads: Dict[Tuple[int, int], Future] = {}
+
+        def prefetch(index: int) -> None:
+            if index < len(months) and months[index] not in downloads:
+                year, month = months[index]
+                downloads[months[index]] = download_pool.submit(download_trip_month, year, month, storage, options, download_engine)
+
+        for index in range(min(prefetch_months + 1, len(months))):
+            prefetch(index)
+
+        for index, (year, month) in enumerate(months):
+            month_key = _month_key(year, month)
+            url = url_of(year, month)
+            downloader: Optional[TripDataDownloader] = None
+            try:
+                downloader = downloads.pop((year, month)).result()
+                # Start the next download before this month's parse/load
+                prefetch(index + prefetch_months + 1)
+
+                table_batch_keys = load_trip_month(year, month, downloader, client, storage, options)
+                if not table_batch_keys:
+                    raise Exception(f"No trip CSV files found in {url}")
+                batch_keys = [batch_key for keys in table_batch_keys.values() for batch_key in keys]
+                state.mark(month_key, MONTH_LOADED, tables=sorted(table_batch_keys), batch_keys=batch_keys)
+                loaded.append(month_key)
+                print(f"Successfully ingested trip data for {month_key}")
+            except Exception as e:
+                print(f"Failed to ingest trip data for {month_key}: {e}")
+                state.mark(month_key, MONTH_FAILED, error=str(e))
+                failed.append(month_key)
+                failed_urls.add(url)
+                prefetch(index + prefetch_months + 1)
+            finally:
+                if downloader is not None:
+                    storage.cleanup(downloader.get_all_files_for_cleanup())
+
+            months_left_per_url[url] -= 1
+            if months_left_per_url[url] == 0 and url not in failed_urls:
+                download_engine.evict(url)
+
+    if failed:
+        raise Exception(f"Backfill failed for {len(failed)} month(s): {failed}; rerun to retry them (finished months are skipped)")
+
+    return loaded
+
+
+def transform_backfilled_months(start_month_key: str, end_month_key: str, state: Optional[BackfillState] = None) -> List[str]:
+    """
+    Run the dashboard dbt models once over every loaded but untransformed month in
+    the range, then mark those months transformed. Returns the months transformed.
+    """
+    state = state or BackfillState(LocalStorage().get_temp_path(BACKFILL_STATE_FILENAME))
+    month_keys = [_month_key(year, month) for year, month in month_range(start_month_key, end_month_key)]
+    pending = state.months_with_status(MONTH_LOADED, month_keys)
+    if not pending:
+        print(f"No loaded months to transform between {start_month_key} and {end_month_key}")
+        return []
+
+    print(f"Transforming data for {len(pending)} month(s): {pending}")
+    dbt_vars = json.dumps({"month_keys": pending})
+    run_dbt_command(["dbt", "run", "--selector", "dashboard_models", "--vars", dbt_vars])
+
+    for month_key in pending:
+        state.mark(month_key, MONTH_TRANSFORMED)
+    return pending
+
+
+def _month_key(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
+
@@ -1,40 +1,109 @@
 import os
 import json
-from datetime import datetime, timezone
+import hashlib
+from typing import Any, Dict, List, Optional
 
-from citibike.database.bigquery import initialize_bigquery_client
+import pandas as pd
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+from shapely.geometry import mapping
 
-def ingest_borough_boundaries():
-    """Load NYC borough boundaries from local JSON file to BigQuery raw table"""
+from citibike.database.bigquery import get_bigquery_client
+from citibike.geo.boroughs import clean_borough_geometry, load_borough_features
 
-    json_file_path = os.path.join(os.path.dirname(__file__), "../data/nyc_borough_boundaries.json")
+# Padding of each borough's bounding box, in degrees (~10 m), so that the box also
+# covers BigQuery's geodesic polygon edges, which bow slightly away from the planar ones
+BBOX_MARGIN_DEGREES = 1e-4
 
-    with open(json_file_path, "r") as f:
-        boundaries_data = json.load(f)
+BOUNDARY_COLUMNS = [
+    "borough_code", "borough_name", "feature_geojson",
+    "min_lng", "min_lat", "max_lng", "max_lat", "_fingerprint", "_ingested_at",
+]
 
-    print(f"Loaded {len(boundaries_data['features'])} borough boundaries from local file")
+def _table_id() -> str:
+    return f"{os.environ['GCP_PROJECT_ID']}.{os.environ['BQ_DATASET']}.raw_nyc_borough_boundaries"
 
-    # Prepare rows for BigQuery (one row per borough)
+def _feature_fingerprint(feature: Dict[str, Any]) -> str:
+    """Hash of a cleaned feature's content, independent of key order"""
+    canonical = json.dumps(feature, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def prepare_boundary_rows(features: List[Dict[str, Any]], ingested_at: pd.Timestamp,
+                          simplify_tolerance: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    raw_nyc_borough_boundaries rows of GeoJSON borough features: one row per borough,
+    with the cleaned feature, its padded bounding box and its content fingerprint
+    """
     rows = []
-    batch_key = datetime.now(timezone.utc).isoformat()
-    for feature in boundaries_data["features"]:
+    for feature in features:
+        geom = clean_borough_geometry(feature["geometry"], simplify_tolerance)
+        cleaned = {"type": "Feature", "properties": feature["properties"], "geometry": mapping(geom)}
+        min_lng, min_lat, max_lng, max_lat = geom.bounds
         rows.append({
             "borough_code": int(feature["properties"]["BoroCode"]),
             "borough_name": feature["properties"]["BoroName"],
-            "feature_geojson": json.dumps(feature), # Store complete feature
-            "_ingested_at": batch_key,
+            "feature_geojson": json.dumps(cleaned), # Store complete feature
+            "min_lng": min_lng - BBOX_MARGIN_DEGREES,
+            "min_lat": min_lat - BBOX_MARGIN_DEGREES,
+            "max_lng": max_lng + BBOX_MARGIN_DEGREES,
+            "max_lat": max_lat + BBOX_MARGIN_DEGREES,
+            "_fingerprint": _feature_fingerprint(cleaned),
+            "_ingested_at": ingested_at,
         })
-    
-    print(f"Prepared {len(rows)} borough boundaries for ingestion")
+    return rows
+
+def _read_saved_boundaries(client: bigquery.Client, table_id: str) -> pd.DataFrame:
+    """Saved rows, oldest first; empty if the table is missing"""
+    try:
+        df = client.list_rows(table_id).to_dataframe()
+    except NotFound as e:
+        print(f"No borough boundaries read from {table_id}: {e}")
+        return pd.DataFrame(columns=BOUNDARY_COLUMNS)
+    if "_fingerprint" not in df.columns:
+        # Rows appended before boundaries were fingerprinted never match
+        df["_fingerprint"] = None
+    return df.sort_values("_ingested_at")
+
+def ingest_borough_boundaries(client: Optional[bigquery.Client] = None,
+                              simplify_tolerance: Optional[float] = None) -> None:
+    """
+    Load NYC borough boundaries from the local JSON file to the BigQuery raw table.
+
+    Each borough's polygon is validated (and repaired) with shapely, simplified with
+    simplify_tolerance degrees (default: BOROUGH_SIMPLIFY_TOLERANCE env var, 0 for no
+    simplification) and hashed. raw_nyc_borough_boundaries holds one row per borough:
+    boroughs whose hash is unchanged keep their saved row, and if any borough changed
+    the table is replaced in one load job; otherwise nothing is written.
+    """
+    if simplify_tolerance is None:
+        simplify_tolerance = float(os.environ.get("BOROUGH_SIMPLIFY_TOLERANCE", 0))
+
+    features = load_borough_features()
+    print(f"Loaded {len(features)} borough boundaries from local file")
+
+    rows = prepare_boundary_rows(features, pd.Timestamp.now(tz="UTC"), simplify_tolerance)
 
-    # Insert to BigQuery
-    client = initialize_bigquery_client()
-    table_id = f"{os.environ['GCP_PROJECT_ID']}.{os.environ['BQ_DATASET']}.raw_nyc_borough_boundaries"
+    client = client or get_bigquery_client()
+    table_id = _table_id()
+    saved = _read_saved_boundaries(client, table_id)
+    # Earlier ingestions appended every run, so a borough may have several rows; the latest counts
+    saved_rows = {row["borough_code"]: row for row in saved.to_dict("records")}
 
-    errors = client.insert_rows_json(table_id, rows)
-    if errors:
-        raise RuntimeError(f"BigQuery insert failed: {errors}")
-    else:
-        print(f"Successfully inserted {len(rows)} rows to {table_id}")
+    changed = 0
+    for i, row in enumerate(rows):
+        saved_row = saved_rows.get(row["borough_code"])
+        if saved_row is not None and saved_row["_fingerprint"] == row["_fingerprint"]:
+            rows[i] = {**row, "_ingested_at": saved_row["_ingested_at"]}
+        else:
+            changed += 1
+    removed = set(saved_rows) - {row["borough_code"] for row in rows}
 
+    if not changed and not removed and len(saved) == len(rows):
+        print(f"Borough boundaries unchanged, nothing written to {table_id}")
+        return
 
+    df = pd.DataFrame(rows, columns=BOUNDARY_COLUMNS)
+    df["_ingested_at"] = pd.to_datetime(df["_ingested_at"], utc=True)
+    job_config = bigquery.LoadJobConfig(write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE)
+    client.load_table_from_dataframe(df, table_id, job_config=job_config).result()
+    print(f"{changed} new or changed borough boundaries, {len(removed)} removed; wrote {len(df)} rows to {table_id}")
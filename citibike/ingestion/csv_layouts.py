@@ -0,0 +1,150 @@
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Set
+
+import pyarrow.csv as pa_csv
+
+from citibike.ingestion.schemas import CURRENT_TRIP_CSV_SCHEMA, LEGACY_TRIP_CSV_SCHEMA, TRIP_CSV_TIMESTAMP_FORMATS
+from citibike.ingestion.zip_stream import CsvSource, open_csv_source, peek_csv_head
+
+# Bytes read from the start of a CSV to sniff its layout: enough for the header and
+# a first row, so routing a month's files decompresses almost nothing
+SNIFF_BYTES = 64 * 1024
+
+_ISO8601_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?")
+
+
+@dataclass(frozen=True, eq=False)
+class TripCsvLayout:
+    """
+    A header layout of the Citibike trip CSVs: the raw table its trips are loaded
+    into, that table's CSV schema, and the header names of the schema columns the
+    files spell differently. Jersey City files (JC-...) use the layouts of the NYC
+    files of their time.
+    """
+    name: str
+    table_name: str
+    schema: Dict[str, Any]
+    # File column -> schema column, for the columns named differently in the files
+    renamed_columns: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def header_columns(self) -> Set[str]:
+        """The columns of a file of this layout, as named in its header"""
+        schema_names = {schema_column: file_column for file_column, schema_column in self.renamed_columns.items()}
+        return {schema_names.get(column, column) for column in self.schema}
+
+    def schema_column(self, file_column: str) -> str:
+        return self.renamed_columns.get(file_column, file_column)
+
+
+# Every known layout of the trip CSVs, from 2013 to now
+TRIP_CSV_LAYOUTS: List[TripCsvLayout] = [
+    # February 2021 on
+    TripCsvLayout("current", "raw_trips_current", CURRENT_TRIP_CSV_SCHEMA),
+    # June 2013 to January 2021, apart from the title-case months
+    TripCsvLayout("legacy", "raw_trips_legacy", LEGACY_TRIP_CSV_SCHEMA),
+    # October 2016 to March 2017
+    TripCsvLayout("legacy_title_case", "raw_trips_legacy", LEGACY_TRIP_CSV_SCHEMA, {
+        'Trip Duration': 'tripduration',
+        'Start Time': 'starttime',
+        'Stop Time': 'stoptime',
+        'Start Station ID': 'start station id',
+        'Start Station Name': 'start station name',
+        'Start Station Latitude': 'start station latitude',
+        'Start Station Longitude': 'start station longitude',
+        'End Station ID': 'end station id',
+        'End Station Name': 'end station name',
+        'End Station Latitude': 'end station latitude',
+        'End Station Longitude': 'end station longitude',
+        'Bike ID': 'bikeid',
+        'User Type': 'usertype',
+        'Birth Year': 'birth year',
+        'Gender': 'gender',
+    }),
+]
+
+
+@dataclass(frozen=True, eq=False)
+class TripCsvFormat:
+    """
+    How to parse one CSV, sniffed from its first bytes: its layout, the schema
+    name of each of its columns (in file order), and the format of its timestamps.
+    """
+    layout: TripCsvLayout
+    column_names: List[str]
+    # pyarrow.csv.ISO8601 or one of the strptime formats of TRIP_CSV_TIMESTAMP_FORMATS
+    timestamp_format: Any
+
+    @property
+    def timestamp_parsers(self) -> List[Any]:
+        """Arrow timestamp parsers: the sniffed format first, the others after it for files mixing formats"""
+        return [self.timestamp_format] + [parser for parser in TRIP_CSV_TIMESTAMP_FORMATS if parser is not self.timestamp_format]
+
+    @property
+    def pandas_timestamp_format(self) -> str:
+        """The sniffed format as pd.to_datetime takes it, so pandas skips format inference"""
+        return "ISO8601" if self.timestamp_format is pa_csv.ISO8601 else self.timestamp_format
+
+
+def detect_trip_csv_layout(header: List[str]) -> TripCsvLayout:
+    """
+    The layout whose columns are exactly the given header's, in any order.
+
+    Raises:
+        ValueError: If no known layout has these columns
+    """
+    columns = set(header)
+    for layout in TRIP_CSV_LAYOUTS:
+        if columns == layout.header_columns and len(header) == len(columns):
+            return layout
+    raise ValueError(f"Unknown trip CSV layout with columns {header}; known layouts: {[layout.name for layout in TRIP_CSV_LAYOUTS]}")
+
+
+def sniff_trip_csv_format(head: bytes) -> TripCsvFormat:
+    """
+    The format of a CSV from its complete first lines (see peek_csv_head).
+
+    Raises:
+        ValueError: If the header isn't a known layout
+    """
+    rows = csv.reader(io.StringIO(head.decode("utf-8-sig", errors="replace")))
+    header = [column.strip() for column in next(rows, [])]
+    layout = detect_trip_csv_layout(header)
+    column_names = [layout.schema_column(column) for column in header]
+
+    first_row = dict(zip(column_names, next(rows, [])))
+    timestamps = [first_row[column] for column, dtype in layout.schema.items() if dtype == "datetime64[ns]" and first_row.get(column)]
+    return TripCsvFormat(layout, column_names, _sniff_timestamp_format(timestamps))
+
+
+def sniff_trip_csv_stream(stream: io.BufferedReader) -> TripCsvFormat:
+    """The format of a CSV opened as a buffered stream, peeked without consuming it"""
+    return sniff_trip_csv_format(peek_csv_head(stream, SNIFF_BYTES))
+
+
+def sniff_trip_csv(csv_source: CsvSource) -> TripCsvFormat:
+    """The format of a CSV file or zip member, reading only its first SNIFF_BYTES"""
+    with open_csv_source(csv_source, buffer_size=SNIFF_BYTES) as stream:
+        return sniff_trip_csv_stream(stream)
+
+
+def _sniff_timestamp_format(values: List[str]) -> Any:
+    """The first of TRIP_CSV_TIMESTAMP_FORMATS parsing every value (the first format if none does)"""
+    for timestamp_format in TRIP_CSV_TIMESTAMP_FORMATS:
+        if values and all(_parses_as(value, timestamp_format) for value in values):
+            return timestamp_format
+    return TRIP_CSV_TIMESTAMP_FORMATS[0]
+
+
+def _parses_as(value: str, timestamp_format: Any) -> bool:
+    if timestamp_format is pa_csv.ISO8601:
+        return _ISO8601_TIMESTAMP.fullmatch(value) is not None
+    try:
+        datetime.strptime(value, timestamp_format)
+        return True
+    except ValueError:
+        return False
@@ -1,39 +1,62 @@
 import os
 import requests
-import zipfile
-from typing import List
-from pathlib import Path
-import re
+import shutil
+from typing import List, Optional
 
+from citibike.utils.metrics import record, span
 from citibike.utils.storage import StorageLocation
+from citibike.ingestion.range_download import RangeRequestDownloader
+from citibike.ingestion.zip_stream import STREAM_BUFFER_BYTES, ZipMember, find_trip_csv_members
 
 class TripDataDownloader:
-    def __init__(self, storage: StorageLocation, base_url: str):
+    def __init__(self, storage: StorageLocation, base_url: str, download_engine: Optional[RangeRequestDownloader] = None):
         self.storage = storage
         self.base_url = base_url
+        # With an engine, zips are fetched through its resumable cache and are not cleaned up
+        self.download_engine = download_engine
         self.csv_files_created = []  # Track CSV files for data ingestion and eventual cleanup
         self.zip_files_created = []  # Track zip files for cleanup
+        self.csv_members: List[ZipMember] = []  # The month's CSVs inside the (possibly nested) zip
 
-    def download_month(self, year: int, month: int) -> None:
+    def download_month(self, year: int, month: int, extract: bool = True) -> None:
+        """
+        Download the zip holding a month's trips and locate its batch CSVs.
+
+        With extract=False the CSVs are left inside the zip, to be streamed from
+        csv_members; otherwise they are also extracted to csv_files_created.
+        """
         # Clear previous state
         self.csv_files_created.clear()
         self.zip_files_created.clear()
+        self.csv_members.clear()
 
         # Construct YYYYMM prefix of file we want
         year_month_prefix = f"{year:04d}{month:02d}"
 
-        # Construct filename and URL
-        filename = f"{year_month_prefix}-citibike-tripdata.zip" if year >= 2024 else f"{year:04d}-citibike-tripdata.zip"
-        url = f"{self.base_url}/{filename}"
-
         # Download and extract files
-        zip_path = self.storage.get_temp_path(filename)
-        self._download_file(url, zip_path)
-        self.zip_files_created.append(zip_path)  # Track for cleanup
+        url = self.month_url(year, month)
+        with span("trip.download", url=url) as download_span:
+            if self.download_engine is not None:
+                zip_path = self.download_engine.fetch(url)  # Cached; reused by later runs
+            else:
+                zip_path = self.storage.get_temp_path(os.path.basename(url))
+                self._download_file(url, zip_path)
+                self.zip_files_created.append(zip_path)  # Track for cleanup
+            download_span.add(zip_bytes=os.path.getsize(zip_path))
 
-        # Extract desired CSV files only
-        self._extract_csv_files(zip_path, year_month_prefix)
+        # Locate desired CSV files only, then extract them unless they will be streamed.
+        # A compressed nested zip is spooled next to the download once, and its CSVs
+        # are read from there; it is cleaned up even when the download is cached.
+        self.csv_members.extend(find_trip_csv_members(zip_path, year_month_prefix, spool_path=self.storage.get_temp_path))
+        self.zip_files_created.extend(sorted({member.archive_path for member in self.csv_members} - {zip_path}))
+        if extract:
+            self._extract_csv_files(zip_path)
     
+    def month_url(self, year: int, month: int) -> str:
+        """URL of the zip holding a month's trips; before 2024 one zip holds the whole year"""
+        filename = f"{year:04d}{month:02d}-citibike-tripdata.zip" if year >= 2024 else f"{year:04d}-citibike-tripdata.zip"
+        return f"{self.base_url}/{filename}"
+
     def _download_file(self, url: str, dest_path: str) -> None:
         response = requests.get(url, stream=True)
         response.raise_for_status()
@@ -41,44 +64,20 @@ class TripDataDownloader:
         with open(dest_path, 'wb') as f:
             for chunk in response.iter_content(chunk_size=65536):
                 f.write(chunk)
+                record(bytes=len(chunk))
     
-    def _extract_csv_files(self, zip_path: str, year_month_prefix: str) -> None:
+    def _extract_csv_files(self, zip_path: str) -> None:
         print(f"extracting from {zip_path}")
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            for file_info in zip_ref.infolist():
-                filename = file_info.filename
-                basename = os.path.basename(filename)
-                extension = Path(basename).suffix
-
-                # Case 1: We have to unzip YYYYMM-citibike-tripdata.zip first
-                if basename.startswith(year_month_prefix) and extension == ".zip":
-                    # TODO: unzip this archive and recursively extract csv files from it
-                    extracted_path = self.storage.get_temp_path(basename)
-
-                    with zip_ref.open(file_info) as source, open(extracted_path, 'wb') as target:
-                        target.write(source.read())
-                    
-                    self.zip_files_created.append(extracted_path)  # Track nested zip for cleanup
-                    next_zip_path = self.storage.get_temp_path(basename)
-                    print(f"recursively extract from {next_zip_path}")
-                    self._extract_csv_files(next_zip_path, year_month_prefix)
-                    return
-                
-                # Case 2: We have found a CSV file to extract
-                elif basename.startswith(year_month_prefix) and extension == ".csv":                    
-                    # Only extract files that start with the desired YYYYMM prefix
-                    # and end with a _N batch number (this ignores duplicate files with formatting issues)
-                    file_stem = Path(basename).stem               
-                    is_batch_file = bool(re.search(r"_\d", file_stem))
+        with span("trip.extract", zip_path=zip_path, files=len(self.csv_members)) as extract_span:
+            for member in self.csv_members:
+                # Extract to storage location, streaming so memory stays bounded
+                extracted_path = self.storage.get_temp_path(os.path.basename(member.name))
 
-                    if is_batch_file:
-                        # Extract to storage location
-                        extracted_path = self.storage.get_temp_path(basename)
+                with member.open() as source, open(extracted_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, STREAM_BUFFER_BYTES)
 
-                        with zip_ref.open(file_info) as source, open(extracted_path, 'wb') as target:
-                            target.write(source.read())
-                        
-                        self.csv_files_created.append(extracted_path)
+                extract_span.add(bytes=os.path.getsize(extracted_path))
+                self.csv_files_created.append(extracted_path)
 
     def get_all_files_for_cleanup(self) -> List[str]:
         """Return all files (CSV and ZIP) created during download/extraction for cleanup."""
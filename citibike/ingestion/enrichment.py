@@ -0,0 +1,42 @@
+from typing import Any, Dict, Optional
+
+from citibike.database.staging import BatchData
+from citibike.geo.boroughs import BoroughLocator
+from citibike.ingestion.quality import TripQualityFlags
+from citibike.ingestion.station_ids import StationDictionary
+from citibike.ingestion.trip_geography import add_borough_columns
+
+
+class TripBatchEnricher:
+    """
+    Everything ingestion does to a validated, metadata-stamped trip batch after
+    casting, with the state the batches of one month share. Applied to every batch
+    (or chunk) of every ingest path, so all batches reach the raw table with the
+    same columns. Columns are only added if the raw table has them (see
+    trips.trip_column_order):
+
+    - start_borough / end_borough from the coordinates (see trip_geography), only
+      with borough_columns; left null without a locator
+    - the data-quality flags, only with quality_flags, with duplicate ride keys
+      tracked across the month (see TripQualityFlags)
+    - station ids (normalized) and names interned into a StationDictionary
+
+    In parallel ingestion each worker process has its own enricher per batch, which
+    keeps the batch's ride keys (keep_ride_keys) so the parent process can flag the
+    rides repeated across batches against one set for the month.
+    """
+
+    def __init__(self, schema: Dict[str, Any], locator: Optional[BoroughLocator] = None, borough_columns: bool = False,
+                 quality_flags: bool = True, keep_ride_keys: bool = False):
+        self.schema = schema
+        self.locator = locator
+        self.borough_columns = borough_columns or locator is not None
+        self.quality = TripQualityFlags(schema, keep_ride_keys) if quality_flags else None
+        self.stations = StationDictionary()
+
+    def __call__(self, data: BatchData) -> BatchData:
+        if self.borough_columns:
+            data = add_borough_columns(data, self.schema, self.locator)
+        if self.quality:
+            data = self.quality.add_flags(data)
+        return self.stations.encode(data, self.schema)
@@ -0,0 +1,255 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Any, Dict, List, Tuple
+
+from citibike.database.staging import BatchData
+from citibike.ingestion.schemas import TRIP_QUALITY_FLAG_COLUMNS, TRIP_QUALITY_INPUT_COLUMNS, TRIP_RIDE_KEY_COLUMNS
+from citibike.utils.date_helpers import now_nyc_datetime
+from citibike.utils.metrics import record, timed
+
+# Same thresholds as the flags silver_trips computes for trips loaded without them
+# (and the citibike_inception_date / is_geographic_outlier macros)
+CITIBIKE_INCEPTION_DATE = np.datetime64("2013-05-27")
+MIN_TRIP_SECONDS = 60
+MAX_TRIP_SECONDS = 60 * 60 * 24
+NYC_LAT_RANGE = (40.4, 41.0)
+NYC_LNG_RANGE = (-74.3, -73.7)
+
+# Hash standing in for a null dictionary-encoded value (values of null rows are arbitrary)
+_NULL_HASH = np.uint64(0)
+
+# Combines the hashes of a ride key's columns (the 64-bit FNV prime)
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+
+
+class RideKeySet:
+    """
+    Hashes of the ride keys seen in a month's batches so far: a sorted uint64 array,
+    8 bytes per trip, checked and extended one batch at a time with array operations.
+
+    A trip is a duplicate when its key appears more than once in its batch, or
+    appeared in an earlier batch. The first occurrence of a key repeated across
+    batches is in a batch already loaded, so it stays unflagged. A trip with a
+    missing key field is never a duplicate: its ride_id is null in SQL, which
+    silver_trips' join on ride_id never matches either.
+
+    Parallel ingestion flags each file against its own set in a worker, then
+    checks the files' ride keys against one set for the month, in file order.
+    """
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def mark(self, hashes: np.ndarray, is_null: np.ndarray) -> np.ndarray:
+        """Whether each hash is a duplicate, then add the hashes of non-null keys to the set"""
+        is_duplicate = np.zeros(len(hashes), dtype=bool)
+        keys = hashes[~is_null]
+        is_duplicate[~is_null] = pd.Series(keys).duplicated(keep=False).to_numpy() | self.seen(keys)
+        self.add(keys)
+        return is_duplicate
+
+    def seen(self, hashes: np.ndarray) -> np.ndarray:
+        """Whether each hash is already in the set"""
+        if not len(self.hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        return self.hashes[positions] == hashes
+
+    def add(self, hashes: np.ndarray) -> None:
+        # Repeated hashes may stay in the array; searchsorted only needs it sorted
+        self.hashes = np.sort(np.concatenate([self.hashes, hashes]))
+
+
+class TripQualityFlags:
+    """
+    Vectorized data-quality flags of validated trip batches, the ones silver_trips
+    used to derive on every dbt run:
+
+    - is_temporal_outlier: under a minute or over a day long, ending before it
+      starts, or starting before Citibike's launch or after now
+    - is_geography_quality_issue: a missing coordinate, or one outside NYC
+    - is_data_integrity_issue: a missing station id, or a test ride_id
+    - is_duplicate_ride: a ride key seen more than once in the month (see RideKeySet)
+
+    Conditions on missing values count as false, like the SQL CASE expressions did.
+    With keep_ride_keys, the ride key hashes of every row flagged so far are kept
+    for kept_ride_keys() (see RideKeySet for parallel ingestion).
+    """
+
+    def __init__(self, schema: Dict[str, Any], keep_ride_keys: bool = False):
+        layout = 0 if "ride_id" in schema else 1
+        self.columns = {role: names[layout] for role, names in TRIP_QUALITY_INPUT_COLUMNS.items()}
+        self.ride_key_columns: List[str] = TRIP_RIDE_KEY_COLUMNS[layout]
+        # Legacy files carry their own duration; current ones are timed from the timestamps
+        self.duration_column = "tripduration" if "tripduration" in schema else None
+        self.ride_keys = RideKeySet()
+        self.keep_ride_keys = keep_ride_keys
+        self._kept_ride_keys: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    @timed("trip.quality_flags")
+    def add_flags(self, data: BatchData) -> BatchData:
+        """
+        Append the flag columns to a validated dataframe or arrow table and record the
+        batch's counts as its quality report. Dataframes get the columns in place;
+        arrow tables (or record batches) get a new table.
+        """
+        if isinstance(data, pa.RecordBatch):
+            data = pa.Table.from_batches([data])
+
+        flags = self.compute(data)
+        for column, values in flags.items():
+            if isinstance(data, pa.Table):
+                data = data.append_column(column, pa.array(values))
+            else:
+                data[column] = values
+
+        num_rows = _num_rows(data)
+        report = {column: int(values.sum()) for column, values in flags.items()}
+        record(rows=num_rows, batch_key=_batch_key_of(data), **report)
+        if num_rows:
+            print(f"quality flags for {num_rows} rows: " + ", ".join(f"{column} {count}" for column, count in report.items()))
+        return data
+
+    def compute(self, data: BatchData) -> Dict[str, np.ndarray]:
+        """The flag columns of a batch, as boolean arrays"""
+        started_at = _to_numpy(data, self.columns["started_at"])
+        ended_at = _to_numpy(data, self.columns["ended_at"])
+        if self.duration_column:
+            duration = _to_numpy(data, self.duration_column).astype(np.float64)
+        else:
+            # DATETIME_DIFF(..., SECOND) counts second boundaries
+            seconds = ended_at.astype("datetime64[s]") - started_at.astype("datetime64[s]")
+            duration = np.where(np.isnat(seconds), np.nan, seconds.astype(np.float64))
+
+        is_temporal_outlier = (
+            (duration < MIN_TRIP_SECONDS)
+            | (duration > MAX_TRIP_SECONDS)
+            | (started_at > np.datetime64(now_nyc_datetime()))
+            | (started_at < CITIBIKE_INCEPTION_DATE)
+            | (ended_at < started_at)
+        )
+
+        is_geography_quality_issue = np.zeros(len(started_at), dtype=bool)
+        for lat_role, lng_role in (("start_lat", "start_lng"), ("end_lat", "end_lng")):
+            lat = _to_numpy(data, self.columns[lat_role])
+            lng = _to_numpy(data, self.columns[lng_role])
+            # NaN fails every comparison, so missing coordinates are caught by the inner check
+            is_geography_quality_issue |= ~(
+                (lat >= NYC_LAT_RANGE[0]) & (lat <= NYC_LAT_RANGE[1])
+                & (lng >= NYC_LNG_RANGE[0]) & (lng <= NYC_LNG_RANGE[1])
+            )
+
+        is_data_integrity_issue = (
+            _is_null(data, self.columns["start_station_id"])
+            | _is_null(data, self.columns["end_station_id"])
+        )
+        if "ride_id" in self.ride_key_columns:
+            is_data_integrity_issue |= _contains(data, "ride_id", "test")
+
+        ride_keys = self.ride_key_hashes(data)
+        if self.keep_ride_keys:
+            self._kept_ride_keys.append(ride_keys)
+
+        return dict(zip(TRIP_QUALITY_FLAG_COLUMNS, (
+            is_temporal_outlier,
+            is_geography_quality_issue,
+            is_data_integrity_issue,
+            self.ride_keys.mark(*ride_keys),
+        )))
+
+    def kept_ride_keys(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The ride key hashes and null masks (see ride_key_hashes) of every row flagged so far, in order"""
+        if not self._kept_ride_keys:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=bool)
+        hashes, is_null = zip(*self._kept_ride_keys)
+        return np.concatenate(hashes), np.concatenate(is_null)
+
+    def ride_key_hashes(self, data: BatchData) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        64-bit hash of each trip's ride key columns, the same in every process for the
+        same values and column types, and whether any of the trip's key columns is null
+        """
+        hashes = np.zeros(_num_rows(data), dtype=np.uint64)
+        is_null = np.zeros(len(hashes), dtype=bool)
+        for column in self.ride_key_columns:
+            hashes = _mix(hashes * _HASH_MULTIPLIER ^ _column_hashes(data, column))
+            is_null |= _is_null(data, column)
+        return hashes, is_null
+
+
+def _column_hashes(data: BatchData, column: str) -> np.ndarray:
+    """
+    uint64 per value of a column: numbers and timestamps as their bits, strings
+    through pandas' hash_array (once per dictionary value for encoded columns),
+    which unlike Python's str hash isn't salted per process.
+    Values of null rows are arbitrary.
+    """
+    values = data[column]
+    if isinstance(data, pa.Table):
+        values = values.combine_chunks()
+        if pa.types.is_dictionary(values.type):
+            return _take_hashes(values.dictionary.to_numpy(zero_copy_only=False), values.indices.fill_null(-1).to_numpy())
+        if pa.types.is_string(values.type):
+            return _hash_strings(values.to_numpy(zero_copy_only=False))
+        return values.cast(pa.int64()).fill_null(0).to_numpy().view(np.uint64)
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return _take_hashes(values.cat.categories.to_numpy(), values.cat.codes.to_numpy())
+    if values.dtype == "string":
+        return _hash_strings(values.to_numpy(object, na_value=None))
+    if values.dtype == "Int64":
+        return values.to_numpy(np.int64, na_value=0).view(np.uint64)
+    return values.to_numpy().view(np.uint64)
+
+
+def _hash_strings(values: np.ndarray) -> np.ndarray:
+    return pd.util.hash_array(values, categorize=False)
+
+
+def _take_hashes(dictionary: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """Hashes of dictionary-encoded strings, hashing each dictionary value once (index -1 for nulls)"""
+    return np.append(_hash_strings(dictionary), _NULL_HASH)[indices]
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so combined column hashes spread over all 64 bits"""
+    hashes = (hashes ^ (hashes >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    hashes = (hashes ^ (hashes >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return hashes ^ (hashes >> np.uint64(31))
+
+
+def _num_rows(data: BatchData) -> int:
+    return data.num_rows if isinstance(data, pa.Table) else len(data)
+
+
+def _to_numpy(data: BatchData, column: str) -> np.ndarray:
+    """A numeric or timestamp column as a numpy array, with nulls as NaN / NaT"""
+    if isinstance(data, pa.Table):
+        values = data[column]
+        if pa.types.is_floating(values.type):
+            values = values.fill_null(np.nan)
+        return values.to_numpy()
+    if data[column].dtype == "Int64":
+        return data[column].to_numpy(np.float64, na_value=np.nan)
+    return data[column].to_numpy()
+
+
+def _is_null(data: BatchData, column: str) -> np.ndarray:
+    if isinstance(data, pa.Table):
+        return data[column].is_null().to_numpy(zero_copy_only=False)
+    return data[column].isna().to_numpy()
+
+
+def _contains(data: BatchData, column: str, substring: str) -> np.ndarray:
+    """Whether each value of a string column contains substring (case-sensitive, like LIKE)"""
+    if isinstance(data, pa.Table):
+        return pc.match_substring(data[column], substring).fill_null(False).to_numpy(zero_copy_only=False)
+    return data[column].str.contains(substring, regex=False).fillna(False).to_numpy(dtype=bool)
+
+
+def _batch_key_of(data: BatchData) -> Any:
+    if isinstance(data, pa.Table):
+        return data["_batch_key"][0].as_py() if data.num_rows else None
+    return data["_batch_key"].iat[0] if len(data) else None
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from citibike.utils.metrics import record
+from citibike.utils.storage import StorageLocation
+
+# Subdirectory of the storage location holding completed downloads and their metadata
+DOWNLOAD_CACHE_DIR = "download_cache"
+
+DEFAULT_CONNECTIONS = 4
+DEFAULT_PART_SIZE_MB = 32
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 1.0
+
+# Status codes worth retrying; anything else in 4xx fails immediately
+_RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# S3 (which serves the trip data) uses the content MD5 as the ETag for single-part uploads
+_MD5_ETAG = re.compile(r'^(?:W/)?"?([0-9a-f]{32})"?$')
+
+# Guards the URL -> cache path index when several downloads run at once
+_INDEX_LOCK = threading.Lock()
+
+
+@dataclass
+class RemoteFile:
+    """What a HEAD request tells us about a remote file"""
+    url: str
+    size: Optional[int]
+    etag: Optional[str]
+    accepts_ranges: bool
+
+
+class RangeRequestDownloader:
+    """
+    Download engine for large files: parallel HTTP range requests, resumable partial
+    files, retries with exponential backoff, and a content-addressed cache.
+
+    Completed downloads live under DOWNLOAD_CACHE_DIR in the storage location, named
+    by a hash of URL + ETag, next to a .json metadata file recording the size and
+    sha256. fetch() on a URL already in the cache returns the cached path without
+    touching the network (unless revalidate=True, which costs one HEAD request).
+
+    An interrupted download leaves a .part file plus a .progress.json listing the
+    finished parts; the next fetch() of the same URL and ETag resumes from there.
+    """
+
+    def __init__(self,
+                 storage: StorageLocation,
+                 connections: int = DEFAULT_CONNECTIONS,
+                 part_size_mb: int = DEFAULT_PART_SIZE_MB,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+                 timeout_seconds: float = 60.0,
+                 revalidate: bool = False,
+                 sleep: Callable[[float], None] = time.sleep):
+        if connections < 1:
+            raise ValueError(f"connections must be at least 1, got {connections}")
+        self.storage = storage
+        self.connections = connections
+        self.part_size = part_size_mb * 1024 * 1024
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.revalidate = revalidate
+        self._sleep = sleep
+        self._sessions = threading.local()
+
+    def fetch(self, url: str) -> str:
+        """
+        Return the local path of the complete file at url, downloading whatever is
+        not already cached. The returned file belongs to the cache; don't clean it up.
+
+        Raises:
+            Exception: If the download fails after retries or fails checksum verification
+        """
+        if not self.revalidate:
+            cached = self._lookup_cached(url)
+            if cached:
+                print(f"using cached download {cached} for {url}")
+                return cached
+
+        remote = self._head(url)
+        cache_path = self.cache_path(url, remote.etag)
+        if self._is_valid_cache_entry(cache_path, remote):
+            print(f"using cached download {cache_path} for {url}")
+            self._record_latest(url, cache_path)
+            return cache_path
+
+        if remote.accepts_ranges and remote.size:
+            self._download_in_parts(remote, cache_path)
+        else:
+            self._download_whole(remote, cache_path)
+
+        self._record_latest(url, cache_path)
+        return cache_path
+
+    def evict(self, url: str) -> None:
+        """Drop the cached download of url, e.g. once every month it holds has been loaded"""
+        index_path = self._index_path()
+        with _INDEX_LOCK:
+            index = _read_json(index_path)
+            cache_path = index.pop(url, None)
+            _write_json(index_path, index)
+        if cache_path:
+            self.storage.cleanup([cache_path, _meta_path(cache_path)])
+
+    def cache_path(self, url: str, etag: Optional[str]) -> str:
+        """Cache location for a URL at a given ETag"""
+        key = hashlib.sha256(f"{url}\n{etag or ''}".encode()).hexdigest()[:32]
+        suffix = Path(url.split("?")[0]).suffix
+        return self._cache_file(f"{key}{suffix}")
+
+    def _cache_file(self, filename: str) -> str:
+        path = Path(self.storage.get_temp_path(os.path.join(DOWNLOAD_CACHE_DIR, filename)))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return str(path)
+
+    # ---- cache bookkeeping ----
+
+    def _lookup_cached(self, url: str) -> Optional[str]:
+        """Path of the last verified download of url, if it is still intact"""
+        index = _read_json(self._index_path())
+        cache_path = index.get(url)
+        if not cache_path:
+            return None
+        meta = _read_json(_meta_path(cache_path))
+        if meta.get("url") != url or not self.storage.exists(cache_path):
+            return None
+        if os.path.getsize(cache_path) != meta.get("size"):
+            return None
+        return cache_path
+
+    def _is_valid_cache_entry(self, cache_path: str, remote: RemoteFile) -> bool:
+        if not self.storage.exists(cache_path):
+            return False
+        meta = _read_json(_meta_path(cache_path))
+        size = os.path.getsize(cache_path)
+        return meta.get("etag") == remote.etag and meta.get("size") == size and remote.size in (None, size)
+
+    def _index_path(self) -> str:
+        return self._cache_file("index.json")
+
+    def _record_latest(self, url: str, cache_path: str) -> None:
+        index_path = self._index_path()
+        with _INDEX_LOCK:
+            index = _read_json(index_path)
+            index[url] = cache_path
+            _write_json(index_path, index)
+
+    def _finalize(self, remote: RemoteFile, part_path: str, cache_path: str) -> None:
+        """Verify a completed .part file, then move it into the cache with its metadata"""
+        size = os.path.getsize(part_path)
+        if remote.size is not None and size != remote.size:
+            raise Exception(f"Download of {remote.url} is {size} bytes, expected {remote.size}")
+
+        sha256, md5 = _file_digests(part_path)
+        etag_md5 = _MD5_ETAG.match(remote.etag or "")
+        if etag_md5 and etag_md5.group(1) != md5:
+            os.remove(part_path)
+            raise Exception(f"Checksum mismatch for {remote.url}: ETag {remote.etag}, got md5 {md5}")
+
+        _write_json(_meta_path(cache_path), {"url": remote.url, "etag": remote.etag, "size": size, "sha256": sha256})
+        os.replace(part_path, cache_path)
+        print(f"downloaded {remote.url} ({size} bytes) to {cache_path}")
+        record(bytes=size)  # Cache hits add nothing to the download span
+
+    # ---- transfer ----
+
+    def _head(self, url: str) -> RemoteFile:
+        response = self._request("HEAD", url)
+        size = response.headers.get("Content-Length")
+        return RemoteFile(
+            url=url,
+            size=int(size) if size is not None else None,
+            etag=response.headers.get("ETag") or response.headers.get("Last-Modified"),
+            accepts_ranges=response.headers.get("Accept-Ranges", "").lower() == "bytes",
+        )
+
+    def _download_in_parts(self, remote: RemoteFile, cache_path: str) -> None:
+        part_path = f"{cache_path}.part"
+        progress_path = f"{cache_path}.progress.json"
+        parts = _split_ranges(remote.size, self.part_size)
+
+        # Resume only if the partial file belongs to this exact version of the remote file
+        progress = _read_json(progress_path)
+        if progress.get("etag") == remote.etag and progress.get("size") == remote.size and os.path.exists(part_path):
+            done = set(progress.get("done", []))
+        else:
+            done = set()
+            with open(part_path, "wb") as f:
+                f.truncate(remote.size)
+        _write_json(progress_path, {"etag": remote.etag, "size": remote.size, "done": sorted(done)})
+
+        pending = [index for index in range(len(parts)) if index not in done]
+        print(f"downloading {remote.url}: {len(pending)} of {len(parts)} parts over {self.connections} connections")
+
+        lock = threading.Lock()
+
+        def fetch_part(index: int) -> None:
+            start, end = parts[index]
+            self._download_range(remote.url, part_path, start, end)
+            with lock:
+                done.add(index)
+                _write_json(progress_path, {"etag": remote.etag, "size": remote.size, "done": sorted(done)})
+
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            # list() re-raises the first part failure; finished parts stay recorded for resume
+            list(executor.map(fetch_part, pending))
+
+        self._finalize(remote, part_path, cache_path)
+        os.remove(progress_path)
+
+    def _download_range(self, url: str, part_path: str, start: int, end: int) -> None:
+        """Fetch bytes [start, end] into the same offsets of part_path, retrying on failure"""
+        def attempt() -> None:
+            response = self._session().get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=self.timeout_seconds)
+            _raise_for_status(response)
+            if response.status_code != 206:
+                raise Exception(f"Server ignored range request for {url} (status {response.status_code})")
+
+            written = 0
+            with open(part_path, "r+b") as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+                    written += len(chunk)
+            if written != end - start + 1:
+                raise _RetryableError(f"Short read for {url} bytes {start}-{end}: got {written} bytes")
+
+        self._with_retries(attempt, f"{url} bytes {start}-{end}")
+
+    def _download_whole(self, remote: RemoteFile, cache_path: str) -> None:
+        """Single-stream fallback for servers without range support"""
+        part_path = f"{cache_path}.part"
+
+        def attempt() -> None:
+            response = self._session().get(remote.url, stream=True, timeout=self.timeout_seconds)
+            _raise_for_status(response)
+            with open(part_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+
+        self._with_retries(attempt, remote.url)
+        self._finalize(remote, part_path, cache_path)
+
+    def _request(self, method: str, url: str) -> requests.Response:
+        def attempt() -> requests.Response:
+            response = self._session().request(method, url, timeout=self.timeout_seconds, allow_redirects=True)
+            _raise_for_status(response)
+            return response
+
+        return self._with_retries(attempt, f"{method} {url}")
+
+    def _with_retries(self, attempt: Callable[[], Any], description: str) -> Any:
+        for retry in range(self.max_retries + 1):
+            try:
+                return attempt()
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, _RetryableError) as e:
+                if retry == self.max_retries:
+                    raise Exception(f"Giving up on {description} after {self.max_retries} retries: {e}")
+                delay = self.backoff_seconds * (2 ** retry)
+                print(f"retrying {description} in {delay:.1f}s ({e})")
+                self._sleep(delay)
+
+    def _session(self) -> requests.Session:
+        """One pooled session per worker thread"""
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._sessions.session = session
+        return session
+
+
+class _RetryableError(Exception):
+    pass
+
+
+def _raise_for_status(response: requests.Response) -> None:
+    if response.status_code in _RETRYABLE_STATUS:
+        raise _RetryableError(f"HTTP {response.status_code} from {response.url}")
+    response.raise_for_status()
+
+
+def _split_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """Inclusive byte ranges covering [0, size)"""
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+def _file_digests(path: str) -> Tuple[str, str]:
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            sha256.update(block)
+            md5.update(block)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def _meta_path(cache_path: str) -> str:
+    return f"{cache_path}.json"
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    """Write atomically so an interrupted run never leaves a truncated index or progress file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
@@ -1,4 +1,6 @@
-from typing import Any, Dict
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from typing import Any, Dict, List, Tuple
 
 # What we expect from Citibike CSV files (2020+)
 CURRENT_TRIP_CSV_SCHEMA: Dict[str, Any] = {
@@ -48,4 +50,74 @@ LEGACY_TRIP_BQ_SCHEMA = {
     **LEGACY_TRIP_CSV_SCHEMA,
     '_ingested_at': 'datetime64[ns]',
     '_batch_key': 'string',
-}
\ No newline at end of file
+}
+
+# Borough of each trip endpoint, which ingestion can derive from its coordinates
+# (see citibike.geo.boroughs), and the (latitude, longitude) columns it comes from in
+# each CSV layout. Stored after the metadata columns in the raw tables.
+TRIP_BOROUGH_COLUMNS: Dict[str, List[Tuple[str, str]]] = {
+    'start_borough': [('start_lat', 'start_lng'), ('start station latitude', 'start station longitude')],
+    'end_borough': [('end_lat', 'end_lng'), ('end station latitude', 'end station longitude')],
+}
+
+# Station id and name columns of both CSV layouts; a few thousand distinct values
+# each, interned across a month's batches (see citibike.ingestion.station_ids)
+TRIP_STATION_ID_COLUMNS = ['start_station_id', 'end_station_id', 'start station id', 'end station id']
+TRIP_STATION_NAME_COLUMNS = ['start_station_name', 'end_station_name', 'start station name', 'end station name']
+
+# Data-quality flags computed at ingestion (see citibike.ingestion.quality), stored
+# after the borough columns in the raw tables
+TRIP_QUALITY_FLAG_COLUMNS = ['is_temporal_outlier', 'is_geography_quality_issue', 'is_data_integrity_issue', 'is_duplicate_ride']
+
+# Columns the quality flags are computed from, as (current, legacy) layout names
+TRIP_QUALITY_INPUT_COLUMNS: Dict[str, Tuple[str, str]] = {
+    'started_at': ('started_at', 'starttime'),
+    'ended_at': ('ended_at', 'stoptime'),
+    'start_lat': ('start_lat', 'start station latitude'),
+    'start_lng': ('start_lng', 'start station longitude'),
+    'end_lat': ('end_lat', 'end station latitude'),
+    'end_lng': ('end_lng', 'end station longitude'),
+    'start_station_id': ('start_station_id', 'start station id'),
+    'end_station_id': ('end_station_id', 'end station id'),
+}
+
+# Columns identifying a trip: the ride_id, or for legacy trips the fields
+# stg_trips_legacy hashes into the ride_id it generates
+TRIP_RIDE_KEY_COLUMNS: Tuple[List[str], List[str]] = (
+    ['ride_id'],
+    ['starttime', 'stoptime', 'start station id', 'end station id', 'bikeid'],
+)
+
+# Low-cardinality string columns, read as dictionary-encoded arrow strings
+DICTIONARY_ENCODED_COLUMNS = {'rideable_type', 'member_casual', 'usertype', *TRIP_STATION_ID_COLUMNS, *TRIP_STATION_NAME_COLUMNS}
+
+# Timestamp layouts seen across Citibike CSVs, tried in order by the arrow parser
+# (ISO8601 covers "2024-01-01 08:00:00" and fractional seconds like "2019-01-01 00:01:47.4010")
+TRIP_CSV_TIMESTAMP_FORMATS: List[Any] = [
+    pa_csv.ISO8601,
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+]
+
+# Cell values read as null (legacy files use \N for a missing birth year)
+TRIP_CSV_NULL_VALUES = ['', 'NULL', 'NaN', '\\N']
+
+# Arrow equivalents of the pandas dtypes used in the schemas above
+_ARROW_TYPES = {
+    'string': pa.string(),
+    'datetime64[ns]': pa.timestamp('us'),
+    'float64': pa.float64(),
+    'int64': pa.int64(),
+    'Int64': pa.int64(),
+}
+
+
+def to_arrow_column_types(schema: Dict[str, Any]) -> Dict[str, pa.DataType]:
+    """Map a pandas CSV schema to arrow column types for pyarrow.csv"""
+    column_types = {}
+    for column, dtype in schema.items():
+        if column in DICTIONARY_ENCODED_COLUMNS:
+            column_types[column] = pa.dictionary(pa.int32(), pa.string())
+        else:
+            column_types[column] = _ARROW_TYPES[dtype]
+    return column_types
@@ -0,0 +1,111 @@
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Any, Callable, Dict, List, Optional
+
+from citibike.database.staging import BatchData
+from citibike.ingestion.schemas import TRIP_STATION_ID_COLUMNS, TRIP_STATION_NAME_COLUMNS
+from citibike.utils.metrics import record, timed
+
+# Current-format station ids: a number with a decimal part (e.g. "6865.03")
+_DECIMAL_STATION_ID = re.compile(r"[0-9]+\.[0-9]+")
+
+
+def normalize_station_id(station_id: Optional[str]) -> Optional[str]:
+    """
+    Python counterpart of the normalize_station_id dbt macro: decimal station ids get
+    exactly two decimals ("6865.3" -> "6865.30"), anything else is returned as is
+    """
+    if station_id is not None and _DECIMAL_STATION_ID.fullmatch(station_id):
+        return f"{float(station_id):.2f}"
+    return station_id
+
+
+class StringDictionary:
+    """
+    Growing dictionary of strings, interning the values of every batch it encodes to
+    the same integer codes (the index of the value in values).
+
+    An optional normalize function is applied once per distinct value, when a value
+    is first seen, instead of on every row. Values that normalize to the same string
+    share a code.
+    """
+
+    def __init__(self, normalize: Optional[Callable[[str], str]] = None):
+        self.normalize = normalize
+        self.values: List[str] = []
+        self._value_codes: Dict[str, int] = {}  # normalized value -> code
+        self._raw_codes: Dict[str, int] = {}  # value as seen in a batch -> code
+
+    def codes_of(self, values: List[str]) -> np.ndarray:
+        """Codes of distinct raw values, interning the ones not seen before"""
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = self._raw_codes.get(value)
+            if code is None:
+                normalized = self.normalize(value) if self.normalize else value
+                code = self._value_codes.setdefault(normalized, len(self.values))
+                if code == len(self.values):
+                    self.values.append(normalized)
+                self._raw_codes[value] = code
+            codes[i] = code
+        return codes
+
+    def encode_arrow(self, column: pa.ChunkedArray | pa.Array) -> pa.DictionaryArray:
+        """A string or dictionary column as a dictionary array over this dictionary"""
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+        if not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        codes = pa.array(self.codes_of(column.dictionary.to_pylist()))
+        return pa.DictionaryArray.from_arrays(codes.take(column.indices), pa.array(self.values, pa.string()))
+
+    def encode_pandas(self, column: pd.Series) -> pd.Series:
+        """A string column as a categorical whose categories are this dictionary"""
+        local_codes, uniques = pd.factorize(column)
+        codes = self.codes_of(list(uniques))
+        # factorize marks missing values with -1, as from_codes expects
+        global_codes = np.where(local_codes >= 0, codes[np.maximum(local_codes, 0)], -1)
+        return pd.Series(pd.Categorical.from_codes(global_codes, categories=pd.Index(self.values)), index=column.index, name=column.name)
+
+
+class StationDictionary:
+    """
+    Station ids and names of a month's trips, interned across its batches: every
+    start and end station id column is encoded with one dictionary (normalized like
+    the normalize_station_id macro as values are first seen) and every name column
+    with another.
+
+    Both engines then carry these columns dictionary-encoded (arrow dictionary
+    arrays, pandas categoricals) instead of one string per row, and the Parquet
+    loaded to BigQuery stores each column chunk as codes plus one dictionary page.
+    """
+
+    def __init__(self):
+        self.station_ids = StringDictionary(normalize_station_id)
+        self.station_names = StringDictionary()
+
+    @timed("trip.intern_stations")
+    def encode(self, data: BatchData, schema: Dict[str, Any]) -> BatchData:
+        """
+        Replace a batch's station id and name columns with their encoded versions.
+        Dataframes are changed in place; arrow tables (or record batches) get a new table.
+        """
+        if isinstance(data, pa.RecordBatch):
+            data = pa.Table.from_batches([data])
+        record(rows=data.num_rows if isinstance(data, pa.Table) else len(data))
+
+        for columns, dictionary in ((TRIP_STATION_ID_COLUMNS, self.station_ids), (TRIP_STATION_NAME_COLUMNS, self.station_names)):
+            for column in columns:
+                if column not in schema:
+                    continue
+                if isinstance(data, pa.Table):
+                    index = data.schema.get_field_index(column)
+                    data = data.set_column(index, column, dictionary.encode_arrow(data[column]))
+                else:
+                    data[column] = dictionary.encode_pandas(data[column])
+
+        record(station_ids=len(self.station_ids.values), station_names=len(self.station_names.values))
+        return data
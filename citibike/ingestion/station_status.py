@@ -0,0 +1,303 @@
+import asyncio
+import io
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+from citibike.database.bigquery import get_bigquery_client
+
+# Poll interval when a GBFS response has no ttl, and the floor under short ttls
+DEFAULT_POLL_SECONDS = 60
+MIN_POLL_SECONDS = 5
+
+# Micro-batches: buffered rows are loaded every flush interval, or sooner once this many are waiting
+DEFAULT_FLUSH_INTERVAL_SECONDS = 5 * 60
+DEFAULT_MAX_BUFFERED_ROWS = 200_000
+
+# Wait before retrying a feed after a failed request
+RETRY_SECONDS = 10
+
+STATION_STATUS_SCHEMA = pa.schema([
+    ("station_id", pa.string()),
+    ("num_bikes_available", pa.int64()),
+    ("num_ebikes_available", pa.int64()),
+    ("num_bikes_disabled", pa.int64()),
+    ("num_docks_available", pa.int64()),
+    ("num_docks_disabled", pa.int64()),
+    ("is_installed", pa.bool_()),
+    ("is_renting", pa.bool_()),
+    ("is_returning", pa.bool_()),
+    ("last_reported", pa.timestamp("us", tz="UTC")),
+    ("api_last_updated", pa.timestamp("us", tz="UTC")),
+    ("_ingested_at", pa.timestamp("us", tz="UTC")),
+])
+
+FREE_BIKE_STATUS_SCHEMA = pa.schema([
+    ("bike_id", pa.string()),
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("is_reserved", pa.bool_()),
+    ("is_disabled", pa.bool_()),
+    ("vehicle_type_id", pa.string()),
+    ("api_last_updated", pa.timestamp("us", tz="UTC")),
+    ("_ingested_at", pa.timestamp("us", tz="UTC")),
+])
+
+# Columns that only say when a row was seen, not what it says; ignored when detecting changes
+_OBSERVATION_COLUMNS = ("api_last_updated", "_ingested_at")
+
+
+def _posix_to_datetime(value: Any) -> Optional[datetime]:
+    return datetime.fromtimestamp(int(value), tz=timezone.utc) if value is not None else None
+
+def _optional_bool(value: Any) -> Optional[bool]:
+    # GBFS v1 feeds report booleans as 0 / 1
+    return bool(value) if value is not None else None
+
+def parse_station_status(payload: Dict[str, Any], ingested_at: datetime) -> List[Dict[str, Any]]:
+    """raw_station_status rows from a station_status.json document"""
+    api_last_updated = _posix_to_datetime(payload.get("last_updated"))
+    rows = []
+    for station in payload.get("data", {}).get("stations", []):
+        if not station.get("station_id"):
+            print(f"Skipping station status without station_id: {station}")
+            continue
+        rows.append({
+            "station_id": str(station["station_id"]),
+            "num_bikes_available": station.get("num_bikes_available"),
+            "num_ebikes_available": station.get("num_ebikes_available"),
+            "num_bikes_disabled": station.get("num_bikes_disabled"),
+            "num_docks_available": station.get("num_docks_available"),
+            "num_docks_disabled": station.get("num_docks_disabled"),
+            "is_installed": _optional_bool(station.get("is_installed")),
+            "is_renting": _optional_bool(station.get("is_renting")),
+            "is_returning": _optional_bool(station.get("is_returning")),
+            "last_reported": _posix_to_datetime(station.get("last_reported")),
+            "api_last_updated": api_last_updated,
+            "_ingested_at": ingested_at,
+        })
+    return rows
+
+def parse_free_bike_status(payload: Dict[str, Any], ingested_at: datetime) -> List[Dict[str, Any]]:
+    """raw_free_bike_status rows from a free_bike_status.json document"""
+    api_last_updated = _posix_to_datetime(payload.get("last_updated"))
+    rows = []
+    for bike in payload.get("data", {}).get("bikes", []):
+        if not bike.get("bike_id"):
+            continue
+        rows.append({
+            "bike_id": str(bike["bike_id"]),
+            "lat": bike.get("lat"),
+            "lon": bike.get("lon"),
+            "is_reserved": _optional_bool(bike.get("is_reserved")),
+            "is_disabled": _optional_bool(bike.get("is_disabled")),
+            "vehicle_type_id": str(bike["vehicle_type_id"]) if bike.get("vehicle_type_id") is not None else None,
+            "api_last_updated": api_last_updated,
+            "_ingested_at": ingested_at,
+        })
+    return rows
+
+
+@dataclass(frozen=True)
+class GBFSFeed:
+    """One polled GBFS feed and the raw table its rows go to"""
+    name: str
+    url: str
+    table_name: str
+    schema: pa.Schema
+    parse: Callable[[Dict[str, Any], datetime], List[Dict[str, Any]]]
+
+    # Column identifying a record across polls (a station, a bike)
+    id_column: str
+
+
+def station_status_feed(url: str) -> GBFSFeed:
+    return GBFSFeed("station_status", url, "raw_station_status", STATION_STATUS_SCHEMA, parse_station_status, "station_id")
+
+def free_bike_status_feed(url: str) -> GBFSFeed:
+    return GBFSFeed("free_bike_status", url, "raw_free_bike_status", FREE_BIKE_STATUS_SCHEMA, parse_free_bike_status, "bike_id")
+
+
+class MicroBatchBuffer:
+    """
+    In-memory rows of one feed waiting to be loaded. Only records that differ from
+    the last version seen of the same id are buffered, so a station reported
+    unchanged on every poll is stored once.
+    """
+
+    def __init__(self, feed: GBFSFeed):
+        self.feed = feed
+        self.rows: List[Dict[str, Any]] = []
+        self._last_seen: Dict[str, Tuple] = {}
+        self._content_columns = [name for name in feed.schema.names if name not in _OBSERVATION_COLUMNS]
+
+    def add(self, rows: List[Dict[str, Any]]) -> int:
+        """Buffer the changed rows of a poll; returns how many were new"""
+        added = 0
+        for row in rows:
+            content = tuple(row[column] for column in self._content_columns)
+            if self._last_seen.get(row[self.feed.id_column]) != content:
+                self._last_seen[row[self.feed.id_column]] = content
+                self.rows.append(row)
+                added += 1
+        return added
+
+    def drain(self) -> Optional[pa.Table]:
+        """Take the buffered rows as one arrow table (None if empty)"""
+        if not self.rows:
+            return None
+        rows, self.rows = self.rows, []
+        return pa.Table.from_pylist(rows, schema=self.feed.schema)
+
+
+class StationStatusPoller:
+    """
+    Polls GBFS real-time feeds (station_status, and optionally free_bike_status)
+    concurrently on one asyncio loop and loads them to BigQuery in micro-batches.
+
+    - One httpx.AsyncClient (kept-alive connections) is shared by every feed.
+    - Each feed is re-fetched when its data expires: last_updated + ttl, never
+      sooner than min_poll_seconds. A failed request is retried after RETRY_SECONDS
+      without stopping the other feeds.
+    - Changed records are buffered in memory and written as one Parquet load job
+      per feed every flush_interval_seconds (or once max_buffered_rows are waiting),
+      on a worker thread so polling continues during the load. A micro-batch whose
+      load fails is kept and retried at the next flush.
+    """
+
+    def __init__(self,
+                 feeds: List[GBFSFeed],
+                 client: Optional[bigquery.Client] = None,
+                 flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 max_buffered_rows: int = DEFAULT_MAX_BUFFERED_ROWS,
+                 min_poll_seconds: float = MIN_POLL_SECONDS,
+                 http_timeout_seconds: float = 30,
+                 clock: Callable[[], float] = time.time):
+        self.feeds = feeds
+        self.client = client or get_bigquery_client()
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_buffered_rows = max_buffered_rows
+        self.min_poll_seconds = min_poll_seconds
+        self.http_timeout_seconds = http_timeout_seconds
+        self.clock = clock
+        self.buffers = {feed.name: MicroBatchBuffer(feed) for feed in feeds}
+        self.failed_batches: Dict[str, List[pa.Table]] = {feed.name: [] for feed in feeds}
+        self.polls: Dict[str, int] = {feed.name: 0 for feed in feeds}
+        self.rows_loaded: Dict[str, int] = {feed.name: 0 for feed in feeds}
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    async def run(self, duration_seconds: float) -> None:
+        """Poll every feed for duration_seconds, then load whatever is still buffered"""
+        self._flush_requested = asyncio.Event()
+        self._stopping = False
+        limits = httpx.Limits(max_connections=len(self.feeds), max_keepalive_connections=len(self.feeds))
+        async with httpx.AsyncClient(timeout=self.http_timeout_seconds, limits=limits) as http:
+            pollers = [asyncio.create_task(self._poll_feed(http, feed)) for feed in self.feeds]
+            flusher = asyncio.create_task(self._flush_periodically())
+            try:
+                await asyncio.sleep(duration_seconds)
+            finally:
+                for task in pollers:
+                    task.cancel()
+                await asyncio.gather(*pollers, return_exceptions=True)
+
+                # Not cancelled: let the flusher finish any load in progress, then flush the rest
+                self._stopping = True
+                self._flush_requested.set()
+                await flusher
+
+        for feed in self.feeds:
+            print(f"{feed.name}: {self.polls[feed.name]} polls, {self.rows_loaded[feed.name]} rows loaded")
+        unloaded = {name: sum(batch.num_rows for batch in batches) for name, batches in self.failed_batches.items() if batches}
+        if unloaded:
+            raise Exception(f"Some micro-batches could not be loaded (rows per feed): {unloaded}")
+
+    async def _poll_feed(self, http: httpx.AsyncClient, feed: GBFSFeed) -> None:
+        while True:
+            try:
+                response = await http.get(feed.url)
+                response.raise_for_status()
+                payload = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Fetching {feed.name} failed, retrying in {RETRY_SECONDS}s: {e}")
+                await asyncio.sleep(RETRY_SECONDS)
+                continue
+
+            self.polls[feed.name] += 1
+            buffer = self.buffers[feed.name]
+            buffer.add(feed.parse(payload, datetime.now(timezone.utc)))
+            if len(buffer.rows) >= self.max_buffered_rows:
+                self._flush_requested.set()
+
+            await asyncio.sleep(self._seconds_until_stale(payload))
+
+    def _seconds_until_stale(self, payload: Dict[str, Any]) -> float:
+        """GBFS: a document is current until last_updated + ttl"""
+        ttl = payload.get("ttl")
+        last_updated = payload.get("last_updated")
+        if ttl is None or last_updated is None:
+            return max(self.min_poll_seconds, DEFAULT_POLL_SECONDS)
+        return max(self.min_poll_seconds, last_updated + ttl - self.clock())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+            if self._stopping:
+                return
+
+    async def flush(self) -> None:
+        """Load each feed's buffered rows (and earlier failed micro-batches) as one Parquet load job"""
+        for feed in self.feeds:
+            batch = self.buffers[feed.name].drain()
+            batches = self.failed_batches[feed.name] + ([batch] if batch is not None else [])
+            self.failed_batches[feed.name] = []
+            if not batches:
+                continue
+
+            table = pa.concat_tables(batches)
+            try:
+                await asyncio.to_thread(self._load, feed, table)
+            except Exception as e:
+                print(f"Loading {table.num_rows} {feed.name} rows failed; will retry at the next flush: {e}")
+                self.failed_batches[feed.name].append(table)
+            else:
+                self.rows_loaded[feed.name] += table.num_rows
+
+    def _load(self, feed: GBFSFeed, table: pa.Table) -> None:
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+        buffer.seek(0)
+
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+        table_id = f"{os.environ['GCP_PROJECT_ID']}.{os.environ['BQ_DATASET']}.{feed.table_name}"
+        self.client.load_table_from_file(buffer, destination=table_id, job_config=job_config).result()
+        print(f"Loaded {table.num_rows} {feed.name} rows to {table_id}")
+
+
+def poll_station_status(duration_seconds: float,
+                        flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+                        include_free_bikes: bool = False,
+                        client: Optional[bigquery.Client] = None) -> None:
+    """Poll GBFS_STATION_STATUS_URL (and GBFS_FREE_BIKE_STATUS_URL if include_free_bikes) for duration_seconds"""
+    feeds = [station_status_feed(os.environ["GBFS_STATION_STATUS_URL"])]
+    if include_free_bikes:
+        feeds.append(free_bike_status_feed(os.environ["GBFS_FREE_BIKE_STATUS_URL"]))
+
+    poller = StationStatusPoller(feeds, client=client, flush_interval_seconds=flush_interval_seconds)
+    asyncio.run(poller.run(duration_seconds))
@@ -1,22 +1,38 @@
 import os
-from citibike.database.bigquery import initialize_bigquery_client
+import time
+from citibike.database.bigquery import get_bigquery_client
 from citibike.database.staging import StagingTableLoader
-from citibike.utils.date_helpers import DATETIME_STR_FORMAT
+from citibike.utils.date_helpers import DATETIME_STR_FORMAT, now_nyc_datetime
 
+import hashlib
 import requests
 import json
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 import pandas as pd
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+# Poll interval when a GBFS response has no ttl, and the floor under a ttl of 0
+DEFAULT_POLL_SECONDS = 60
+MIN_POLL_SECONDS = 10
+
+# How long changed stations are buffered in the polling loop before one batched load
+DEFAULT_FLUSH_INTERVAL_SECONDS = 15 * 60
+
+def _station_fingerprint(station: Dict[str, Any]) -> str:
+    """Hash of a station record's content, independent of key order"""
+    canonical = json.dumps(station, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
 
 def _extract_station_rows(res: requests.Response, batch_key_value: pd.Timestamp) -> List[Dict[str, Any]]:
     res_json = res.json()
     api_last_updated = pd.Timestamp.fromtimestamp(res_json.get('last_updated')).tz_localize(None)
     api_version = res_json.get('version')
-    
+
     data = res_json.get('data', {})
     stations = data.get('stations', [])
-    
+
     rows = []
     for station in stations:
         station_id = station.get("station_id")
@@ -29,36 +45,195 @@ def _extract_station_rows(res: requests.Response, batch_key_value: pd.Timestamp)
                 "api_last_updated": api_last_updated,
                 "api_version": str(api_version),
                 "_ingested_at": batch_key_value,
+                "_fingerprint": _station_fingerprint(station),
             })
     return rows
 
-def ingest_station_data(batch_date: datetime) -> None:
-    # Fetch latest station data
+def _station_rows_to_df(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """raw_stations rows as a dataframe cast to match the BigQuery schema"""
+    df = pd.DataFrame(rows, columns=["station_id", "station_data", "api_last_updated", "api_version", "_ingested_at"])
+    df['station_id'] = df['station_id'].astype(str)
+    df['station_data'] = df['station_data'].astype(str)
+    df['api_version'] = df['api_version'].astype(str)
+    return df
+
+def _table_id(table_name: str) -> str:
+    return f"{os.environ['GCP_PROJECT_ID']}.{os.environ['BQ_DATASET']}.{table_name}"
+
+
+class StationChangeTracker:
+    """
+    Fingerprint index of the stations currently in the GBFS feed, used to write only
+    the stations whose content changed.
+
+    The index lives in raw_station_fingerprints (one row per station in the latest
+    feed, rewritten whenever the set or a fingerprint changes), which silver_stations
+    also reads to decide which stations are active. Between saves it is held in memory,
+    so a polling loop reads it once.
+    """
+
+    def __init__(self, client: bigquery.Client, table_id: str):
+        self.client = client
+        self.table_id = table_id
+        self.fingerprints: Dict[str, str] = {}
+        self.last_changed_at: Dict[str, pd.Timestamp] = {}
+        self.dirty = False
+
+    def load(self) -> None:
+        """Read the saved index; an empty or missing table means every station counts as changed"""
+        try:
+            df = self.client.list_rows(self.table_id).to_dataframe()
+        except NotFound as e:
+            print(f"No station fingerprint index read from {self.table_id}, starting empty: {e}")
+            return
+        self.fingerprints = dict(zip(df["station_id"], df["fingerprint"]))
+        self.last_changed_at = dict(zip(df["station_id"], df["last_changed_at"]))
+        print(f"Loaded {len(self.fingerprints)} station fingerprints from {self.table_id}")
+
+    def diff(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Update the index from a full feed snapshot; returns the rows of new or changed
+        stations. Stations missing from the snapshot leave the index.
+        """
+        changed = []
+        seen = set()
+        for row in rows:
+            station_id = row["station_id"]
+            seen.add(station_id)
+            if self.fingerprints.get(station_id) != row["_fingerprint"]:
+                self.fingerprints[station_id] = row["_fingerprint"]
+                self.last_changed_at[station_id] = row["_ingested_at"]
+                changed.append(row)
+
+        removed = set(self.fingerprints) - seen
+        for station_id in removed:
+            del self.fingerprints[station_id]
+            del self.last_changed_at[station_id]
+
+        if changed or removed:
+            self.dirty = True
+            print(f"{len(changed)} new or changed stations, {len(removed)} removed")
+        return changed
+
+    def save(self) -> None:
+        """Replace the saved index with the in-memory one, if it changed"""
+        if not self.dirty:
+            return
+        df = pd.DataFrame({
+            "station_id": list(self.fingerprints),
+            "fingerprint": list(self.fingerprints.values()),
+            "last_changed_at": [self.last_changed_at[station_id] for station_id in self.fingerprints],
+        })
+        job_config = bigquery.LoadJobConfig(write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE)
+        self.client.load_table_from_dataframe(df, self.table_id, job_config=job_config).result()
+        self.dirty = False
+        print(f"Saved {len(df)} station fingerprints to {self.table_id}")
+
+
+def _fetch_station_feed() -> requests.Response:
     station_url = os.environ['GBFS_STATION_URL']
     res = requests.get(station_url)
     res.raise_for_status()
+    return res
+
+def _append_station_rows(client: bigquery.Client, rows: List[Dict[str, Any]]) -> None:
+    """Append changed stations to raw_stations in one load job (no batch replace: earlier changes that day stay)"""
+    if not rows:
+        return
+    job_config = bigquery.LoadJobConfig(write_disposition=bigquery.WriteDisposition.WRITE_APPEND)
+    client.load_table_from_dataframe(_station_rows_to_df(rows), _table_id("raw_stations"), job_config=job_config).result()
+    print(f"Appended {len(rows)} changed station records")
+
+def ingest_station_data(batch_date: datetime, changes_only: Optional[bool] = None) -> None:
+    """
+    Ingest the current GBFS station feed as of batch_date.
+
+    By default the whole snapshot replaces the day's snapshot in raw_stations. With
+    changes_only (default: STATION_INGEST_CHANGES_ONLY env var), only stations that
+    are new or whose record changed since the last ingestion are appended.
+    """
+    if changes_only is None:
+        changes_only = os.environ.get("STATION_INGEST_CHANGES_ONLY", "").lower() == "true"
+
+    # Fetch latest station data
+    res = _fetch_station_feed()
 
     # Extract rows from response (one station = one row)
     batch_key_value = pd.Timestamp(batch_date).tz_localize(None)
     rows = _extract_station_rows(res, batch_key_value)
     print(f"found {len(rows)} stations")
 
-    # Convert to dataframe and cast columns
-    df = pd.DataFrame(rows)
-    
-    # Cast to match BigQuery schema
-    df['station_id'] = df['station_id'].astype(str)
-    df['station_data'] = df['station_data'].astype(str) 
-    df['api_version'] = df['api_version'].astype(str)
+    # Initialize BigQuery client
+    client = get_bigquery_client()
 
-    # Initialize BigQuery client 
-    client = initialize_bigquery_client()
+    # Both modes keep the fingerprint index current, since silver_stations reads it
+    tracker = StationChangeTracker(client, _table_id("raw_station_fingerprints"))
+    tracker.load()
+    changed_rows = tracker.diff(rows)
+
+    if changes_only:
+        _append_station_rows(client, changed_rows)
+        tracker.save()
+        return
+
+    # Convert to dataframe and cast columns
+    df = _station_rows_to_df(rows)
 
     # Build table reference
-    table_id = f"{os.environ['GCP_PROJECT_ID']}.{os.environ['BQ_DATASET']}.raw_stations"
+    table_id = _table_id("raw_stations")
 
     # Insert the rows
-    loader = StagingTableLoader(client, table_id, "_ingested_at")
+    # raw_stations is partitioned on DATE(_ingested_at), which is also the batch
+    # predicate, so a single MERGE only touches the snapshot's own partition
+    loader = StagingTableLoader(client, table_id, "_ingested_at", replace_strategy="merge")
     loader.load_and_merge_df(df, batch_key_value.strftime(DATETIME_STR_FORMAT))
-    
+    tracker.save()
+
     print(f"Successfully inserted {len(rows)} station records")
+
+def poll_station_changes(duration_seconds: float,
+                         flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+                         client: Optional[bigquery.Client] = None,
+                         sleep: Callable[[float], None] = time.sleep,
+                         clock: Callable[[], float] = time.monotonic) -> None:
+    """
+    Poll the GBFS station feed for duration_seconds, as often as its ttl allows,
+    appending only new or changed stations to raw_stations.
+
+    Changes are buffered and written in one load job (plus one fingerprint index
+    save) at most every flush_interval_seconds, and once more at the end, which
+    keeps the number of load jobs per day well under BigQuery's per-table limit.
+    If a station changes twice within a flush interval, both versions are written.
+    """
+    client = client or get_bigquery_client()
+    tracker = StationChangeTracker(client, _table_id("raw_station_fingerprints"))
+    tracker.load()
+
+    deadline = clock() + duration_seconds
+    pending_rows: List[Dict[str, Any]] = []
+    last_flush = clock()
+    polls = 0
+
+    while True:
+        res = _fetch_station_feed()
+        polls += 1
+        rows = _extract_station_rows(res, pd.Timestamp(now_nyc_datetime()))
+        pending_rows.extend(tracker.diff(rows))
+
+        now = clock()
+        if now - last_flush >= flush_interval_seconds:
+            _append_station_rows(client, pending_rows)
+            tracker.save()
+            pending_rows = []
+            last_flush = now
+
+        # GBFS ttl: seconds until the feed may next change
+        ttl = res.json().get("ttl")
+        poll_seconds = max(MIN_POLL_SECONDS, ttl if ttl is not None else DEFAULT_POLL_SECONDS)
+        if now + poll_seconds >= deadline:
+            break
+        sleep(poll_seconds)
+
+    _append_station_rows(client, pending_rows)
+    tracker.save()
+    print(f"Polled the station feed {polls} times")
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from typing import Any, Dict, Optional, Tuple
+
+from citibike.database.staging import BatchData
+from citibike.geo.boroughs import NO_BOROUGH, BoroughLocator
+from citibike.ingestion.schemas import TRIP_BOROUGH_COLUMNS
+from citibike.utils.metrics import record, timed
+
+
+def trip_borough_coordinates(schema: Dict[str, Any]) -> Dict[str, Tuple[str, str]]:
+    """(latitude, longitude) columns each borough column is derived from, for a CSV schema"""
+    return {
+        column: next(pair for pair in coordinate_pairs if pair[0] in schema)
+        for column, coordinate_pairs in TRIP_BOROUGH_COLUMNS.items()
+    }
+
+
+@timed("trip.assign_boroughs")
+def add_borough_columns(data: BatchData, schema: Dict[str, Any], locator: Optional[BoroughLocator]) -> BatchData:
+    """
+    Append the start_borough and end_borough columns to a validated dataframe or arrow
+    table: the borough each endpoint's coordinates fall in, or null outside every
+    borough. Without a locator the columns are all null, for tables that have them
+    when ingestion isn't assigning boroughs.
+
+    Dataframes get the columns in place; arrow tables (or record batches) get a new table.
+    """
+    if isinstance(data, pa.RecordBatch):
+        data = pa.Table.from_batches([data])
+    num_rows = data.num_rows if isinstance(data, pa.Table) else len(data)
+    record(rows=num_rows)
+
+    for column, (lat_column, lng_column) in trip_borough_coordinates(schema).items():
+        if isinstance(data, pa.Table):
+            data = data.append_column(column, _borough_array(data, lat_column, lng_column, locator))
+        elif locator is None:
+            data[column] = pd.Series(pd.NA, index=data.index, dtype="string")
+        else:
+            boroughs = locator.locate(data[lng_column].to_numpy(np.float64, na_value=np.nan),
+                                      data[lat_column].to_numpy(np.float64, na_value=np.nan))
+            # NO_BOROUGH (-1) picks the trailing None
+            names = np.array(locator.borough_names + [None], dtype=object)
+            data[column] = pd.array(names[boroughs], dtype="string")
+    return data
+
+
+def _borough_array(table: pa.Table, lat_column: str, lng_column: str, locator: Optional[BoroughLocator]) -> pa.Array:
+    """Boroughs of a table's points as a dictionary array (indices into the borough names)"""
+    if locator is None:
+        return pa.nulls(table.num_rows, pa.dictionary(pa.int16(), pa.string()))
+    boroughs = locator.locate(_to_float_numpy(table[lng_column]), _to_float_numpy(table[lat_column]))
+    return pa.DictionaryArray.from_arrays(
+        pa.array(boroughs, mask=boroughs == NO_BOROUGH),
+        pa.array(locator.borough_names, pa.string()),
+    )
+
+
+def _to_float_numpy(column: pa.ChunkedArray) -> np.ndarray:
+    return column.fill_null(np.nan).to_numpy()
@@ -1,40 +1,153 @@
+import io
 import os
+import multiprocessing
+import numpy as np
 import pandas as pd
-from typing import Any, Dict
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from citibike.ingestion.validation import add_metadata_columns, validate_and_cast_trip_schema
-from citibike.ingestion.schemas import CURRENT_TRIP_CSV_SCHEMA, LEGACY_TRIP_CSV_SCHEMA
+from citibike.ingestion.validation import add_metadata_columns, read_trip_csv, validate_and_cast_trip_schema
+from citibike.ingestion.arrow_validation import add_metadata_columns_arrow, iter_trip_csv_batches, read_and_cast_trip_csv
+from citibike.ingestion.csv_layouts import TripCsvFormat, sniff_trip_csv, sniff_trip_csv_stream
+from citibike.ingestion.schemas import TRIP_BOROUGH_COLUMNS, TRIP_QUALITY_FLAG_COLUMNS
+from citibike.ingestion.enrichment import TripBatchEnricher
+from citibike.ingestion.quality import RideKeySet
+from citibike.geo.boroughs import default_borough_locator
+from citibike.utils.metrics import span
 from citibike.utils.storage import LocalStorage
 from citibike.ingestion.downloader import TripDataDownloader
-from citibike.database.staging import StagingTableLoader
-from citibike.database.bigquery import initialize_bigquery_client
+from citibike.ingestion.range_download import RangeRequestDownloader
+from citibike.ingestion.zip_stream import CsvSource, csv_source_name, open_csv_source, peek_csv_head
+from citibike.database.staging import (
+    REPLACE_STRATEGIES,
+    BatchData,
+    StagingTableLoader,
+    batch_key_to_date,
+    with_partition_column,
+    write_parquet_spill_file,
+)
+from citibike.database.bigquery import get_bigquery_client
 
 
-def ingest_trip_data(year: int, month: int):
+# Rows sampled from the top of a CSV to estimate in-memory bytes per row
+CHUNK_SIZE_SAMPLE_ROWS = 1000
+
+# A chunk exists roughly three times over while it is processed: the raw parsed
+# strings, the typed columns produced by casting, and the serialized load payload
+CHUNK_MEMORY_OVERHEAD_FACTOR = 3
+
+# "pandas": pd.read_csv + validate_and_cast_trip_schema, loaded via load_table_from_dataframe
+# "arrow": typed parse with pyarrow.csv, loaded to BigQuery as Parquet with no pandas round-trip
+INGEST_ENGINES = ("pandas", "arrow")
+
+# Raw trip tables are partitioned on this column, holding DATE(_batch_key), so each
+# _N.csv batch lives in its own daily partition (see sql/ddl/templates/raw)
+TRIP_PARTITION_COLUMN = "_batch_date"
+
+# Flag set on trips whose ride key repeats within the month (see citibike.ingestion.quality)
+TRIP_DUPLICATE_COLUMN = "is_duplicate_ride"
+
+# A parsed batch: its spill file (None without rows) and, when flagged, its rows'
+# ride key hashes and null masks, in the spill file's row order
+ParsedBatch = Tuple[Optional[str], Optional[Tuple[np.ndarray, np.ndarray]]]
+
+
+@dataclass
+class TripIngestOptions:
+    """
+    Tuning knobs for trip ingestion. The defaults reproduce the original behavior:
+    each CSV read whole with pandas and loaded in turn, replacing its batch with
+    DELETE + INSERT on its _batch_key, also into raw trip tables created before
+    any of the columns ingestion adds existed. Each of those columns (_batch_date,
+    the borough columns, the quality flags) is only loaded into tables that have
+    it; partition_overwrite and assign_boroughs stop with an error on tables
+    missing the migrations in sql/migrations they need (see migrate_tables.py).
+    """
+
+    # Upper bound (in MB) on the memory used by one in-flight chunk of a CSV.
+    # None reads each CSV whole; any value switches to streaming chunked reads.
+    max_chunk_mb: Optional[int] = None
+
+    # Parse/cast engine, one of INGEST_ENGINES
+    engine: str = "pandas"
+
+    # Write each batch to a Parquet spill file in LocalStorage and load/merge it in
+    # the background while the next CSV is parsed (see StagingTableLoader)
+    spill_to_parquet: bool = False
+
+    # Number of CSVs of a month to parse (worker processes) and load (threads) at once.
+    # Above 1, every batch gets its own staging table and always goes through a spill file.
+    max_workers: int = 1
+
+    # How a re-ingested batch replaces the old one in the raw table, one of REPLACE_STRATEGIES.
+    # Batches map 1:1 to _batch_date partitions, so partition_overwrite scans no table
+    # bytes, but only on tables partitioned by _batch_date (migrations 001 and 002 add
+    # the column and repartition tables created before it, without dropping their data).
+    # merge prunes to the batch's partition when the table has _batch_date.
+    replace_strategy: str = "delete_insert"
+
+    # Parallel range-request connections for the monthly zip download. Any value
+    # enables the resumable downloader and its cache in LocalStorage, so reruns and
+    # backfills skip the network; None keeps the single streamed GET.
+    download_connections: Optional[int] = None
+
+    # Read the CSVs straight out of the downloaded zip instead of extracting them,
+    # so a month needs no more disk than the compressed archive (plus, for a yearly
+    # archive that compresses its month zips, the month's zip spooled out of it)
+    stream_from_zip: bool = False
+
+    # Fill start_borough / end_borough from each trip's coordinates with the local
+    # borough polygons (see citibike.geo.boroughs); otherwise they are loaded null.
+    # Tables created before these columns need migration 003.
+    assign_boroughs: bool = False
+
+    def __post_init__(self):
+        if self.engine not in INGEST_ENGINES:
+            raise ValueError(f"Unknown trip ingest engine {self.engine!r}; expected one of {INGEST_ENGINES}")
+        if self.replace_strategy not in REPLACE_STRATEGIES:
+            raise ValueError(f"Unknown replace strategy {self.replace_strategy!r}; expected one of {REPLACE_STRATEGIES}")
+        if self.max_workers < 1:
+            raise ValueError(f"max_workers must be at least 1, got {self.max_workers}")
+        if self.download_connections is not None and self.download_connections < 1:
+            raise ValueError(f"download_connections must be at least 1, got {self.download_connections}")
+
+    @classmethod
+    def from_env(cls) -> "TripIngestOptions":
+        """Build options from TRIP_INGEST_* environment variables (see config/*.env.example)"""
+        max_chunk_mb = os.environ.get("TRIP_INGEST_MAX_CHUNK_MB")
+        download_connections = os.environ.get("TRIP_DOWNLOAD_CONNECTIONS")
+        return cls(
+            max_chunk_mb=int(max_chunk_mb) if max_chunk_mb else None,
+            engine=os.environ.get("TRIP_INGEST_ENGINE", "pandas"),
+            spill_to_parquet=os.environ.get("TRIP_INGEST_SPILL_PARQUET", "").lower() == "true",
+            max_workers=int(os.environ.get("TRIP_INGEST_MAX_WORKERS", "1")),
+            replace_strategy=os.environ.get("TRIP_REPLACE_STRATEGY", "delete_insert"),
+            download_connections=int(download_connections) if download_connections else None,
+            stream_from_zip=os.environ.get("TRIP_INGEST_STREAM_ZIP", "").lower() == "true",
+            assign_boroughs=os.environ.get("TRIP_INGEST_ASSIGN_BOROUGHS", "").lower() == "true",
+        )
+
+
+def ingest_trip_data(year: int, month: int, options: Optional[TripIngestOptions] = None):
     """Main function to be called by orchestrators"""
-    # Choose which schema based on year parameters
-    if year < 2020:
-        _ingest_legacy_trip_data(year, month)
-    else:
-        _ingest_current_trip_data(year, month)
+    options = options or TripIngestOptions()
+    _ingest_trip_data(year, month, options)
 
-def _ingest_trip_data(year: int, month: int, table_name: str, schema: Dict[str, Any]):
-    """Download and ingest trip data for the given month, table, and schema."""
+
+def _ingest_trip_data(year: int, month: int, options: TripIngestOptions):
+    """Download and ingest trip data for the given month, into the raw tables of its CSV layouts."""
     # Initialize components
     storage = LocalStorage()
-    client = initialize_bigquery_client()
-    table_id = f"{os.environ['GCP_PROJECT_ID']}.{os.environ['BQ_DATASET']}.{table_name}"
-    loader = StagingTableLoader(client, table_id, "_batch_key")
-
-    # Download and extract CSV files
-    downloader = TripDataDownloader(storage, os.environ["TRIP_DATA_URL"])
-    downloader.download_month(year, month)
-    print(f"Downloaded CSV files to paths {sorted(downloader.csv_files_created)}")
+    client = get_bigquery_client(pool_size=options.max_workers)
 
-    # Process each CSV file as a separate batch
-    for csv_path in sorted(downloader.csv_files_created):
-        batch_key = _extract_batch_key_from_filename(csv_path)
-        _process_csv_batch(csv_path, batch_key, loader, schema)
+    downloader = download_trip_month(year, month, storage, options)
+    load_trip_month(year, month, downloader, client, storage, options)
 
     # Clean up downloaded files (both CSV and ZIP files)
     storage.cleanup(downloader.get_all_files_for_cleanup())
@@ -42,18 +155,129 @@ def _ingest_trip_data(year: int, month: int, table_name: str, schema: Dict[str,
     print(f"Successfully ingested trip data for {year}-{month:02d}")
 
 
-def _ingest_legacy_trip_data(year: int, month: int) -> None:
-    """Download and ingest trip data for the given month, expecting the legacy schema."""
-    _ingest_trip_data(year, month, "raw_trips_legacy", LEGACY_TRIP_CSV_SCHEMA)
+def download_trip_month(year: int,
+                        month: int,
+                        storage: LocalStorage,
+                        options: TripIngestOptions,
+                        download_engine: Optional[RangeRequestDownloader] = None) -> TripDataDownloader:
+    """
+    Download (and unless streaming, extract) a month's trip CSVs. The returned
+    downloader lists the CSVs and the files to clean up once they are loaded.
+    """
+    if download_engine is None and options.download_connections:
+        download_engine = RangeRequestDownloader(storage, connections=options.download_connections)
+
+    downloader = TripDataDownloader(storage, os.environ["TRIP_DATA_URL"], download_engine)
+    downloader.download_month(year, month, extract=not options.stream_from_zip)
+    return downloader
+
+
+def load_trip_month(year: int,
+                    month: int,
+                    downloader: TripDataDownloader,
+                    client: bigquery.Client,
+                    storage: LocalStorage,
+                    options: TripIngestOptions) -> Dict[str, List[str]]:
+    """
+    Load a downloaded month's CSVs, one batch per CSV, into the raw table of each
+    CSV's layout (sniffed from its header, see csv_layouts); returns the batch keys
+    loaded into each table
+    """
+    if options.stream_from_zip:
+        csv_sources: List[CsvSource] = list(downloader.csv_members)
+        print(f"Streaming CSV files from {sorted(str(member) for member in csv_sources)}")
+    else:
+        csv_sources = list(downloader.csv_files_created)
+        print(f"Downloaded CSV files to paths {sorted(csv_sources)}")
+
+    batch_keys: Dict[str, List[str]] = {}
+    for table_name, (schema, table_sources) in _group_by_table(csv_sources).items():
+        _load_trip_csv_files(year, month, table_sources, client, storage, table_name, schema, options)
+        batch_keys[table_name] = [_extract_batch_key_from_filename(csv_path) for csv_path in table_sources]
+    return batch_keys
+
+
+def _group_by_table(csv_sources: List[CsvSource]) -> Dict[str, Tuple[Dict[str, Any], List[CsvSource]]]:
+    """Raw table -> (its CSV schema, the sorted CSVs whose layout it holds)"""
+    tables: Dict[str, Tuple[Dict[str, Any], List[CsvSource]]] = {}
+    with span("trip.sniff_layouts", files=len(csv_sources)):
+        for csv_path in sorted(csv_sources):
+            layout = sniff_trip_csv(csv_path).layout
+            print(f"{csv_path} has the {layout.name} layout; loading it into {layout.table_name}")
+            tables.setdefault(layout.table_name, (layout.schema, []))[1].append(csv_path)
+    return tables
 
 
-def _ingest_current_trip_data(year: int, month: int) -> None:
-    """Download and ingest trip data for the given month, expecting the current schema."""
-    _ingest_trip_data(year, month, "raw_trips_current", CURRENT_TRIP_CSV_SCHEMA)
+def _load_trip_csv_files(year: int,
+                         month: int,
+                         csv_sources: List[CsvSource],
+                         client: bigquery.Client,
+                         storage: LocalStorage,
+                         table_name: str,
+                         schema: Dict[str, Any],
+                         options: TripIngestOptions) -> None:
+    """Load CSVs of a month sharing one raw table, one batch per CSV"""
+    table_id = f"{os.environ['GCP_PROJECT_ID']}.{os.environ['BQ_DATASET']}.{table_name}"
+    column_order = trip_column_order(schema, _existing_table_columns(client, table_id))
+    has_partition_column = TRIP_PARTITION_COLUMN in column_order
+    if options.replace_strategy == "partition_overwrite" and not has_partition_column:
+        raise ValueError(f"{table_id} has no {TRIP_PARTITION_COLUMN} column, which the partition_overwrite replace strategy "
+                         f"needs; run python migrate_tables.py <dev|prod> first, or use delete_insert")
+    if options.assign_boroughs and not set(TRIP_BOROUGH_COLUMNS) <= set(column_order):
+        raise ValueError(f"{table_id} has no {' / '.join(TRIP_BOROUGH_COLUMNS)} columns, which assign_boroughs fills; "
+                         f"run python migrate_tables.py <dev|prod> first")
+
+    use_spill_files = options.spill_to_parquet or options.max_workers > 1
+    loader = StagingTableLoader(
+        client,
+        table_id,
+        "_batch_key",
+        spill_storage=storage if use_spill_files else None,
+        replace_strategy=options.replace_strategy,
+        # Filled whenever the table has it, so every row is in its batch's partition
+        # if the replace strategy is switched later
+        partition_column=TRIP_PARTITION_COLUMN if has_partition_column else None,
+        column_order=column_order,
+    )
+
+    with span("trip.load_month", table=table_name, year=year, month=month, files=len(csv_sources), engine=options.engine, max_workers=options.max_workers):
+        # Process each CSV file as a separate batch
+        if options.max_workers > 1:
+            _ingest_csv_files_parallel(csv_sources, loader, schema, options)
+        else:
+            # One enricher for the month, so its batches share the station dictionary
+            enrich = _batch_enricher(schema, options, column_order)
+            for csv_path in sorted(csv_sources):
+                _process_csv_file(csv_path, loader, schema, options, enrich)
+
+        # Wait for background loads (spill mode); failed batches keep their spill files for retry
+        loader.wait_for_loads()
+
 
+def trip_column_order(schema: Dict[str, Any], table_columns: Optional[List[str]] = None) -> List[str]:
+    """
+    Columns of a raw trip table in its DDL order (see sql/ddl/templates/raw). If the
+    existing table's columns are given, only those it has: a table created before a
+    migration lacks the columns the migration adds (_batch_date, the borough columns,
+    the quality flags), and batches leave them out. Every ingest path and engine
+    loads its batches in this order.
+    """
+    columns = list(schema) + ["_ingested_at", "_batch_key", TRIP_PARTITION_COLUMN, *TRIP_BOROUGH_COLUMNS, *TRIP_QUALITY_FLAG_COLUMNS]
+    if table_columns is None:
+        return columns
+    return [column for column in columns if column in table_columns]
 
-def _extract_batch_key_from_filename(csv_path: str) -> str:
-    filename = os.path.basename(csv_path)
+
+def _existing_table_columns(client: bigquery.Client, table_id: str) -> Optional[List[str]]:
+    """Columns of a table, or None if it doesn't exist yet (the first load creates it)"""
+    try:
+        return [field.name for field in client.get_table(table_id).schema]
+    except NotFound:
+        return None
+
+
+def _extract_batch_key_from_filename(csv_path: CsvSource) -> str:
+    filename = csv_source_name(csv_path)
     
     # "202401-citibike-tripdata_1.csv" -> ["202401", "citibike", "tripdata_1.csv"]
     parts = filename.split("-")
@@ -66,9 +290,34 @@ def _extract_batch_key_from_filename(csv_path: str) -> str:
 
     return f"{year}-{month}-{batch_num}"
 
-def _process_csv_batch(csv_path: str, batch_key_val: str, loader: StagingTableLoader, schema: Dict[str, Any]):
+def _process_csv_file(csv_path: CsvSource, loader: StagingTableLoader, schema: Dict[str, Any], options: TripIngestOptions,
+                      enrich: TripBatchEnricher) -> None:
+    """Ingest one CSV file as one batch, with the engine and chunking chosen in options"""
+    batch_key = _extract_batch_key_from_filename(csv_path)
+    with span("trip.batch", batch_key=batch_key, engine=options.engine, chunked=bool(options.max_chunk_mb)):
+        if options.engine == "arrow":
+            _process_csv_batch_arrow(csv_path, batch_key, loader, schema, options.max_chunk_mb, enrich)
+        elif options.max_chunk_mb:
+            _process_csv_batch_chunked(csv_path, batch_key, loader, schema, options.max_chunk_mb, enrich)
+        else:
+            _process_csv_batch(csv_path, batch_key, loader, schema, enrich)
+
+def _batch_enricher(schema: Dict[str, Any], options: TripIngestOptions, column_order: List[str],
+                    keep_ride_keys: bool = False) -> TripBatchEnricher:
+    """An enricher adding the columns of column_order ingestion derives (see trip_column_order)"""
+    return TripBatchEnricher(schema,
+                             default_borough_locator() if options.assign_boroughs else None,
+                             borough_columns=set(TRIP_BOROUGH_COLUMNS) <= set(column_order),
+                             quality_flags=set(TRIP_QUALITY_FLAG_COLUMNS) <= set(column_order),
+                             keep_ride_keys=keep_ride_keys)
+
+def _process_csv_batch(csv_path: CsvSource, batch_key_val: str, loader: StagingTableLoader, schema: Dict[str, Any],
+                       enrich: TripBatchEnricher):
     print(f"processing csv at path {csv_path}, batch_key_value = {batch_key_val}")
-    df_raw = pd.read_csv(csv_path)
+    with span("trip.read_csv", batch_key=batch_key_val) as read_span, open_csv_source(csv_path) as stream:
+        csv_format = sniff_trip_csv_stream(stream)
+        df_raw = read_trip_csv(stream, csv_format)
+        read_span.add(rows=len(df_raw))
 
     # ========================================
     # TEMPORARY: Limit to first 1000 rows for testing
@@ -76,10 +325,246 @@ def _process_csv_batch(csv_path: str, batch_key_val: str, loader: StagingTableLo
     # print(f"DEBUG: Limited to {len(df_raw)} rows for testing")
     # ========================================
 
-    df_validated = validate_and_cast_trip_schema(df_raw, schema)
+    df_validated = validate_and_cast_trip_schema(df_raw, schema, timestamp_format=csv_format.pandas_timestamp_format)
     print(f"validation complete!")
 
     df_metadata = add_metadata_columns(df_validated, batch_key_val)
     print(f"added metadata!")
 
-    loader.load_and_merge_df(df_metadata, batch_key_val)
+    loader.load_and_merge_df(enrich(df_metadata), batch_key_val)
+
+
+def _process_csv_batch_chunked(csv_path: CsvSource, batch_key_val: str, loader: StagingTableLoader, schema: Dict[str, Any], max_chunk_mb: int,
+                               enrich: TripBatchEnricher):
+    """
+    Stream a CSV through validation and loading in bounded chunks.
+
+    Every chunk carries the same batch key and ingestion timestamp, and the loader
+    merges the batch once after the last chunk, so the result in the main table is
+    the same as for _process_csv_batch.
+    """
+    print(f"processing csv at path {csv_path} in chunks of at most {max_chunk_mb} MB, batch_key_value = {batch_key_val}")
+
+    loader.load_and_merge_chunks(_iter_validated_chunks(csv_path, batch_key_val, schema, max_chunk_mb, enrich), batch_key_val)
+
+
+def _iter_validated_chunks(csv_path: CsvSource,
+                           batch_key_val: str,
+                           schema: Dict[str, Any],
+                           max_chunk_mb: int,
+                           enrich: TripBatchEnricher,
+                           ingested_at: Optional[pd.Timestamp] = None) -> Iterator[pd.DataFrame]:
+    """Yield validated, metadata-stamped, enriched chunks of a CSV; each chunk is cast in place"""
+    if ingested_at is None:
+        ingested_at = pd.Timestamp.now(tz='America/New_York').tz_localize(None)
+
+    with open_csv_source(csv_path) as stream:
+        csv_format = sniff_trip_csv_stream(stream)
+        chunk_rows = _estimate_chunk_rows(stream, csv_format, schema, max_chunk_mb)
+        print(f"reading {csv_path} in chunks of {chunk_rows} rows")
+
+        # Read string columns as strings up front so every chunk infers the same types
+        with read_trip_csv(stream, csv_format, chunksize=chunk_rows, dtype=_string_column_dtypes(schema)) as reader:
+            for chunk in reader:
+                chunk = validate_and_cast_trip_schema(chunk, schema, copy=False, timestamp_format=csv_format.pandas_timestamp_format)
+                chunk = add_metadata_columns(chunk, batch_key_val, ingested_at=ingested_at, copy=False)
+                yield enrich(chunk)
+
+
+def _process_csv_batch_arrow(csv_path: CsvSource, batch_key_val: str, loader: StagingTableLoader, schema: Dict[str, Any], max_chunk_mb: Optional[int],
+                             enrich: TripBatchEnricher):
+    """
+    Parse, cast and load a CSV with pyarrow, without building a pandas DataFrame.
+
+    With max_chunk_mb set, the CSV is streamed as record batches and merged once
+    after the last one, like _process_csv_batch_chunked.
+    """
+    if not max_chunk_mb:
+        print(f"processing csv at path {csv_path} with arrow, batch_key_value = {batch_key_val}")
+        table = read_and_cast_trip_csv(csv_path, schema)
+        print(f"validation complete!")
+
+        table = add_metadata_columns_arrow(table, batch_key_val)
+        loader.load_and_merge_table(enrich(table), batch_key_val)
+        return
+
+    block_size = _arrow_block_size(max_chunk_mb)
+    print(f"processing csv at path {csv_path} with arrow in {block_size} byte blocks, batch_key_value = {batch_key_val}")
+
+    ingested_at = pd.Timestamp.now(tz='America/New_York').tz_localize(None)
+    tables = (
+        enrich(add_metadata_columns_arrow(batch, batch_key_val, ingested_at=ingested_at))
+        for batch in iter_trip_csv_batches(csv_path, schema, block_size)
+    )
+    loader.load_and_merge_chunks(tables, batch_key_val)
+
+
+def _ingest_csv_files_parallel(csv_paths: List[CsvSource], loader: StagingTableLoader, schema: Dict[str, Any], options: TripIngestOptions) -> None:
+    """
+    Ingest a month's CSV files concurrently.
+
+    Worker processes parse and validate each CSV into its own Parquet spill file, a
+    thread pool loads each spill file into that batch's own staging table, and the
+    merges into the main table then run one at a time in sorted file order, so the
+    end result matches the sequential path. Up to max_workers CSVs are parsed at
+    once, so peak memory scales with the worker count (combine with max_chunk_mb
+    to bound it).
+
+    Each worker flags the rides repeated within its own file. A single thread then
+    checks every file's ride keys against one RideKeySet for the month, in file
+    order, and flags the rides an earlier file already had in the spill file
+    before it is loaded, so is_duplicate_ride matches the sequential path too.
+    """
+    batch_keys = [_extract_batch_key_from_filename(csv_path) for csv_path in sorted(csv_paths)]
+    ingested_at = pd.Timestamp.now(tz='America/New_York').tz_localize(None)
+    month_ride_keys = RideKeySet()
+
+    # spawn, not fork: the parent holds BigQuery client threads and sockets
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=options.max_workers, mp_context=mp_context) as parse_pool, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="ride-keys") as mark_pool, \
+            ThreadPoolExecutor(max_workers=options.max_workers, thread_name_prefix="batch-load") as load_pool:
+
+        load_futures: Dict[str, Future] = {}
+        for csv_path, batch_key in zip(sorted(csv_paths), batch_keys):
+            parse_future = parse_pool.submit(
+                _parse_csv_to_spill_file,
+                csv_path,
+                batch_key,
+                schema,
+                options,
+                loader.spill_path(batch_key),
+                loader.partition_column,
+                loader.column_order,
+                ingested_at,
+                loader.parquet_compression,
+                loader.parquet_row_group_size,
+            )
+            # One thread, fed in file order, so each file is checked against every earlier one
+            mark_future = mark_pool.submit(_flag_repeated_rides, month_ride_keys, parse_future, loader, batch_key)
+            load_futures[batch_key] = load_pool.submit(_load_parsed_batch, loader, mark_future, batch_key)
+
+        # Merge strictly in file order; each merge only waits for its own batch
+        for batch_key in batch_keys:
+            spill_path = load_futures[batch_key].result()
+            if spill_path is None:
+                print(f"No rows parsed for batch {batch_key}; skipping merge")
+                continue
+
+            loader.merge_batch_staging_table(batch_key)
+            loader.spill_storage.cleanup([spill_path])
+
+
+def _parse_csv_to_spill_file(csv_path: CsvSource,
+                             batch_key_val: str,
+                             schema: Dict[str, Any],
+                             options: TripIngestOptions,
+                             spill_path: str,
+                             partition_column: Optional[str],
+                             column_order: List[str],
+                             ingested_at: pd.Timestamp,
+                             compression: str,
+                             row_group_size: int) -> ParsedBatch:
+    """
+    Worker process task: parse, validate and stamp one CSV, and write it to a Parquet
+    spill file. Returns the file with its rows' ride keys, if it has quality flags.
+    """
+    print(f"processing csv at path {csv_path} in worker {os.getpid()}, batch_key_value = {batch_key_val}")
+    partition_date = batch_key_to_date(batch_key_val)
+    enrich = _batch_enricher(schema, options, column_order, keep_ride_keys=True)
+    with span("trip.parse_to_spill", batch_key=batch_key_val, engine=options.engine):
+        spill_path = write_parquet_spill_file(
+            (
+                with_partition_column(chunk, partition_column, partition_date) if partition_column else chunk
+                for chunk in _iter_batch_data(csv_path, batch_key_val, schema, options, enrich, ingested_at)
+            ),
+            spill_path,
+            compression=compression,
+            row_group_size=row_group_size,
+            column_order=column_order,
+        )
+    return spill_path, enrich.quality.kept_ride_keys() if enrich.quality else None
+
+
+def _flag_repeated_rides(month_ride_keys: RideKeySet, parse_future: Future, loader: StagingTableLoader, batch_key_val: str) -> Optional[str]:
+    """
+    Ride key thread task: wait for a batch's spill file, flag its rides whose key an
+    earlier batch of the month already had, and add its keys to month_ride_keys.
+    The spill file is only rewritten if it has such rides.
+    """
+    spill_path, ride_keys = parse_future.result()
+    if spill_path is None or ride_keys is None:
+        return spill_path
+
+    hashes, is_null = ride_keys
+    is_repeated = month_ride_keys.seen(hashes) & ~is_null
+    month_ride_keys.add(hashes[~is_null])
+    num_repeated = int(is_repeated.sum())
+    if num_repeated:
+        print(f"{num_repeated} rides of batch {batch_key_val} repeat ride keys of earlier batches; flagging them in {spill_path}")
+        table = pq.read_table(spill_path)
+        position = table.schema.get_field_index(TRIP_DUPLICATE_COLUMN)
+        flags = pc.or_(table[TRIP_DUPLICATE_COLUMN], pa.array(is_repeated))
+        write_parquet_spill_file(
+            [table.set_column(position, TRIP_DUPLICATE_COLUMN, flags)],
+            spill_path,
+            compression=loader.parquet_compression,
+            row_group_size=loader.parquet_row_group_size,
+        )
+    return spill_path
+
+
+def _load_parsed_batch(loader: StagingTableLoader, parse_future: Future, batch_key_val: str) -> Optional[str]:
+    """Loader thread task: wait for a batch's spill file, then load it into the batch's own staging table"""
+    spill_path = parse_future.result()
+    if spill_path is not None:
+        loader.load_spill_file_to_staging(spill_path, batch_key_val, loader.batch_staging_table_id(batch_key_val))
+    return spill_path
+
+
+def _iter_batch_data(csv_path: CsvSource,
+                     batch_key_val: str,
+                     schema: Dict[str, Any],
+                     options: TripIngestOptions,
+                     enrich: TripBatchEnricher,
+                     ingested_at: Optional[pd.Timestamp] = None) -> Iterator[BatchData]:
+    """Yield a CSV as validated, metadata-stamped, enriched chunks (one chunk unless max_chunk_mb is set)"""
+    if options.engine == "arrow":
+        if options.max_chunk_mb:
+            for batch in iter_trip_csv_batches(csv_path, schema, _arrow_block_size(options.max_chunk_mb)):
+                yield enrich(add_metadata_columns_arrow(batch, batch_key_val, ingested_at=ingested_at))
+        else:
+            yield enrich(add_metadata_columns_arrow(read_and_cast_trip_csv(csv_path, schema), batch_key_val, ingested_at=ingested_at))
+    elif options.max_chunk_mb:
+        yield from _iter_validated_chunks(csv_path, batch_key_val, schema, options.max_chunk_mb, enrich, ingested_at)
+    else:
+        with open_csv_source(csv_path) as stream:
+            csv_format = sniff_trip_csv_stream(stream)
+            df = validate_and_cast_trip_schema(read_trip_csv(stream, csv_format), schema, copy=False,
+                                               timestamp_format=csv_format.pandas_timestamp_format)
+        yield enrich(add_metadata_columns(df, batch_key_val, ingested_at=ingested_at, copy=False))
+
+
+def _estimate_chunk_rows(stream: io.BufferedReader, csv_format: TripCsvFormat, schema: Dict[str, Any], max_chunk_mb: int) -> int:
+    """
+    Estimate how many rows of the CSV fit in max_chunk_mb, based on a sample of its
+    first rows. The sample is peeked from the stream's buffer, so it isn't consumed.
+    """
+    sample = read_trip_csv(io.BytesIO(peek_csv_head(stream)), csv_format, nrows=CHUNK_SIZE_SAMPLE_ROWS, dtype=_string_column_dtypes(schema))
+    if sample.empty:
+        return CHUNK_SIZE_SAMPLE_ROWS
+
+    sample = validate_and_cast_trip_schema(sample, schema, copy=False, timestamp_format=csv_format.pandas_timestamp_format)
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+    budget_bytes = max_chunk_mb * 1024 * 1024 / CHUNK_MEMORY_OVERHEAD_FACTOR
+
+    return max(1, int(budget_bytes // bytes_per_row))
+
+
+def _arrow_block_size(max_chunk_mb: int) -> int:
+    """Arrow's block size counts CSV bytes, which is close to the typed size of a record batch"""
+    return max(1, int(max_chunk_mb * 1024 * 1024 / CHUNK_MEMORY_OVERHEAD_FACTOR))
+
+
+def _string_column_dtypes(schema: Dict[str, Any]) -> Dict[str, str]:
+    return {column: "string" for column, dtype in schema.items() if dtype == "string"}
@@ -1,41 +1,75 @@
+import io
 import pandas as pd
 from pandas.api.extensions import ExtensionDtype
-from typing import Dict
+from typing import Any, Dict, Iterable, Optional
 
+from citibike.ingestion.csv_layouts import TripCsvFormat
 from citibike.utils.date_helpers import DATETIME_STR_FORMAT, now_nyc_datetime
+from citibike.utils.metrics import record, timed
 
 
 
-def validate_and_cast_trip_schema(df: pd.DataFrame, schema: Dict[str, ExtensionDtype]) -> pd.DataFrame:
+def check_trip_columns(columns: Iterable[str], schema: Dict[str, Any]) -> None:
     """
-    Validate CSV DataFrame against expected schema and cast to correct types.
+    Check that a CSV's columns match the expected schema exactly.
 
     Raises:
-        ValueError: If columns are missing, unexpected, or can't be cast
-    
-    Returns:
-        DataFrame with properly typed columns
+        ValueError: If columns are missing or unexpected
     """
     expected_columns = set(schema.keys())
-    actual_columns = set(df.columns)
+    actual_columns = set(columns)
 
-    # 1. Check for missing columns
+    # Check for missing columns
     missing_columns = expected_columns - actual_columns
     if missing_columns:
         raise ValueError(f"Missing required columns: {sorted(missing_columns)}")
 
-    # 2. Check for unexpected new columns
+    # Check for unexpected new columns
     extra_columns = actual_columns - expected_columns
     if extra_columns:
         raise ValueError(f"Unexpected columns found: {sorted(extra_columns)}")
+
+def read_trip_csv(stream: io.BufferedReader, csv_format: TripCsvFormat, **read_csv_kwargs: Any):
+    """
+    pd.read_csv of a trip CSV sniffed as csv_format (see csv_layouts), its columns
+    named with their schema names in place of the header row, so no rename pass copies them
+    """
+    return pd.read_csv(stream, header=0, names=csv_format.column_names, **read_csv_kwargs)
+
+@timed("trip.validate_and_cast")
+def validate_and_cast_trip_schema(df: pd.DataFrame,
+                                  schema: Dict[str, ExtensionDtype],
+                                  copy: bool = True,
+                                  timestamp_format: Optional[str] = None) -> pd.DataFrame:
+    """
+    Validate CSV DataFrame against expected schema and cast to correct types.
+
+    Args:
+        df: Raw DataFrame read from a trip CSV
+        schema: Expected column names and dtypes
+        copy: If False, cast columns in place on df instead of on a copy
+            (use when df is a throwaway chunk to avoid doubling memory)
+        timestamp_format: Format of the timestamp columns, as sniffed from the file
+            (TripCsvFormat.pandas_timestamp_format); inferred from the values if None
+
+    Raises:
+        ValueError: If columns are missing, unexpected, or can't be cast
+    
+    Returns:
+        DataFrame with properly typed columns
+    """
+    record(rows=len(df))
+
+    # 1 & 2. Check for missing and unexpected columns
+    check_trip_columns(df.columns, schema)
     
     # 3. Attempt to cast each column to expected type
-    df_typed = df.copy()
+    df_typed = df.copy() if copy else df
 
     for column, expected_type in schema.items():
         try:
             if expected_type == "datetime64[ns]":
-                df_typed[column] = pd.to_datetime(df_typed[column])
+                df_typed[column] = pd.to_datetime(df_typed[column], format=timestamp_format)
             elif expected_type in ['int64', 'Int64', 'float64']:
                 # Force numeric conversion first, then to integer
                 df_typed[column] = pd.to_numeric(df_typed[column], errors="coerce").astype(expected_type)
@@ -46,7 +80,11 @@ def validate_and_cast_trip_schema(df: pd.DataFrame, schema: Dict[str, ExtensionD
     
     return df_typed
 
-def add_metadata_columns(df: pd.DataFrame, batch_key_value: str, batch_key_col: str = "_batch_key") -> pd.DataFrame:
+def add_metadata_columns(df: pd.DataFrame,
+                         batch_key_value: str,
+                         batch_key_col: str = "_batch_key",
+                         ingested_at: Optional[pd.Timestamp] = None,
+                         copy: bool = True) -> pd.DataFrame:
     """
     Add metadata columns to a validated DataFrame
 
@@ -54,12 +92,17 @@ def add_metadata_columns(df: pd.DataFrame, batch_key_value: str, batch_key_col:
         df: Validated DataFrame with correct schema
         batch_key_value: Batch identifier (e.g., "2024-01-01")
         batch_key_col: Name of the batch key column (default "_batch_key") 
+        ingested_at: Ingestion timestamp to stamp on every row (default now, NYC time).
+            Pass the same value for every chunk of a batch so the batch shares one timestamp.
+        copy: If False, add the columns to df in place instead of to a copy
     """
-    df_with_metadata = df.copy()
+    df_with_metadata = df.copy() if copy else df
 
     # Add ingestion timestamp (when our pipeline ingested this data)
     # Set this as NYC local time (with timezone info stripped, leaving wall clock time only)
-    df_with_metadata["_ingested_at"] = pd.Timestamp.now(tz='America/New_York').tz_localize(None)
+    if ingested_at is None:
+        ingested_at = pd.Timestamp.now(tz='America/New_York').tz_localize(None)
+    df_with_metadata["_ingested_at"] = ingested_at
 
     # Add batch key (the time in history of the actual data)
     df_with_metadata[batch_key_col] = batch_key_value
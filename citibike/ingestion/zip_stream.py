@@ -0,0 +1,184 @@
+import io
+import os
+import re
+import shutil
+import struct
+import zipfile
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple, Union
+
+# Read buffer for CSV streams; also bounds how much of a CSV can be peeked at
+# (header sniffing, chunk size sampling) without consuming the stream
+STREAM_BUFFER_BYTES = 4 * 1024 * 1024
+
+# Fixed part of a zip local file header: signature ... file name length, extra field length
+_LOCAL_HEADER = struct.Struct("<4s22xHH")
+
+
+@dataclass(frozen=True, order=True)
+class ZipMember:
+    """
+    A file inside a zip archive, possibly nested: members[:-1] are zips within zips,
+    members[-1] is the file itself. Picklable, so it can be handed to worker processes.
+    """
+    archive_path: str
+    members: Tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        return self.members[-1]
+
+    def __str__(self) -> str:
+        return "!".join((self.archive_path,) + self.members)
+
+    @contextmanager
+    def open(self, buffer_size: int = STREAM_BUFFER_BYTES) -> Iterator[io.BufferedReader]:
+        """
+        Open the member as a buffered binary stream, decompressing on the fly.
+
+        Nothing is written to disk. A nested zip stored without compression is read
+        through a window onto its parent; a compressed one is decompressed again on
+        every open (zipfile reads its central directory at the end, then seeks back),
+        which is why find_trip_csv_members spools those to disk instead.
+        """
+        with ExitStack() as stack:
+            fileobj: BinaryIO = stack.enter_context(open(self.archive_path, "rb"))
+            for nested_zip in self.members[:-1]:
+                archive = stack.enter_context(zipfile.ZipFile(fileobj))
+                fileobj = stack.enter_context(_open_nested_archive(archive, nested_zip))
+
+            archive = stack.enter_context(zipfile.ZipFile(fileobj))
+            member = stack.enter_context(archive.open(self.members[-1]))
+            yield io.BufferedReader(member, buffer_size=buffer_size)
+
+
+# A CSV to ingest: a path on disk, or a member of a (nested) zip archive
+CsvSource = Union[str, ZipMember]
+
+
+def open_csv_source(csv_source: CsvSource, buffer_size: int = STREAM_BUFFER_BYTES):
+    """
+    Open a CSV source as a buffered binary stream (a context manager). A small
+    buffer_size bounds how much a quick look at the head reads or decompresses.
+    """
+    if isinstance(csv_source, ZipMember):
+        return csv_source.open(buffer_size)
+    return open(csv_source, "rb", buffering=buffer_size)
+
+
+def csv_source_name(csv_source: CsvSource) -> str:
+    """File name of a CSV source, e.g. 202401-citibike-tripdata_1.csv"""
+    if isinstance(csv_source, ZipMember):
+        return os.path.basename(csv_source.name)
+    return os.path.basename(csv_source)
+
+
+def peek_csv_head(stream: io.BufferedReader, max_bytes: int = STREAM_BUFFER_BYTES) -> bytes:
+    """
+    The complete lines at the start of a buffered stream, without consuming them.
+    Returns fewer bytes than max_bytes if the buffer holds less.
+    """
+    head = stream.peek(max_bytes)[:max_bytes]
+    last_newline = head.rfind(b"\n")
+    return head[:last_newline + 1] if last_newline >= 0 else head
+
+
+def find_trip_csv_members(zip_path: str, year_month_prefix: str,
+                          spool_path: Optional[Callable[[str], str]] = None) -> List[ZipMember]:
+    """
+    Locate a month's batch CSVs (YYYYMM..._N.csv) inside a trip data zip, descending
+    into a nested YYYYMM...zip if there is one, without extracting any CSV.
+
+    Given spool_path (file name -> path), a compressed nested zip is decompressed once
+    to spool_path("nested-" + its name) and the members returned are read from that
+    file, so opening and sniffing them doesn't inflate the nested zip again each time.
+    The caller cleans up the spooled file (the archive_path of such members).
+    """
+    with open(zip_path, "rb") as f:
+        return _find_trip_csv_members(f, zip_path, (), year_month_prefix, spool_path)
+
+
+def _find_trip_csv_members(fileobj: BinaryIO, zip_path: str, parents: Tuple[str, ...], year_month_prefix: str,
+                           spool_path: Optional[Callable[[str], str]]) -> List[ZipMember]:
+    members = []
+    with zipfile.ZipFile(fileobj) as archive:
+        for file_info in archive.infolist():
+            basename = os.path.basename(file_info.filename)
+            extension = Path(basename).suffix
+            if not basename.startswith(year_month_prefix):
+                continue
+
+            # Case 1: the month's CSVs are inside YYYYMM-citibike-tripdata.zip
+            if extension == ".zip" and file_info.compress_type != zipfile.ZIP_STORED and spool_path is not None:
+                nested_path = spool_path(f"nested-{basename}")
+                with archive.open(file_info) as source, open(nested_path, "wb") as target:
+                    shutil.copyfileobj(source, target, STREAM_BUFFER_BYTES)
+                with open(nested_path, "rb") as nested:
+                    return _find_trip_csv_members(nested, nested_path, (), year_month_prefix, spool_path)
+            if extension == ".zip":
+                with _open_nested_archive(archive, file_info.filename) as nested:
+                    return _find_trip_csv_members(nested, zip_path, parents + (file_info.filename,), year_month_prefix, spool_path)
+
+            # Case 2: a batch CSV; the _N suffix skips duplicate files with formatting issues
+            if extension == ".csv" and re.search(r"_\d", Path(basename).stem):
+                members.append(ZipMember(zip_path, parents + (file_info.filename,)))
+
+    return members
+
+
+@contextmanager
+def _open_nested_archive(archive: zipfile.ZipFile, name: str) -> Iterator[BinaryIO]:
+    """Seekable stream over a zip stored inside another zip"""
+    info = archive.getinfo(name)
+    if info.compress_type != zipfile.ZIP_STORED:
+        # ZipExtFile can seek, but backward seeks re-decompress from the start
+        with archive.open(info) as member:
+            yield member
+        return
+
+    # Uncompressed: read the parent's bytes directly, no decompression or rewinds
+    archive.fp.seek(info.header_offset)
+    signature, name_length, extra_length = _LOCAL_HEADER.unpack(archive.fp.read(_LOCAL_HEADER.size))
+    if signature != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local header for nested archive {name}")
+    data_start = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+    yield io.BufferedReader(_FileWindow(archive.fp, data_start, info.file_size))
+
+
+class _FileWindow(io.RawIOBase):
+    """Read-only, seekable view of bytes [start, start + size) of another file"""
+
+    def __init__(self, fileobj: BinaryIO, start: int, size: int):
+        self._fileobj = fileobj
+        self._start = start
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, min(offset, self._size))
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self._size - self._position)
+        if length <= 0:
+            return 0
+        self._fileobj.seek(self._start + self._position)
+        data = self._fileobj.read(length)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
@@ -1,13 +1,40 @@
 import os
+from typing import Optional
 from google.cloud import bigquery
-from citibike.database.bigquery import initialize_bigquery_client
+from citibike.database.bigquery import get_bigquery_client
+from citibike.database.table_cache import TableCache
+from citibike.networks.centrality import CentralityOptions, calculate_centrality
+from citibike.networks.flow import FLOW_ALGORITHMS, MaxFlowResult, solve_max_flow
+from citibike.utils.metrics import record, span, timed
+import numpy as np
 import pandas as pd
 import networkx as nx
 
+# Columns of gold_commuter_hubs / gold_commuter_edges the analysis reads when going through a TableCache
+HUB_COLUMNS = [
+    "station_id", "lat", "lon", "name", "borough", "capacity",
+    "in_degree", "out_degree", "total_degree",
+    "weighted_in_degree", "weighted_out_degree", "weighted_total_degree",
+]
+EDGE_COLUMNS = ["start_station_id", "end_station_id", "num_trips", "distance_meters", "avg_duration"]
+
 
 class CommuterNetworkAnalyzer:
-    def __init__(self):
-        self.client: bigquery.Client  = initialize_bigquery_client()
+    def __init__(self,
+                 client: Optional[bigquery.Client] = None,
+                 flow_algorithm: str = "scipy",
+                 centrality_options: Optional[CentralityOptions] = None,
+                 table_cache: Optional[TableCache] = None,
+                 capacity_column: str = "capacity"):
+        if flow_algorithm not in FLOW_ALGORITHMS:
+            raise ValueError(f"Unknown max flow algorithm {flow_algorithm!r}; expected one of {FLOW_ALGORITHMS}")
+        self.client: bigquery.Client  = client or get_bigquery_client()
+        self.flow_algorithm = flow_algorithm
+        self.centrality_options = centrality_options or CentralityOptions()
+        self.table_cache = table_cache
+        # Station capacity used by the flow network: the static GBFS "capacity", or a
+        # column of gold_station_availability such as "effective_capacity"
+        self.capacity_column = capacity_column
         self.project_id = os.environ['GCP_PROJECT_ID']
         self.dataset = os.environ['BQ_DATASET']
         self.SUPER_SOURCE = "super_source"
@@ -17,178 +44,174 @@ class CommuterNetworkAnalyzer:
         """Construct a table id reference to a BigQuery table"""
         return f"{self.project_id}.{self.dataset}.{table_name}"
     
+    @timed("network.extract")
     def extract_network_data(self) -> tuple[pd.DataFrame, pd.DataFrame]:
-        """Queries the node and edge tables from BigQuery"""
-        nodes_query = f"SELECT * FROM {self._table_ref('gold_commuter_hubs')}"
-        edges_query = f"SELECT * FROM {self._table_ref('gold_commuter_edges')}"
-        
-        return (
-            self.client.query(nodes_query).to_dataframe(),
-            self.client.query(edges_query).to_dataframe()
-        )
+        """Queries the node and edge tables from BigQuery, or reads them from the table cache if there is one"""
+        if self.table_cache is not None:
+            hubs_df = self.table_cache.read(self.client, self._table_ref('gold_commuter_hubs'), HUB_COLUMNS)
+            edges_df = self.table_cache.read(self.client, self._table_ref('gold_commuter_edges'), EDGE_COLUMNS)
+        else:
+            nodes_query = f"SELECT * FROM {self._table_ref('gold_commuter_hubs')}"
+            edges_query = f"SELECT * FROM {self._table_ref('gold_commuter_edges')}"
+            nodes_job = self.client.query(nodes_query)
+            edges_job = self.client.query(edges_query)
+            hubs_df = nodes_job.to_dataframe()
+            edges_df = edges_job.to_dataframe()
+            record(job=nodes_job)
+            record(job=edges_job)
+
+        if self.capacity_column != "capacity":
+            hubs_df = self._with_observed_capacity(hubs_df)
+        record(rows=len(hubs_df) + len(edges_df), stations=len(hubs_df), edges=len(edges_df), cached=self.table_cache is not None)
+        return hubs_df, edges_df
+
+    def _with_observed_capacity(self, hubs_df: pd.DataFrame) -> pd.DataFrame:
+        """Add capacity_column from gold_station_availability; stations without status history keep their static capacity"""
+        columns = ["station_id", self.capacity_column]
+        if self.table_cache is not None:
+            availability_df = self.table_cache.read(self.client, self._table_ref('gold_station_availability'), columns)
+        else:
+            availability_query = f"SELECT {', '.join(columns)} FROM {self._table_ref('gold_station_availability')}"
+            availability_df = self.client.query(availability_query).to_dataframe()
+
+        hubs_df = hubs_df.merge(availability_df, on="station_id", how="left")
+        missing = hubs_df[self.capacity_column].isna()
+        print(f"Using {self.capacity_column} for {(~missing).sum()} stations, static capacity for {missing.sum()}")
+        hubs_df[self.capacity_column] = hubs_df[self.capacity_column].astype("float64").fillna(hubs_df["capacity"].astype("float64"))
+        return hubs_df
     
     def _build_graph(self, hubs_df: pd.DataFrame, edges_df: pd.DataFrame) ->nx.DiGraph:
         """Build directed graph of stations and edges"""
         G = nx.DiGraph()
 
-        # Add nodes with station attributes
-        for _, hub in hubs_df.iterrows():
-            G.add_node(hub["station_id"],
-                       name=hub["name"],
-                       borough=hub["borough"],
-                       capacity=hub["capacity"],
-                       lat=hub["lat"],
-                       lon=hub["lon"]
-                       )
-        
+        # Add nodes with station attributes, in bulk from the columns
+        node_attrs = hubs_df[["name", "borough", "capacity", "lat", "lon"]].to_dict("records")
+        G.add_nodes_from(zip(hubs_df["station_id"], node_attrs))
+
         # add edges with weights
-        for _, edge in edges_df.iterrows():
-            edge_attrs = {
-                "distance_meters": edge["distance_meters"],
-                "num_trips": edge["num_trips"],
-                "avg_duration": edge["avg_duration"],
-            }
-            G.add_edge(edge["start_station_id"], edge["end_station_id"], **edge_attrs)
-        
+        edge_attrs = edges_df[["distance_meters", "num_trips", "avg_duration"]].to_dict("records")
+        G.add_edges_from(zip(edges_df["start_station_id"], edges_df["end_station_id"], edge_attrs))
+
         return G
     
     def _calculate_centrality_metrics(self, station_graph: nx.DiGraph) -> dict:
-        """Calculate centrality measures for network importance ranking"""
-
-        return {
-            "pagerank": nx.pagerank(station_graph, weight="num_trips"),
-            "betweenness_centrality": nx.betweenness_centrality(station_graph, weight="num_trips"),
-            "closeness_centrality": nx.closeness_centrality(station_graph, distance="avg_duration"),
-            "degree_centrality": nx.degree_centrality(station_graph)
-        }
+        """Calculate centrality measures for network importance ranking, with their error bounds"""
+        return calculate_centrality(station_graph, self.centrality_options)
 
     
     def _build_flow_network(self, hubs_df: pd.DataFrame, edges_df: pd.DataFrame) -> nx.DiGraph:
         """Build node-split flow network for capacity-constrained max flow"""
         G = nx.DiGraph()
-        
+        station_ids = hubs_df['station_id'].astype(str)
+
         # Add node-split structure: each station becomes station_in -> station_out
-        for _, hub in hubs_df.iterrows():
-            station_id = hub['station_id']
-            G.add_edge(f"{station_id}_in", f"{station_id}_out", 
-                      capacity=hub['capacity'])
-        
+        G.add_edges_from(
+            (station_in, station_out, {"capacity": capacity})
+            for station_in, station_out, capacity in zip(station_ids + "_in", station_ids + "_out", hubs_df[self.capacity_column].tolist())
+        )
+
         # Add edges between stations with min-capacity constraint
         # Get capacities for edge constraint calculation
-        station_capacities = hubs_df.set_index('station_id')['capacity'].to_dict()
-
-        for _, edge in edges_df.iterrows():
-            start_station = edge['start_station_id'] 
-            end_station = edge['end_station_id']
-            edge_capacity = min(station_capacities[start_station], station_capacities[end_station])
-            
-            G.add_edge(f"{start_station}_out", f"{end_station}_in", capacity=edge_capacity)
-        
+        station_capacities = hubs_df.set_index('station_id')[self.capacity_column]
+        start_capacities = edges_df['start_station_id'].map(station_capacities)
+        end_capacities = edges_df['end_station_id'].map(station_capacities)
+
+        unknown_stations = pd.concat([
+            edges_df.loc[start_capacities.isna(), 'start_station_id'],
+            edges_df.loc[end_capacities.isna(), 'end_station_id'],
+        ]).unique()
+        if len(unknown_stations) > 0:
+            raise KeyError(f"Edges reference stations missing from hubs_df: {sorted(unknown_stations)}")
+
+        edge_capacities = np.minimum(start_capacities.to_numpy(), end_capacities.to_numpy())
+        G.add_edges_from(
+            (start_out, end_in, {"capacity": capacity})
+            for start_out, end_in, capacity in zip(
+                edges_df['start_station_id'].astype(str) + "_out",
+                edges_df['end_station_id'].astype(str) + "_in",
+                edge_capacities.tolist(),
+            )
+        )
+
         # Find sources and sinks
         # True sources: stations that only have outgoing edges
-        pure_sources = hubs_df[
-            (hubs_df["in_degree"] == 0) & (hubs_df["out_degree"] > 0)
-            ]['station_id'].tolist()
-        
+        pure_sources = station_ids[(hubs_df["in_degree"] == 0) & (hubs_df["out_degree"] > 0)]
+
         # True sinks: stations that only have incoming edges
-        pure_sinks = hubs_df[
-            (hubs_df["out_degree"] == 0) & (hubs_df["in_degree"] > 0)
-            ]['station_id'].tolist()
+        pure_sinks = station_ids[(hubs_df["out_degree"] == 0) & (hubs_df["in_degree"] > 0)]
 
         # Connect true source / sink nodes to single super source / sink
-        
 
         # Add single super source connected to all pure sources
-        for source_station in pure_sources:
-            G.add_edge(self.SUPER_SOURCE, f"{source_station}_in", capacity=float('inf'))
-        
+        G.add_edges_from((self.SUPER_SOURCE, source_in, {"capacity": float('inf')}) for source_in in pure_sources + "_in")
+
         # Add single super sink connected from all pure sinks
-        for sink_station in pure_sinks:
-            G.add_edge(f"{sink_station}_out", self.SUPER_SINK, capacity=float('inf'))
-        
+        G.add_edges_from((sink_out, self.SUPER_SINK, {"capacity": float('inf')}) for sink_out in pure_sinks + "_out")
+
         return G
         
-    def run_analysis(self, hubs_df: pd.DataFrame, edges_df: pd.DataFrame) -> pd.DataFrame:
-        """Run complete network flow analysis"""
+    @timed("network.run_analysis")
+    def run_analysis(self, hubs_df: pd.DataFrame, edges_df: pd.DataFrame, station_graph: Optional[nx.DiGraph] = None) -> pd.DataFrame:
+        """Run complete network flow analysis; station_graph skips rebuilding the station graph from the frames"""
+        record(rows=len(edges_df), stations=len(hubs_df), edges=len(edges_df))
+
         # Build the flow network
         G = self._build_flow_network(hubs_df, edges_df)
 
-        # Run max flow analysis
-        flow_value, flow_dict = nx.maximum_flow(G, self.SUPER_SOURCE, self.SUPER_SINK)
+        # Run max flow analysis once; both node classifications read its residual graph
+        with span("network.max_flow", algorithm=self.flow_algorithm):
+            max_flow = solve_max_flow(G, self.SUPER_SOURCE, self.SUPER_SINK, self.flow_algorithm)
+        print(f"Max flow through commuter network: {max_flow.flow_value}")
 
         # Find critical and bottleneck nodes
-        critical_nodes = self._find_critical_nodes(G)
-        bottleneck_nodes = self._find_bottleneck_nodes(G)
+        critical_nodes = self._find_critical_nodes(G, max_flow)
+        bottleneck_nodes = self._find_bottleneck_nodes(G, max_flow)
 
         # Find centrality measures
-        station_graph = self._build_graph(hubs_df, edges_df)
-        centrality_metrics = self._calculate_centrality_metrics(station_graph)
+        if station_graph is None:
+            station_graph = self._build_graph(hubs_df, edges_df)
+        with span("network.centrality", mode=self.centrality_options.mode):
+            centrality_metrics = self._calculate_centrality_metrics(station_graph)
 
         # Format results as DataFrame for BigQuery
         return self._format_analysis_results(hubs_df, critical_nodes, bottleneck_nodes, centrality_metrics)
     
-    def _find_critical_nodes(self, G: nx.DiGraph) -> list[str]:
+    def _find_critical_nodes(self, G: nx.DiGraph, max_flow: MaxFlowResult) -> list[str]:
         """
         Find all critical nodes using residual graph reachability analysis.
         Critical nodes are those whose capacity decrease would reduce max flow
         """
-        # Step 1: Get residual graph after max flow
-        residual = nx.algorithms.flow.edmonds_karp(G, self.SUPER_SOURCE, self.SUPER_SINK)
-
-        # Step 2: Find reachable vertices (only edges with remaining cpacity)
-        positive_residual = residual.edge_subgraph([
-            (u, v) for u, v, data in residual.edges(data=True)
-            if data["capacity"] > data["flow"]
-        ])
-
-        reachable = nx.descendants(positive_residual, self.SUPER_SOURCE)
+        # Reachable vertices from the source (only edges with remaining capacity)
+        reachable = max_flow.source_side
 
-        # Step 3: Identify critical nodes
+        # Identify critical nodes: the station's in -> out edge crosses the min cut
         critical_nodes = set()
-        original_nodes = set([node[:-3] for node in G.nodes() if node.endswith("_in")])
-
-        for node in original_nodes:
-            if node not in [self.SUPER_SOURCE, self.SUPER_SINK]:
-                node_in = f"{node}_in"
-                node_out = f"{node}_out"
-
-                if node_in in reachable and node_out not in reachable:
-                    critical_nodes.add(node)
+        for node in self._station_nodes(G):
+            if f"{node}_in" in reachable and f"{node}_out" not in reachable:
+                critical_nodes.add(node)
         
         return sorted(critical_nodes)
 
-    def _find_bottleneck_nodes(self, G: nx.DiGraph) -> list[str]:
+    def _find_bottleneck_nodes(self, G: nx.DiGraph, max_flow: MaxFlowResult) -> list[str]:
         """
         Find all bottleneck nodes using forward/backward reachability analysis.
         Bottleneck nodes are those whose capacity increase would increase max flow.
         """
+        # Forward and backward reachability in the residual graph
+        forward_reach = max_flow.source_side
+        backward_reach = max_flow.sink_side
 
-        # Step 1: Get residual graph after max flow
-        residual: nx.DiGraph = nx.algorithms.flow.edmonds_karp(G, self.SUPER_SOURCE, self.SUPER_SINK)
-
-        # Step 2: Find reachable vertices (only edges with remaining cpacity)
-        positive_residual = residual.edge_subgraph([
-            (u, v) for u, v, data in residual.edges(data=True)
-            if data["capacity"] > data["flow"]
-        ])
-
-        # Step 3: Forward and backward reachability
-        forward_reach = nx.descendants(positive_residual, self.SUPER_SOURCE)
-        backward_reach = nx.ancestors(positive_residual, self.SUPER_SINK)
-
-        # Step 4: Identify bottleneck nodes
+        # Identify bottleneck nodes
         bottleneck_nodes = set()
-        original_nodes = set([node[:-3] for node in G.nodes() if node.endswith("_in")])
-
-        for node in original_nodes:
-            if node not in [self.SUPER_SOURCE, self.SUPER_SINK]:
-                node_in = f"{node}_in"
-                node_out = f"{node}_out"
-
-                if node_in in forward_reach and node_out in backward_reach:
-                    bottleneck_nodes.add(node)
+        for node in self._station_nodes(G):
+            if f"{node}_in" in forward_reach and f"{node}_out" in backward_reach:
+                bottleneck_nodes.add(node)
         
         return sorted(bottleneck_nodes)
+
+    def _station_nodes(self, G: nx.DiGraph) -> set[str]:
+        """Station ids of a node-split flow network"""
+        return set([node[:-3] for node in G.nodes() if node.endswith("_in")]) - {self.SUPER_SOURCE, self.SUPER_SINK}
     
     def _format_analysis_results(self, 
                                  hubs_df: pd.DataFrame, 
@@ -201,6 +224,10 @@ class CommuterNetworkAnalyzer:
             (hubs_df["station_id"].isin(critical_nodes)) | (hubs_df["station_id"].isin(bottleneck_nodes))
             ].copy()
         
+        # The results keep the static capacity column only
+        if self.capacity_column != "capacity":
+            df = df.drop(columns=[self.capacity_column])
+
         # Enrich with node type
         df["is_critical"] = df["station_id"].isin(critical_nodes)
         df["is_bottleneck"] = df["station_id"].isin(bottleneck_nodes)
@@ -211,8 +238,16 @@ class CommuterNetworkAnalyzer:
         df['closeness_centrality'] = df['station_id'].map(centrality_metrics['closeness_centrality'])
         df['degree_centrality'] = df['station_id'].map(centrality_metrics['degree_centrality'])
 
+        # Largest possible absolute error of each score (0 when exact); betweenness,
+        # sampled in approximate mode, gets each station's standard error instead
+        error_bounds = centrality_metrics['error_bounds']
+        df['pagerank_error_bound'] = error_bounds['pagerank']
+        df['betweenness_standard_error'] = df['station_id'].map(centrality_metrics['standard_errors']['betweenness_centrality'])
+        df['closeness_error_bound'] = error_bounds['closeness_centrality']
+
         return df
         
+    @timed("network.write")
     def write_results_to_bq(self, results_df: pd.DataFrame, table_name: str):
         table_ref = self._table_ref(table_name)
         
@@ -224,3 +259,4 @@ class CommuterNetworkAnalyzer:
             results_df, table_ref, job_config=job_config
         )
         job.result()  # Wait for completion
+        record(rows=len(results_df), job=job, table=table_name)
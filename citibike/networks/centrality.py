@@ -0,0 +1,224 @@
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_array, diags_array
+from scipy.sparse.csgraph import dijkstra
+
+# "exact": networkx Brandes betweenness and closeness on the whole graph
+# "approximate": k-pivot sampled betweenness, scipy PageRank and closeness over a process pool
+CENTRALITY_MODES = ("exact", "approximate")
+
+# networkx PageRank defaults
+PAGERANK_ALPHA = 0.85
+PAGERANK_TOL = 1.0e-6
+PAGERANK_MAX_ITER = 100
+
+
+@dataclass
+class CentralityOptions:
+    """How CommuterNetworkAnalyzer computes centrality. The defaults reproduce the original behavior."""
+
+    # One of CENTRALITY_MODES
+    mode: str = "exact"
+
+    # Approximate mode: number of pivot (source) stations sampled for betweenness
+    betweenness_samples: int = 256
+
+    # Seed for the pivot sample, so reruns over the same graph give the same scores
+    seed: int = 42
+
+    # Approximate mode: processes computing closeness shortest paths
+    workers: int = 1
+
+    def __post_init__(self):
+        if self.mode not in CENTRALITY_MODES:
+            raise ValueError(f"Unknown centrality mode {self.mode!r}; expected one of {CENTRALITY_MODES}")
+        if self.betweenness_samples < 1:
+            raise ValueError(f"betweenness_samples must be at least 1, got {self.betweenness_samples}")
+        if self.workers < 1:
+            raise ValueError(f"workers must be at least 1, got {self.workers}")
+
+    @classmethod
+    def from_env(cls) -> "CentralityOptions":
+        """Build options from NETWORK_CENTRALITY_* environment variables (see config/*.env.example)"""
+        return cls(
+            mode=os.environ.get("NETWORK_CENTRALITY_MODE", "exact"),
+            betweenness_samples=int(os.environ.get("NETWORK_CENTRALITY_SAMPLES", "256")),
+            seed=int(os.environ.get("NETWORK_CENTRALITY_SEED", "42")),
+            workers=int(os.environ.get("NETWORK_CENTRALITY_WORKERS", "1")),
+        )
+
+
+def calculate_centrality(G: nx.DiGraph, options: CentralityOptions) -> Dict[str, Any]:
+    """
+    Centrality scores per station, plus "error_bounds": the largest possible absolute
+    error of the PageRank and closeness scores (0 where exact), and "standard_errors":
+    the standard error of each station's betweenness (0 where exact; see
+    sampled_betweenness_centrality).
+    """
+    if options.mode == "exact":
+        pagerank = nx.pagerank(G, weight="num_trips", alpha=PAGERANK_ALPHA, tol=PAGERANK_TOL)
+        return {
+            "pagerank": pagerank,
+            "betweenness_centrality": nx.betweenness_centrality(G, weight="num_trips"),
+            "closeness_centrality": nx.closeness_centrality(G, distance="avg_duration"),
+            "degree_centrality": nx.degree_centrality(G),
+            "error_bounds": {
+                # networkx stops once an iteration moves the scores by less than N * tol in total
+                "pagerank": _pagerank_error_bound(len(G) * PAGERANK_TOL),
+                "closeness_centrality": 0.0,
+            },
+            "standard_errors": {
+                "betweenness_centrality": dict.fromkeys(G, 0.0),
+            },
+        }
+
+    pagerank, pagerank_bound = pagerank_scipy(G, weight="num_trips")
+    betweenness, betweenness_errors = sampled_betweenness_centrality(G, options.betweenness_samples, options.seed)
+    return {
+        "pagerank": pagerank,
+        "betweenness_centrality": betweenness,
+        "closeness_centrality": parallel_closeness_centrality(G, distance="avg_duration", workers=options.workers),
+        "degree_centrality": nx.degree_centrality(G),
+        "error_bounds": {
+            "pagerank": pagerank_bound,
+            "closeness_centrality": 0.0,
+        },
+        "standard_errors": {
+            "betweenness_centrality": betweenness_errors,
+        },
+    }
+
+
+def pagerank_scipy(G: nx.DiGraph,
+                   weight: str = "weight",
+                   alpha: float = PAGERANK_ALPHA,
+                   tol: float = PAGERANK_TOL,
+                   max_iter: int = PAGERANK_MAX_ITER) -> Tuple[Dict[Hashable, float], float]:
+    """
+    PageRank by power iteration on a sparse transition matrix (same scores as
+    nx.pagerank with uniform personalization and dangling weights).
+
+    Returns the scores and a bound on each score's error, from the size of the
+    last iteration's step.
+    """
+    nodes = list(G)
+    N = len(nodes)
+    if N == 0:
+        return {}, 0.0
+
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=weight, dtype=float)
+    out_weight = A.sum(axis=1)
+    inverse_out_weight = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=out_weight != 0)
+    transition = diags_array(inverse_out_weight) @ A
+    is_dangling = out_weight == 0
+
+    x = np.full(N, 1.0 / N)
+    teleport = np.full(N, 1.0 / N)
+    for _ in range(max_iter):
+        x_last = x
+        x = alpha * (x @ transition + x[is_dangling].sum() * teleport) + (1 - alpha) * teleport
+        step = np.abs(x - x_last).sum()
+        if step < N * tol:
+            return dict(zip(nodes, map(float, x))), _pagerank_error_bound(step, alpha)
+
+    raise nx.PowerIterationFailedConvergence(max_iter)
+
+
+def sampled_betweenness_centrality(G: nx.DiGraph, samples: int, seed: int) -> Tuple[Dict[Hashable, float], Dict[Hashable, float]]:
+    """
+    Betweenness estimated from shortest paths out of `samples` random pivot stations
+    (Brandes-Pich): the same pivots and scores as nx.betweenness_centrality(k=samples,
+    seed=seed).
+
+    A station's score is the mean of its dependency on each pivot other than itself,
+    so each score also gets the standard error of that mean, from the spread of the
+    dependencies (with a finite-population correction, as pivots are drawn without
+    replacement). A station's dependencies are skewed when few stations route
+    through it, so its standard error is itself a noisy estimate, and it is 0 for a
+    station no sampled path goes through.
+    """
+    n = len(G)
+    if samples >= n or n < 3:
+        return nx.betweenness_centrality(G, weight="num_trips"), dict.fromkeys(G, 0.0)
+
+    nodes = list(G)
+    # Drawn like nx.betweenness_centrality draws its k pivots
+    pivots = random.Random(seed).sample(nodes, samples)
+
+    dependency_sum = np.zeros(n)
+    dependency_squares = np.zeros(n)
+    for pivot in pivots:
+        # Each station's dependency on the pivot, scaled so that the mean over all
+        # pivots is the normalized betweenness
+        dependency = nx.betweenness_centrality_subset(G, [pivot], nodes, normalized=False, weight="num_trips")
+        values = np.fromiter(dependency.values(), dtype=float, count=n) / (n - 2)
+        dependency_sum += values
+        dependency_squares += values ** 2
+
+    # A pivot's dependency on itself is 0 and isn't a sample of its own score
+    index = {node: i for i, node in enumerate(nodes)}
+    num_samples = np.full(n, samples)
+    num_samples[[index[pivot] for pivot in pivots]] -= 1
+
+    scores = dependency_sum / num_samples
+    # NaN for a pivot's own standard error when samples == 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = np.maximum(dependency_squares - num_samples * scores ** 2, 0.0) / (num_samples - 1)
+        standard_errors = np.sqrt(variance / num_samples * (1 - num_samples / (n - 1)))
+
+    return dict(zip(nodes, map(float, scores))), dict(zip(nodes, map(float, standard_errors)))
+
+
+def parallel_closeness_centrality(G: nx.DiGraph, distance: str, workers: int = 1) -> Dict[Hashable, float]:
+    """
+    Exact closeness centrality (same as nx.closeness_centrality with wf_improved=True),
+    with the per-station shortest path searches split across worker processes.
+    """
+    nodes = list(G)
+    n = len(nodes)
+    if n == 0:
+        return {}
+
+    # Closeness of a station in a directed graph uses the distances *to* it,
+    # i.e. the distances from it in the reversed graph
+    reversed_distances = csr_array(nx.to_scipy_sparse_array(G, nodelist=nodes, weight=distance, dtype=float).T)
+    chunks = [chunk.tolist() for chunk in np.array_split(np.arange(n), max(1, workers * 4)) if len(chunk)]
+
+    if workers == 1:
+        results = [_closeness_for_sources(reversed_distances, chunk) for chunk in chunks]
+    else:
+        # spawn, not fork: the parent holds BigQuery client threads and sockets
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+            results = list(pool.map(_closeness_for_sources, [reversed_distances] * len(chunks), chunks))
+
+    closeness = np.concatenate(results)
+    return dict(zip(nodes, map(float, closeness)))
+
+
+def _closeness_for_sources(reversed_distances: csr_array, sources: List[int]) -> np.ndarray:
+    """Worker task: closeness of the given node indexes"""
+    n = reversed_distances.shape[0]
+    distances = dijkstra(reversed_distances, directed=True, indices=sources)
+
+    reachable = np.isfinite(distances)
+    num_reachable = reachable.sum(axis=1) - 1  # excluding the node itself
+    total_distance = np.where(reachable, distances, 0.0).sum(axis=1)
+
+    closeness = np.zeros(len(sources))
+    has_paths = (total_distance > 0) & (n > 1)
+    # Wasserman-Faust scaling, for graphs that aren't strongly connected
+    closeness[has_paths] = (num_reachable[has_paths] / total_distance[has_paths]) * (num_reachable[has_paths] / (n - 1))
+    return closeness
+
+
+def _pagerank_error_bound(step: float, alpha: float = PAGERANK_ALPHA) -> float:
+    """Power iteration contracts by alpha, so the remaining error is at most alpha / (1 - alpha) times the last step"""
+    return alpha / (1 - alpha) * step
@@ -0,0 +1,243 @@
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from google.cloud import bigquery
+
+from citibike.database.table_cache import TableCache
+from citibike.networks.analysis import CommuterNetworkAnalyzer
+from citibike.networks.centrality import CentralityOptions
+
+# Default hour-of-day ranges (inclusive) analyzed in every window: morning and evening commutes
+DEFAULT_HOUR_SLICES = ((7, 10), (16, 19))
+
+# Station attributes carried on graph nodes and into the results, as in gold_commuter_hubs
+STATION_COLUMNS = ["station_id", "lat", "lon", "name", "borough", "capacity"]
+
+
+class IncrementalCommuterGraph:
+    """
+    Station graph over a sliding window of edge slices, updated in place.
+
+    Holds the summed trips and durations of every station pair in the window, and a
+    DiGraph of only the pairs with at least min_trips trips. add() and remove() take
+    edge slices (rows of gold_commuter_edge_slices) entering or leaving the window;
+    only the pairs they touch are updated, so sliding the window costs the size of
+    the slices, not of the window.
+    """
+
+    def __init__(self, stations_df: pd.DataFrame, min_trips: int = 1):
+        self.min_trips = min_trips
+        self.graph = nx.DiGraph()
+        self._station_attrs: Dict[str, dict] = stations_df.set_index("station_id")[STATION_COLUMNS[1:]].to_dict("index")
+        self._num_trips: Dict[Tuple[str, str], int] = {}
+        self._total_duration: Dict[Tuple[str, str], float] = {}
+
+    def add(self, edge_slices: pd.DataFrame) -> None:
+        self._apply(edge_slices, 1)
+
+    def remove(self, edge_slices: pd.DataFrame) -> None:
+        self._apply(edge_slices, -1)
+
+    def _apply(self, edge_slices: pd.DataFrame, sign: int) -> None:
+        if edge_slices.empty:
+            return
+
+        # Collapse the slices to one delta per station pair first
+        deltas = edge_slices.groupby(["start_station_id", "end_station_id"], sort=False)[["num_trips", "total_duration"]].sum()
+        pairs = deltas.index.tolist()
+        trips_deltas = (deltas["num_trips"].to_numpy() * sign).tolist()
+        duration_deltas = (deltas["total_duration"].to_numpy(dtype=float) * sign).tolist()
+
+        for pair, trips_delta, duration_delta in zip(pairs, trips_deltas, duration_deltas):
+            num_trips = self._num_trips.get(pair, 0) + trips_delta
+            if num_trips <= 0:
+                self._num_trips.pop(pair, None)
+                self._total_duration.pop(pair, None)
+            else:
+                self._num_trips[pair] = num_trips
+                self._total_duration[pair] = self._total_duration.get(pair, 0.0) + duration_delta
+            self._sync_edge(pair)
+
+    def _sync_edge(self, pair: Tuple[str, str]) -> None:
+        """Bring one station pair's graph edge in line with its window totals"""
+        start, end = pair
+        num_trips = self._num_trips.get(pair, 0)
+
+        if num_trips >= self.min_trips and start in self._station_attrs and end in self._station_attrs:
+            for station in pair:
+                if station not in self.graph:
+                    self.graph.add_node(station, **self._station_attrs[station])
+            self.graph.add_edge(
+                start,
+                end,
+                num_trips=num_trips,
+                avg_duration=self._total_duration[pair] / num_trips,
+                distance_meters=self._distance_meters(start, end),
+            )
+        elif self.graph.has_edge(start, end):
+            self.graph.remove_edge(start, end)
+            for station in pair:
+                if self.graph.degree(station) == 0:
+                    self.graph.remove_node(station)
+
+    def _distance_meters(self, start: str, end: str) -> float:
+        a, b = self._station_attrs[start], self._station_attrs[end]
+        return _haversine_meters(a["lat"], a["lon"], b["lat"], b["lon"])
+
+    def network_frames(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """(hubs_df, edges_df) of the current graph, shaped like gold_commuter_hubs / gold_commuter_edges"""
+        G = self.graph
+        edges = list(G.edges(data=True))
+        edges_df = pd.DataFrame({
+            "start_station_id": [u for u, _, _ in edges],
+            "end_station_id": [v for _, v, _ in edges],
+            "num_trips": np.array([data["num_trips"] for _, _, data in edges], dtype=np.int64),
+            "distance_meters": [data["distance_meters"] for _, _, data in edges],
+            "avg_duration": [data["avg_duration"] for _, _, data in edges],
+        })
+
+        stations = list(G.nodes())
+        hubs_df = pd.DataFrame.from_dict({station: G.nodes[station] for station in stations}, orient="index")
+        hubs_df = hubs_df.rename_axis("station_id").reset_index()
+        hubs_df["in_degree"] = [G.in_degree(station) for station in stations]
+        hubs_df["out_degree"] = [G.out_degree(station) for station in stations]
+        hubs_df["total_degree"] = hubs_df["in_degree"] + hubs_df["out_degree"]
+        hubs_df["weighted_in_degree"] = [int(G.in_degree(station, weight="num_trips")) for station in stations]
+        hubs_df["weighted_out_degree"] = [int(G.out_degree(station, weight="num_trips")) for station in stations]
+        hubs_df["weighted_total_degree"] = hubs_df["weighted_in_degree"] + hubs_df["weighted_out_degree"]
+        return hubs_df, edges_df
+
+
+class TimeSlicedNetworkAnalyzer(CommuterNetworkAnalyzer):
+    """
+    Rolling commuter network analysis: for each window of window_weeks weeks, sliding
+    one week at a time, and each hour-of-day range, run the same flow and centrality
+    analysis as run_analysis.
+
+    The weekly edge slices are read from BigQuery once; each hour range keeps an
+    IncrementalCommuterGraph that adds the week entering the window and removes
+    the week leaving it, instead of re-aggregating the window.
+    """
+
+    def __init__(self,
+                 window_weeks: int = 4,
+                 hour_slices: Sequence[Tuple[int, int]] = DEFAULT_HOUR_SLICES,
+                 min_trips: int = 10,
+                 client: Optional[bigquery.Client] = None,
+                 flow_algorithm: str = "scipy",
+                 centrality_options: Optional[CentralityOptions] = None,
+                 table_cache: Optional[TableCache] = None):
+        super().__init__(client=client, flow_algorithm=flow_algorithm, centrality_options=centrality_options, table_cache=table_cache)
+        if window_weeks < 1:
+            raise ValueError(f"window_weeks must be at least 1, got {window_weeks}")
+        for start_hour, end_hour in hour_slices:
+            if not 0 <= start_hour <= end_hour <= 23:
+                raise ValueError(f"Hour slices must be (start, end) hours with 0 <= start <= end <= 23, got {(start_hour, end_hour)}")
+        self.window_weeks = window_weeks
+        self.hour_slices = list(hour_slices)
+        self.min_trips = min_trips
+
+    def extract_slice_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Queries the station attributes and the weekly edge slices from BigQuery, or reads them from the table cache"""
+        if self.table_cache is not None:
+            stations_df = self.table_cache.read(self.client, self._table_ref('silver_stations'), ["short_name"] + STATION_COLUMNS[1:])
+            stations_df = stations_df.rename(columns={"short_name": "station_id"})
+            stations_df = stations_df[stations_df["station_id"].notna() & stations_df["borough"].notna()].drop_duplicates("station_id")
+            return stations_df, self.table_cache.read(self.client, self._table_ref('gold_commuter_edge_slices'))
+
+        stations_query = f"""
+            SELECT short_name AS station_id, lat, lon, name, borough, capacity
+            FROM {self._table_ref('silver_stations')}
+            WHERE short_name IS NOT NULL AND borough IS NOT NULL
+        """
+        slices_query = f"SELECT * FROM {self._table_ref('gold_commuter_edge_slices')}"
+
+        stations_df = self.client.query(stations_query).to_dataframe().drop_duplicates("station_id")
+        return stations_df, self.client.query(slices_query).to_dataframe()
+
+    def run_sliced_analysis(self, stations_df: pd.DataFrame, edge_slices_df: pd.DataFrame) -> pd.DataFrame:
+        """Analyze every (window, hour range) slice; returns one row per critical or bottleneck station per slice"""
+        weeks = sorted(pd.to_datetime(edge_slices_df["week_start"]).dt.date.unique())
+        if len(weeks) < self.window_weeks:
+            print(f"Only {len(weeks)} week(s) of edge slices, fewer than the {self.window_weeks} week window")
+            return pd.DataFrame()
+
+        week_of_row = pd.to_datetime(edge_slices_df["week_start"]).dt.date
+        results = []
+        for start_hour, end_hour in self.hour_slices:
+            in_hours = edge_slices_df["start_hour"].between(start_hour, end_hour)
+            hour_slices = edge_slices_df[in_hours]
+            slices_by_week = {week: rows for week, rows in hour_slices.groupby(week_of_row[in_hours])}
+
+            graph = IncrementalCommuterGraph(stations_df, self.min_trips)
+            for window_start, entering, leaving in _sliding_windows(weeks, self.window_weeks):
+                for week in entering:
+                    graph.add(slices_by_week.get(week, hour_slices.iloc[0:0]))
+                for week in leaving:
+                    graph.remove(slices_by_week.get(week, hour_slices.iloc[0:0]))
+
+                window_end = window_start + timedelta(weeks=self.window_weeks) - timedelta(days=1)
+                slice_results = self._analyze_slice(graph, window_start, window_end, start_hour, end_hour)
+                if slice_results is not None:
+                    results.append(slice_results)
+
+        return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+    def _analyze_slice(self, graph: IncrementalCommuterGraph, window_start: date, window_end: date, start_hour: int, end_hour: int) -> Optional[pd.DataFrame]:
+        hubs_df, edges_df = graph.network_frames()
+        label = f"{window_start}..{window_end} hours {start_hour}-{end_hour}"
+        print(f"Analyzing slice {label}: {len(hubs_df)} stations, {len(edges_df)} edges")
+
+        try:
+            results = self.run_analysis(hubs_df, edges_df, station_graph=graph.graph)
+        except nx.NetworkXError as e:
+            # e.g. no station in the slice is a pure source or sink, so there is no flow network
+            print(f"Skipping slice {label}: {e}")
+            return None
+
+        results.insert(0, "end_hour", end_hour)
+        results.insert(0, "start_hour", start_hour)
+        results.insert(0, "slice_end_date", window_end)
+        results.insert(0, "slice_start_date", window_start)
+        return results
+
+    def write_slice_results_to_bq(self, results_df: pd.DataFrame, table_name: str) -> None:
+        """Replace the slice_start_date partitions covered by results_df, leaving other slices in place"""
+        table_ref = self._table_ref(table_name)
+        job_config = bigquery.LoadJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+            # Tables created before a result column existed gain it on the next write
+            schema_update_options=[bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION],
+        )
+
+        for slice_start_date, partition_df in results_df.groupby("slice_start_date"):
+            partition_ref = f"{table_ref}${slice_start_date:%Y%m%d}"
+            job = self.client.load_table_from_dataframe(partition_df, partition_ref, job_config=job_config)
+            job.result()  # Wait for completion
+            print(f"Wrote {len(partition_df)} rows to {partition_ref}")
+
+
+def _sliding_windows(weeks: List[date], window_weeks: int) -> Iterator[Tuple[date, List[date], List[date]]]:
+    """(window start, weeks entering, weeks leaving) for each window of consecutive calendar weeks"""
+    first, last = weeks[0], weeks[-1]
+    window_start = first
+    in_window: List[date] = []
+    while window_start + timedelta(weeks=window_weeks - 1) <= last:
+        window = [window_start + timedelta(weeks=i) for i in range(window_weeks)]
+        entering = [week for week in window if week not in in_window]
+        leaving = [week for week in in_window if week not in window]
+        in_window = window
+        yield window_start, entering, leaving
+        window_start += timedelta(weeks=1)
+
+
+def _haversine_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance, close to BigQuery's ST_DISTANCE at city scale"""
+    earth_radius_meters = 6_371_008.8
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi, dlambda = phi2 - phi1, np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return float(2 * earth_radius_meters * np.arcsin(np.sqrt(a)))
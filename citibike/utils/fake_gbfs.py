@@ -0,0 +1,118 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from citibike.utils.local_http import LocalHTTPServer, json_route
+
+
+class FakeGBFSFeed:
+    """
+    Synthetic GBFS v2.3 system whose station availability drifts between requests,
+    for running the station pollers against a LocalHTTPServer.
+
+    Every request to station_status.json advances the simulation one step: a random
+    subset of stations (change_fraction of them) rent or return bikes and get a new
+    last_reported, the rest are reported unchanged.
+    """
+
+    def __init__(self,
+                 num_stations: int = 100,
+                 ttl: int = 5,
+                 change_fraction: float = 0.1,
+                 num_free_bikes: int = 20,
+                 seed: int = 0,
+                 clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.change_fraction = change_fraction
+        self.clock = clock
+        self.status_requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        now = int(clock())
+        self.stations: List[Dict[str, Any]] = []
+        self.status: Dict[str, Dict[str, Any]] = {}
+        for i in range(num_stations):
+            station_id = f"fake-{i:05d}"
+            capacity = self._rng.randint(15, 60)
+            self.stations.append({
+                "station_id": station_id,
+                "short_name": f"{5000 + i}.{i % 10:02d}",
+                "name": f"Fake St & {i} Ave",
+                "region_id": "71",
+                "lat": 40.70 + self._rng.random() * 0.1,
+                "lon": -74.02 + self._rng.random() * 0.1,
+                "capacity": capacity,
+            })
+            bikes = self._rng.randint(0, capacity)
+            self.status[station_id] = {
+                "station_id": station_id,
+                "num_bikes_available": bikes,
+                "num_ebikes_available": self._rng.randint(0, bikes),
+                "num_bikes_disabled": 0,
+                "num_docks_available": capacity - bikes,
+                "num_docks_disabled": 0,
+                "is_installed": True,
+                "is_renting": True,
+                "is_returning": True,
+                "last_reported": now,
+            }
+        self.free_bikes = [
+            {
+                "bike_id": f"fake-bike-{i:05d}",
+                "lat": 40.70 + self._rng.random() * 0.1,
+                "lon": -74.02 + self._rng.random() * 0.1,
+                "is_reserved": False,
+                "is_disabled": False,
+                "vehicle_type_id": "2",
+            }
+            for i in range(num_free_bikes)
+        ]
+
+    def server(self, fail_next_requests: int = 0) -> LocalHTTPServer:
+        """LocalHTTPServer serving the feed under /gbfs/en/ (not started)"""
+        return LocalHTTPServer(
+            routes={
+                "/gbfs/en/station_information.json": json_route(self.station_information),
+                "/gbfs/en/station_status.json": json_route(self.station_status),
+                "/gbfs/en/free_bike_status.json": json_route(self.free_bike_status),
+            },
+            fail_next_requests=fail_next_requests,
+        )
+
+    def station_information(self) -> Dict[str, Any]:
+        return self._envelope({"stations": self.stations})
+
+    def station_status(self) -> Dict[str, Any]:
+        with self._lock:
+            self.status_requests += 1
+            self._step()
+            return self._envelope({"stations": [dict(status) for status in self.status.values()]})
+
+    def free_bike_status(self) -> Dict[str, Any]:
+        with self._lock:
+            # A few bikes move a little each request
+            for bike in self._rng.sample(self.free_bikes, k=len(self.free_bikes) // 10):
+                bike["lat"] += self._rng.uniform(-0.001, 0.001)
+            return self._envelope({"bikes": [dict(bike) for bike in self.free_bikes]})
+
+    def _step(self) -> None:
+        now = int(self.clock())
+        num_changed = max(1, int(len(self.status) * self.change_fraction)) if self.status else 0
+        for station_id in self._rng.sample(list(self.status), k=num_changed):
+            status = self.status[station_id]
+            docked = status["num_bikes_available"] + status["num_docks_available"]
+            bikes = min(docked, max(0, status["num_bikes_available"] + self._rng.choice([-2, -1, 1, 2])))
+            status["num_bikes_available"] = bikes
+            status["num_ebikes_available"] = min(status["num_ebikes_available"], bikes)
+            status["num_docks_available"] = docked - bikes
+            status["last_reported"] = now
+
+    def _envelope(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "last_updated": int(self.clock()),
+            "ttl": self.ttl,
+            "version": "2.3",
+            "data": data,
+        }
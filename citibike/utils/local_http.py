@@ -0,0 +1,146 @@
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+# A route returns (body, content type) for a request path
+Route = Callable[[], Tuple[bytes, str]]
+
+_RANGE_HEADER = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class LocalHTTPServer:
+    """
+    Small threaded HTTP server for exercising the downloaders and pollers offline.
+
+    Serves files from `directory` with HEAD, ETag and single-range (Range: bytes=a-b)
+    support, plus any dynamic `routes` (e.g. fake GBFS feeds). Set fail_next_requests
+    to make that many upcoming GETs fail with 503, to exercise retries. Connections
+    are kept alive (HTTP/1.1); connection_count tells how many clients opened.
+
+    Usage:
+        with LocalHTTPServer(directory="/tmp/fixtures") as server:
+            requests.get(f"{server.url}/202401-citibike-tripdata.zip")
+    """
+
+    def __init__(self, directory: Optional[str] = None, routes: Optional[Dict[str, Route]] = None, fail_next_requests: int = 0):
+        self.directory = Path(directory) if directory else None
+        self.routes = routes or {}
+        self.fail_next_requests = fail_next_requests
+        self.request_log: list[Tuple[str, str, Optional[str]]] = []  # (method, path, range header)
+        self.connection_count = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("LocalHTTPServer is not running")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LocalHTTPServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "LocalHTTPServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            if self.fail_next_requests > 0:
+                self.fail_next_requests -= 1
+                return True
+            return False
+
+    def _resolve(self, path: str) -> Optional[Tuple[bytes, str]]:
+        if path in self.routes:
+            return self.routes[path]()
+        if self.directory is not None:
+            file_path = (self.directory / path.lstrip("/")).resolve()
+            if file_path.is_file() and self.directory.resolve() in file_path.parents:
+                return file_path.read_bytes(), "application/octet-stream"
+        return None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connection_count += 1
+
+            def do_HEAD(self):
+                self._respond(include_body=False)
+
+            def do_GET(self):
+                self._respond(include_body=True)
+
+            def _respond(self, include_body: bool):
+                path = self.path.split("?")[0]
+                range_header = self.headers.get("Range")
+                with server._lock:
+                    server.request_log.append((self.command, path, range_header))
+
+                if include_body and server._should_fail():
+                    self.send_error(503, "Injected failure")
+                    return
+
+                resolved = server._resolve(path)
+                if resolved is None:
+                    self.send_error(404)
+                    return
+
+                body, content_type = resolved
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                status, start, end = 200, 0, len(body) - 1
+
+                match = _RANGE_HEADER.fullmatch(range_header or "")
+                if match and (match[1] or match[2]):
+                    if match[1]:
+                        start = int(match[1])
+                        end = min(int(match[2]), len(body) - 1) if match[2] else len(body) - 1
+                    else:
+                        start = max(0, len(body) - int(match[2]))
+                    status = 206
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("ETag", etag)
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+                self.end_headers()
+
+                if include_body:
+                    self.wfile.write(body[start:end + 1])
+
+            def log_message(self, format, *args):
+                pass  # keep test output quiet
+
+        return Handler
+
+
+def json_route(payload_factory: Callable[[], dict]) -> Route:
+    """Route serving a JSON document built fresh on every request"""
+    return lambda: (json.dumps(payload_factory()).encode(), "application/json")
@@ -0,0 +1,176 @@
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is then left out
+    resource = None
+
+# The innermost open span of the current thread / task, so nested code can add counts to it
+_CURRENT_SPAN: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("citibike_metrics_span", default=None)
+
+# Lists receiving every finished span record (see collect_spans)
+_COLLECTORS: List[List[Dict[str, Any]]] = []
+_FILE_LOCK = threading.Lock()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process so far, in MB"""
+    # On Linux ru_maxrss survives fork and exec, so a process started from a big parent
+    # (an Airflow worker, a process pool) would report the parent's peak; VmHWM doesn't
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+class Span:
+    """
+    Measurements of one pipeline stage: wall time, rows and bytes handled, the
+    statistics of the BigQuery jobs it ran, and the process's peak RSS.
+
+    Peak RSS is a process-wide high-water mark; peak_rss_growth_mb is how much the
+    stage raised it, which is what points at a memory-hungry stage.
+    """
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional["Span"] = None):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.rows = 0
+        self.bytes = 0
+        self.bq_bytes_processed = 0
+        self.bq_bytes_billed = 0
+        self.bq_slot_ms = 0
+        self.bq_output_bytes = 0
+        self.job_ids: List[str] = []
+        self._start = time.perf_counter()
+        self._start_peak_rss_mb = peak_rss_mb()
+
+    def add(self, rows: int = 0, bytes: int = 0, **attributes: Any) -> None:
+        """Count rows and bytes handled by the stage, and set extra attributes"""
+        self.rows += int(rows)
+        self.bytes += int(bytes)
+        self.attributes.update(attributes)
+
+    def add_job(self, job: Any) -> None:
+        """Add the statistics of a finished BigQuery query, load or copy job"""
+        self.job_ids.append(getattr(job, "job_id", None))
+        self.bq_bytes_processed += getattr(job, "total_bytes_processed", None) or 0
+        self.bq_bytes_billed += getattr(job, "total_bytes_billed", None) or 0
+        self.bq_slot_ms += getattr(job, "slot_millis", None) or 0
+        self.bq_output_bytes += getattr(job, "output_bytes", None) or 0
+
+    def to_record(self, status: str) -> Dict[str, Any]:
+        wall_seconds = time.perf_counter() - self._start
+        end_peak_rss_mb = peak_rss_mb()
+        record = {
+            "metric": "span",
+            "name": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "status": status,
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+            "wall_seconds": round(wall_seconds, 6),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "rows_per_second": round(self.rows / wall_seconds, 1) if self.rows and wall_seconds > 0 else None,
+            "peak_rss_mb": round(end_peak_rss_mb, 1) if end_peak_rss_mb is not None else None,
+            "peak_rss_growth_mb": round(end_peak_rss_mb - self._start_peak_rss_mb, 1) if end_peak_rss_mb is not None else None,
+        }
+        if self.job_ids:
+            record.update({
+                "bq_jobs": len(self.job_ids),
+                "bq_job_ids": self.job_ids,
+                "bq_bytes_processed": self.bq_bytes_processed,
+                "bq_bytes_billed": self.bq_bytes_billed,
+                "bq_slot_ms": self.bq_slot_ms,
+                "bq_output_bytes": self.bq_output_bytes,
+            })
+        record.update(self.attributes)
+        return record
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a block as one pipeline stage and emit its metrics when it exits (also on error).
+
+    Records are printed as one JSON line each, and appended to the JSON lines file
+    named by PIPELINE_METRICS_FILE if it is set. Spans nest: a span opened inside
+    another records it as its parent (threads and worker processes start fresh).
+    """
+    current = Span(name, attributes, parent=_CURRENT_SPAN.get())
+    token = _CURRENT_SPAN.set(current)
+    status = "error"
+    try:
+        yield current
+        status = "ok"
+    finally:
+        _CURRENT_SPAN.reset(token)
+        _emit(current.to_record(status))
+
+
+def timed(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Decorator running each call of a function inside span(name), named after the function by default"""
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(rows: int = 0, bytes: int = 0, job: Any = None, **attributes: Any) -> None:
+    """Add counts (and a finished BigQuery job's statistics) to the innermost open span; a no-op outside one"""
+    current = _CURRENT_SPAN.get()
+    if current is None:
+        return
+    current.add(rows, bytes, **attributes)
+    if job is not None:
+        current.add_job(job)
+
+
+@contextmanager
+def collect_spans() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the records of spans finished in this process inside the block (e.g. for benchmarks)"""
+    records: List[Dict[str, Any]] = []
+    _COLLECTORS.append(records)
+    try:
+        yield records
+    finally:
+        _COLLECTORS.remove(records)
+
+
+def _emit(span_record: Dict[str, Any]) -> None:
+    line = json.dumps(span_record, default=str)
+    print(line)
+
+    for records in list(_COLLECTORS):
+        records.append(span_record)
+
+    metrics_file = os.environ.get("PIPELINE_METRICS_FILE")
+    if metrics_file:
+        # One write per line in append mode, so lines from worker processes don't interleave
+        with _FILE_LOCK, open(metrics_file, "a") as f:
+            f.write(line + "\n")
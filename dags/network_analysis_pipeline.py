@@ -3,8 +3,10 @@ from datetime import datetime
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from citibike.config import load_env_config
+from citibike.database.table_cache import TableCache
 from citibike.dbt import run_dbt_command
 from citibike.networks.analysis import CommuterNetworkAnalyzer
+from citibike.networks.centrality import CentralityOptions
 
 def transform_edges_task(**context):
     # Load environment configuration
@@ -32,7 +34,11 @@ def analyze_network_task(**context):
 
     print("Analyzing commuter network")
 
-    analyzer = CommuterNetworkAnalyzer()
+    analyzer = CommuterNetworkAnalyzer(
+        centrality_options=CentralityOptions.from_env(),
+        table_cache=TableCache.from_env(),
+        capacity_column=os.environ.get("NETWORK_CAPACITY_COLUMN", "capacity"),
+    )
 
     print("Extracting network data from BQ")
     hubs_df, edges_df = analyzer.extract_network_data()
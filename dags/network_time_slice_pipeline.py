@@ -0,0 +1,97 @@
+import os
+from datetime import datetime
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from citibike.config import load_env_config
+from citibike.database.table_cache import TableCache
+from citibike.dbt import run_dbt_command
+from citibike.networks.centrality import CentralityOptions
+from citibike.networks.time_sliced import TimeSlicedNetworkAnalyzer
+
+def transform_edge_slices_task(**context):
+    # Load environment configuration
+    env_name = os.environ.get('CITIBIKE_ENV', 'dev')
+    load_env_config(env_name)
+
+    print("Calculating weekly, hourly edge slices of the commuter network")
+
+    edge_slices_dbt_command = "dbt run --select gold_commuter_edge_slices"
+    run_dbt_command(edge_slices_dbt_command.split())
+
+def analyze_network_slices_task(**context):
+    # Load environment configuration
+    env_name = os.environ.get('CITIBIKE_ENV', 'dev')
+    load_env_config(env_name)
+
+    params = context.get("params", {})
+    window_weeks = int(params.get("window_weeks", 4))
+    hour_slices = [tuple(int(hour) for hour in hours) for hours in params.get("hour_slices", [[7, 10], [16, 19]])]
+    min_trips = int(params.get("min_trips", 10))
+
+    print(f"Analyzing commuter network over sliding {window_weeks} week windows, hours {hour_slices}")
+
+    analyzer = TimeSlicedNetworkAnalyzer(
+        window_weeks=window_weeks,
+        hour_slices=hour_slices,
+        min_trips=min_trips,
+        centrality_options=CentralityOptions.from_env(),
+        table_cache=TableCache.from_env(),
+    )
+
+    print("Extracting edge slices from BQ")
+    stations_df, edge_slices_df = analyzer.extract_slice_data()
+
+    print(f"Loaded {len(stations_df)} stations and {len(edge_slices_df)} edge slices")
+
+    results_df = analyzer.run_sliced_analysis(stations_df, edge_slices_df)
+    if results_df.empty:
+        print("No slices to write")
+        return
+
+    print(f"Found {len(results_df)} critical or bottleneck nodes across all slices")
+    print(results_df.groupby(['slice_start_date', 'start_hour'])[['is_critical', 'is_bottleneck']].sum())
+
+    print("Writing slice analysis results to database")
+    table_name = "gold_network_slice_analysis"
+    analyzer.write_slice_results_to_bq(results_df, table_name)
+
+# Define the DAG
+
+# Default arguments for all tasks in this DAG
+default_args = {
+    "owner": "citibike-team",
+    "depends_on_past": False,
+    "start_date": datetime(2024, 1, 1),
+    "email_on_failure": False,  # Set to True and add email for notifications
+    "email_on_retry": False,
+    "retries": 0,  # don't retry failed task
+}
+
+dag = DAG(
+    "network_time_slice_pipeline",
+    default_args=default_args,
+    description="Analyze the commuter network over sliding weekly windows and hour-of-day ranges",
+    schedule_interval=None, # Manual trigger for now
+    catchup=False, # Don't run for past dates
+    tags=["citibike"],
+    params={
+        "window_weeks": 4,  # weeks in each analyzed window; windows slide by one week
+        "hour_slices": [[7, 10], [16, 19]],  # inclusive start_hour ranges analyzed in every window
+        "min_trips": 10,  # trips a station pair needs within a window to be an edge
+    }
+)
+
+# Define tasks
+task_transform_edge_slices = PythonOperator(
+    task_id="transform_edge_slices",
+    python_callable=transform_edge_slices_task,
+    dag=dag,
+)
+
+task_analyze_network_slices = PythonOperator(
+    task_id="analyze_network_slices",
+    python_callable=analyze_network_slices_task,
+    dag=dag
+)
+
+task_transform_edge_slices >> task_analyze_network_slices # pyright: ignore[reportUnusedExpression]
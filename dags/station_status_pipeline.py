@@ -0,0 +1,78 @@
+import os
+from datetime import datetime
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+
+from citibike.config import load_env_config
+from citibike.ingestion.station_status import poll_station_status
+from citibike.dbt import run_dbt_command
+
+def run_poll_station_status(**context):
+    """Task to poll GBFS station_status (and optionally free_bike_status) into the raw tables"""
+    # Load environment variables from config
+    env_name = os.environ.get("CITIBIKE_ENV", "dev")
+    load_env_config(env_name)
+
+    params = context.get("params", {})
+    duration_minutes = float(params.get("duration_minutes", 55))
+    flush_interval_minutes = float(params.get("flush_interval_minutes", 5))
+    include_free_bikes = bool(params.get("include_free_bikes", False))
+
+    print(f"Polling station status for {duration_minutes} minutes")
+    poll_station_status(
+        duration_minutes * 60,
+        flush_interval_seconds=flush_interval_minutes * 60,
+        include_free_bikes=include_free_bikes,
+    )
+
+def run_transform_availability():
+    """Task to rebuild the station availability model the network analysis can use for capacities"""
+    # Load environment variables from config
+    env_name = os.environ.get("CITIBIKE_ENV", "dev")
+    load_env_config(env_name)
+
+    print("Running gold_station_availability transformation")
+    run_dbt_command(["dbt", "run", "--select", "gold_station_availability"])
+
+# Define the DAG
+
+# Default arguments for all tasks in this DAG
+default_args = {
+    "owner": "citibike-team",
+    "depends_on_past": False,
+    "start_date": datetime(2024, 1, 1),
+    "email_on_failure": False,  # Set to True and add email for notifications
+    "email_on_retry": False,
+    "retries": 0,  # don't retry failed task
+}
+
+dag = DAG(
+    "station_status_pipeline",
+    default_args=default_args,
+    description="Poll GBFS station availability in real time, then rebuild the station availability model",
+    schedule_interval=None, # Manual trigger
+    catchup=False, # Don't run for past dates
+    max_active_runs=1, # overlapping pollers would load the same status changes twice
+    tags=["citibike"],
+    params={
+        "duration_minutes": 55,  # how long to keep polling
+        "flush_interval_minutes": 5,  # buffered status changes are loaded in one job per feed this often
+        "include_free_bikes": False,  # also poll free_bike_status
+    }
+)
+
+# Define tasks
+poll_status_task = PythonOperator(
+    task_id="poll_station_status",
+    python_callable=run_poll_station_status,
+    dag=dag,
+)
+
+transform_availability_task = PythonOperator(
+    task_id="transform_availability",
+    python_callable=run_transform_availability,
+    dag=dag,
+)
+
+# Define task dependencies
+poll_status_task >> transform_availability_task # pyright: ignore[reportUnusedExpression]
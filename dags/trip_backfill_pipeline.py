@@ -0,0 +1,124 @@
+import os
+from datetime import datetime
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+
+from citibike.config import load_env_config
+from citibike.ingestion.backfill import backfill_trip_data, month_range, transform_backfilled_months
+from citibike.ingestion.trips import TripIngestOptions
+from citibike.ingestion.stations import ingest_station_data
+from citibike.utils.date_helpers import now_nyc_datetime
+
+def extract_month_range(**context):
+    """Extract and validate the start and end month_keys from DAG config"""
+    params = context.get("params", {})
+    start_month_key = str(params.get("start_month", ""))
+    end_month_key = str(params.get("end_month", ""))
+
+    try:
+        months = month_range(start_month_key, end_month_key)
+    except ValueError as e:
+        raise ValueError(f"start_month and end_month must be YYYY-MM with start <= end, got {start_month_key!r} and {end_month_key!r}: {e}")
+
+    # Same bounds as trip_pipeline: from 2015 up to (not including) the current month
+    first_year, _ = months[0]
+    if first_year < 2015:
+        raise ValueError(f"Year must be 2015 or later, got {first_year}")
+    now = datetime.now()
+    if months[-1] >= (now.year, now.month):
+        raise ValueError(f"Cannot process current or future months, requested up to {end_month_key}")
+
+    prefetch_months = int(params.get("prefetch_months", 1))
+
+    # Store in XCom for other tasks to use
+    context["task_instance"].xcom_push(key="start_month_key", value=start_month_key)
+    context["task_instance"].xcom_push(key="end_month_key", value=end_month_key)
+    context["task_instance"].xcom_push(key="prefetch_months", value=prefetch_months)
+
+def run_ingest_station_data():
+    # Load environment variables from config
+    env_name = os.environ.get("CITIBIKE_ENV", "dev")
+    load_env_config(env_name)
+
+    print(f"Ingesting station data")
+    ingestion_date = now_nyc_datetime()
+    ingest_station_data(ingestion_date)
+
+def run_backfill_trip_data(**context):
+    """Task to ingest every month of trips in the range, skipping months already loaded"""
+    # Load environment variables from config
+    env_name = os.environ.get("CITIBIKE_ENV", "dev")
+    load_env_config(env_name)
+
+    start_month_key = context["task_instance"].xcom_pull(key="start_month_key")
+    end_month_key = context["task_instance"].xcom_pull(key="end_month_key")
+    prefetch_months = context["task_instance"].xcom_pull(key="prefetch_months")
+
+    print(f"Backfilling trips data from {start_month_key} to {end_month_key}")
+    backfill_trip_data(start_month_key, end_month_key, TripIngestOptions.from_env(), prefetch_months=prefetch_months)
+
+def run_transform_data(**context):
+    """Task to run dbt transformations once over all backfilled months"""
+    # Load environment variables from config
+    env_name = os.environ.get("CITIBIKE_ENV", "dev")
+    load_env_config(env_name)
+
+    start_month_key = context["task_instance"].xcom_pull(key="start_month_key")
+    end_month_key = context["task_instance"].xcom_pull(key="end_month_key")
+
+    transform_backfilled_months(start_month_key, end_month_key)
+
+# Define the DAG
+
+# Default arguments for all tasks in this DAG
+default_args = {
+    "owner": "citibike-team",
+    "depends_on_past": False,
+    "start_date": datetime(2024, 1, 1),
+    "email_on_failure": False,  # Set to True and add email for notifications
+    "email_on_retry": False,
+    "retries": 0,  # don't retry failed task; rerun the DAG and finished months are skipped
+}
+
+dag = DAG(
+    "trip_backfill_pipeline",
+    default_args=default_args,
+    description="Ingest raw stations once and trip data for a range of months, then run the silver and gold transformations once over all of them",
+    schedule_interval=None, # Manual trigger
+    catchup=False, # Don't run for past dates
+    tags=["citibike"],
+    params={
+        "start_month": "",  # YYYY-MM
+        "end_month": "",  # YYYY-MM, inclusive
+        "prefetch_months": 1,  # months downloaded ahead of the one being loaded
+    }
+)
+
+# Define tasks
+extract_params_task = PythonOperator(
+    task_id="extract_parameters",
+    python_callable=extract_month_range,
+    dag=dag,
+)
+
+ingest_stations_task = PythonOperator(
+    task_id="ingest_stations",
+    python_callable=run_ingest_station_data,
+    dag=dag,
+)
+
+backfill_trips_task = PythonOperator(
+    task_id="backfill_trips",
+    python_callable=run_backfill_trip_data,
+    dag=dag,
+)
+
+transform_data_task = PythonOperator(
+    task_id="transform_data",
+    python_callable=run_transform_data,
+    dag=dag,
+)
+
+# Define task dependencies
+extract_params_task >> [ingest_stations_task, backfill_trips_task] # pyright: ignore[reportUnusedExpression]
+[ingest_stations_task, backfill_trips_task] >> transform_data_task # pyright: ignore[reportUnusedExpression]
@@ -5,7 +5,7 @@ from airflow import DAG
 from airflow.operators.python import PythonOperator
 
 from citibike.config import load_env_config
-from citibike.ingestion.trips import ingest_trip_data
+from citibike.ingestion.trips import TripIngestOptions, ingest_trip_data
 from citibike.ingestion.stations import ingest_station_data
 from citibike.dbt import run_dbt_command
 from citibike.utils.date_helpers import now_nyc_datetime
@@ -60,7 +60,7 @@ def run_ingest_trip_data(**context):
     month_key = context["task_instance"].xcom_pull(key="month_key")
 
     print(f"Ingesting trips data for {month_key}")
-    ingest_trip_data(year, month)
+    ingest_trip_data(year, month, TripIngestOptions.from_env())
 
 def run_transform_data(**context):
     """Task to run dbt transformations through silver and gold layers"""
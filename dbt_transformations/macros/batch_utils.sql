@@ -0,0 +1,73 @@
+{#
+  Filter on the months being (re)processed, by their trip batch keys (YYYY-MM-N)
+
+  Uses the month_keys var (list of YYYY-MM, set by trip backfills) when present,
+  otherwise the single month_key var (set by trip_pipeline)
+
+  Args:
+    batch_key_col: Column holding the trip batch key
+
+  Returns:
+    Boolean SQL expression
+#}
+{% macro in_batch_months(batch_key_col='_batch_key') %}
+  {%- set month_keys = var('month_keys', none) -%}
+  {%- if month_keys -%}
+    SUBSTR({{ batch_key_col }}, 1, 7) IN ({% for month_key in month_keys %}'{{ month_key }}'{% if not loop.last %}, {% endif %}{% endfor %})
+  {%- else -%}
+    {{ batch_key_col }} LIKE '{{ var("month_key") }}%'
+  {%- endif -%}
+{% endmacro %}
+
+
+{#
+  Filter on the days trips of the months being (re)processed can start on: each
+  month (month_keys / month_key vars, as in in_batch_months) plus a day on either
+  side for trips filed in the neighbouring month
+
+  The bounds are constant dates, so BigQuery prunes the partitions of tables
+  partitioned on the date
+
+  Args:
+    date_col: Column or expression holding a date
+
+  Returns:
+    Boolean SQL expression
+#}
+{% macro in_batch_month_dates(date_col) %}
+  {%- set month_keys = var('month_keys', none) or [var('month_key')] -%}
+  ({% for month_key in month_keys %}
+    {%- set month_start = modules.datetime.date(month_key[:4] | int, month_key[5:7] | int, 1) -%}
+    {%- set next_month_start = (month_start + modules.datetime.timedelta(days=32)).replace(day=1) -%}
+    {{ date_col }} BETWEEN DATE '{{ month_start - modules.datetime.timedelta(days=1) }}' AND DATE '{{ next_month_start }}'
+    {%- if not loop.last %} OR {% endif %}
+  {%- endfor %})
+{% endmacro %}
+
+{#
+  Window of the ~90-day gold rollups: from the first day of the month two months
+  before the latest date in a daily summary table, to that latest date
+
+  The latest date is looked up when the model runs, so rollups filter the summary
+  on a constant date and BigQuery prunes its partitions
+
+  Args:
+    daily_relation: Relation (ref) of a daily summary table
+    date_col: Its date column
+
+  Returns:
+    Dict of SQL literals: start_date (DATE, NULL if the table is empty) and
+    actual_days (days from start_date to the latest date)
+#}
+{% macro rollup_window(daily_relation, date_col='date_key') %}
+  {%- set window = {'start_date': 'NULL', 'actual_days': 'NULL'} -%}
+  {%- if execute -%}
+    {%- set max_date = run_query('SELECT MAX(' ~ date_col ~ ') FROM ' ~ daily_relation).columns[0].values()[0] -%}
+    {%- if max_date is not none -%}
+      {%- set start_month_index = max_date.year * 12 + max_date.month - 1 - 2 -%}
+      {%- set start_date = modules.datetime.date(start_month_index // 12, start_month_index % 12 + 1, 1) -%}
+      {%- do window.update({'start_date': "DATE '" ~ start_date ~ "'", 'actual_days': (max_date - start_date).days}) -%}
+    {%- endif -%}
+  {%- endif -%}
+  {{ return(window) }}
+{% endmacro %}
@@ -9,9 +9,35 @@
   Current datetime in NYC time zone (right now)
 #}
 {% macro now_nyc_datetime() %}
+  {{ return(adapter.dispatch('now_nyc_datetime')()) }}
+{% endmacro %}
+
+{% macro default__now_nyc_datetime() %}
   CURRENT_DATETIME("America/New_York")
 {% endmacro %}
 
+{% macro duckdb__now_nyc_datetime() %}
+  (CURRENT_TIMESTAMP AT TIME ZONE 'America/New_York')
+{% endmacro %}
+
+{#
+  Timestamp column as a NYC datetime (no time zone)
+
+  Args:
+    timestamp_col: Column name containing a timestamp
+#}
+{% macro to_nyc_datetime(timestamp_col) %}
+  {{ return(adapter.dispatch('to_nyc_datetime')(timestamp_col)) }}
+{% endmacro %}
+
+{% macro default__to_nyc_datetime(timestamp_col) %}
+  DATETIME({{ timestamp_col }}, 'America/New_York')
+{% endmacro %}
+
+{% macro duckdb__to_nyc_datetime(timestamp_col) %}
+  ({{ timestamp_col }} AT TIME ZONE 'America/New_York')
+{% endmacro %}
+
 {#
   Season for the given datetime column (NYC seasons)
 
@@ -28,4 +54,190 @@
     WHEN EXTRACT(MONTH FROM {{ date_col }}) IN (6,7,8) THEN 'Summer'
     ELSE 'Fall'
   END
+{% endmacro %}
+
+{#
+  Day of week, 1 = Sunday through 7 = Saturday (BigQuery's DAYOFWEEK numbering
+  on every engine)
+
+  Args:
+    date_col: Column name containing a date or datetime
+#}
+{% macro day_of_week(date_col) %}
+  {{ return(adapter.dispatch('day_of_week')(date_col)) }}
+{% endmacro %}
+
+{% macro default__day_of_week(date_col) %}
+  EXTRACT(DAYOFWEEK FROM {{ date_col }})
+{% endmacro %}
+
+{% macro duckdb__day_of_week(date_col) %}
+  (EXTRACT(DAYOFWEEK FROM {{ date_col }}) + 1)
+{% endmacro %}
+
+{#
+  Week of the year, where weeks start on Sunday and the days before the first
+  Sunday are week 0 (BigQuery's WEEK numbering on every engine)
+
+  Args:
+    date_col: Column name containing a date
+#}
+{% macro week_of_year(date_col) %}
+  {{ return(adapter.dispatch('week_of_year')(date_col)) }}
+{% endmacro %}
+
+{% macro default__week_of_year(date_col) %}
+  EXTRACT(WEEK FROM {{ date_col }})
+{% endmacro %}
+
+{% macro duckdb__week_of_year(date_col) %}
+  CAST(strftime({{ date_col }}, '%U') AS INTEGER)
+{% endmacro %}
+
+{#
+  Date formatted with a strftime format string
+
+  Args:
+    format: Format string, e.g. '%B' for the month name
+    date_col: Column name containing a date
+#}
+{% macro format_date(format, date_col) %}
+  {{ return(adapter.dispatch('format_date')(format, date_col)) }}
+{% endmacro %}
+
+{% macro default__format_date(format, date_col) %}
+  FORMAT_DATE('{{ format }}', {{ date_col }})
+{% endmacro %}
+
+{% macro duckdb__format_date(format, date_col) %}
+  strftime({{ date_col }}, '{{ format }}')
+{% endmacro %}
+
+{#
+  First day of the month / of the week (weeks start on Monday) of a date
+
+  Args:
+    date_col: Column name containing a date
+#}
+{% macro month_start(date_col) %}
+  {{ return(adapter.dispatch('month_start')(date_col)) }}
+{% endmacro %}
+
+{% macro default__month_start(date_col) %}
+  DATE_TRUNC({{ date_col }}, MONTH)
+{% endmacro %}
+
+{% macro duckdb__month_start(date_col) %}
+  CAST(date_trunc('month', {{ date_col }}) AS DATE)
+{% endmacro %}
+
+{% macro week_start(date_col) %}
+  {{ return(adapter.dispatch('week_start')(date_col)) }}
+{% endmacro %}
+
+{% macro default__week_start(date_col) %}
+  DATE_TRUNC({{ date_col }}, WEEK(MONDAY))
+{% endmacro %}
+
+{% macro duckdb__week_start(date_col) %}
+  CAST(date_trunc('week', {{ date_col }}) AS DATE)
+{% endmacro %}
+
+{#
+  Date / timestamp minus a number of date parts
+
+  Args:
+    date_expr: Expression of type DATE (date_sub) or TIMESTAMP (timestamp_sub)
+    amount: Number of parts to subtract
+    date_part: DAY, WEEK or MONTH
+#}
+{% macro date_sub(date_expr, amount, date_part) %}
+  {{ return(adapter.dispatch('date_sub')(date_expr, amount, date_part)) }}
+{% endmacro %}
+
+{% macro default__date_sub(date_expr, amount, date_part) %}
+  DATE_SUB({{ date_expr }}, INTERVAL {{ amount }} {{ date_part }})
+{% endmacro %}
+
+{% macro duckdb__date_sub(date_expr, amount, date_part) %}
+  CAST({{ date_expr }} - INTERVAL ({{ amount }}) {{ date_part }} AS DATE)
+{% endmacro %}
+
+{% macro timestamp_sub(timestamp_expr, amount, date_part) %}
+  {{ return(adapter.dispatch('timestamp_sub')(timestamp_expr, amount, date_part)) }}
+{% endmacro %}
+
+{% macro default__timestamp_sub(timestamp_expr, amount, date_part) %}
+  TIMESTAMP_SUB({{ timestamp_expr }}, INTERVAL {{ amount }} {{ date_part }})
+{% endmacro %}
+
+{% macro duckdb__timestamp_sub(timestamp_expr, amount, date_part) %}
+  ({{ timestamp_expr }} - INTERVAL ({{ amount }}) {{ date_part }})
+{% endmacro %}
+
+{#
+  Number of date part boundaries between two dates / datetimes / timestamps
+  (end minus start)
+
+  Args:
+    end_expr: Later date / datetime
+    start_expr: Earlier date / datetime
+    date_part: DAY or SECOND
+#}
+{% macro date_diff(end_expr, start_expr, date_part) %}
+  {{ return(adapter.dispatch('date_diff')(end_expr, start_expr, date_part)) }}
+{% endmacro %}
+
+{% macro default__date_diff(end_expr, start_expr, date_part) %}
+  DATE_DIFF({{ end_expr }}, {{ start_expr }}, {{ date_part }})
+{% endmacro %}
+
+{% macro duckdb__date_diff(end_expr, start_expr, date_part) %}
+  date_diff('{{ date_part | lower }}', {{ start_expr }}, {{ end_expr }})
+{% endmacro %}
+
+{% macro datetime_diff(end_expr, start_expr, date_part) %}
+  {{ return(adapter.dispatch('datetime_diff')(end_expr, start_expr, date_part)) }}
+{% endmacro %}
+
+{% macro default__datetime_diff(end_expr, start_expr, date_part) %}
+  DATETIME_DIFF({{ end_expr }}, {{ start_expr }}, {{ date_part }})
+{% endmacro %}
+
+{% macro duckdb__datetime_diff(end_expr, start_expr, date_part) %}
+  {{ duckdb__date_diff(end_expr, start_expr, date_part) }}
+{% endmacro %}
+
+{% macro timestamp_diff(end_expr, start_expr, date_part) %}
+  {{ return(adapter.dispatch('timestamp_diff')(end_expr, start_expr, date_part)) }}
+{% endmacro %}
+
+{% macro default__timestamp_diff(end_expr, start_expr, date_part) %}
+  TIMESTAMP_DIFF({{ end_expr }}, {{ start_expr }}, {{ date_part }})
+{% endmacro %}
+
+{% macro duckdb__timestamp_diff(end_expr, start_expr, date_part) %}
+  {{ duckdb__date_diff(end_expr, start_expr, date_part) }}
+{% endmacro %}
+
+{#
+  One row per day from start_date to end_date (both inclusive), as a subquery
+
+  Args:
+    start_date: First date, as a YYYY-MM-DD string
+    end_date: Last date, as a YYYY-MM-DD string
+    column_name: Name of the date column
+#}
+{% macro date_spine(start_date, end_date, column_name='date_key') %}
+  {{ return(adapter.dispatch('date_spine')(start_date, end_date, column_name)) }}
+{% endmacro %}
+
+{% macro default__date_spine(start_date, end_date, column_name) %}
+  SELECT {{ column_name }}
+  FROM UNNEST(GENERATE_DATE_ARRAY('{{ start_date }}', '{{ end_date }}')) AS {{ column_name }}
+{% endmacro %}
+
+{% macro duckdb__date_spine(start_date, end_date, column_name) %}
+  SELECT CAST(range AS DATE) AS {{ column_name }}
+  FROM range(DATE '{{ start_date }}', DATE '{{ end_date }}' + INTERVAL 1 DAY, INTERVAL 1 DAY)
 {% endmacro %}
\ No newline at end of file
@@ -12,4 +12,73 @@
 {% macro is_geographic_outlier(lat_col, lng_col) %}
   {{ lat_col }} < 40.4 OR {{ lat_col }} > 41.0 OR 
   {{ lng_col }} < -74.3 OR {{ lng_col }} > -73.7
+{% endmacro %}
+
+{#
+  Whether a point lies within a polygon (e.g. a borough boundary)
+
+  The DuckDB implementations use the spatial extension, loaded by the local target
+
+  Args:
+    lng_col: Column name containing longitude values
+    lat_col: Column name containing latitude values
+    polygon_col: Column name containing a polygon built by geography_from_geojson
+
+  Returns:
+    Boolean
+#}
+{% macro point_within(lng_col, lat_col, polygon_col) %}
+  {{ return(adapter.dispatch('point_within')(lng_col, lat_col, polygon_col)) }}
+{% endmacro %}
+
+{% macro default__point_within(lng_col, lat_col, polygon_col) %}
+  ST_WITHIN(ST_GEOGPOINT({{ lng_col }}, {{ lat_col }}), {{ polygon_col }})
+{% endmacro %}
+
+{% macro duckdb__point_within(lng_col, lat_col, polygon_col) %}
+  ST_Within(ST_Point({{ lng_col }}, {{ lat_col }}), {{ polygon_col }})
+{% endmacro %}
+
+{#
+  Great-circle distance in meters between two points
+
+  Args:
+    start_lng_col, start_lat_col: Columns of the first point
+    end_lng_col, end_lat_col: Columns of the second point
+
+  Returns:
+    Float - distance in meters
+#}
+{% macro distance_meters(start_lng_col, start_lat_col, end_lng_col, end_lat_col) %}
+  {{ return(adapter.dispatch('distance_meters')(start_lng_col, start_lat_col, end_lng_col, end_lat_col)) }}
+{% endmacro %}
+
+{% macro default__distance_meters(start_lng_col, start_lat_col, end_lng_col, end_lat_col) %}
+  ST_DISTANCE(ST_GEOGPOINT({{ start_lng_col }}, {{ start_lat_col }}), ST_GEOGPOINT({{ end_lng_col }}, {{ end_lat_col }}))
+{% endmacro %}
+
+{% macro duckdb__distance_meters(start_lng_col, start_lat_col, end_lng_col, end_lat_col) %}
+  {#- ST_Distance_Sphere takes its points in latitude, longitude order -#}
+  ST_Distance_Sphere(ST_Point({{ start_lat_col }}, {{ start_lng_col }}), ST_Point({{ end_lat_col }}, {{ end_lng_col }}))
+{% endmacro %}
+
+{#
+  Polygon from the geometry of a GeoJSON feature stored as a string
+
+  Args:
+    feature_col: Column name containing a GeoJSON feature
+
+  Returns:
+    GEOGRAPHY (BigQuery) / GEOMETRY (DuckDB)
+#}
+{% macro geography_from_geojson(feature_col) %}
+  {{ return(adapter.dispatch('geography_from_geojson')(feature_col)) }}
+{% endmacro %}
+
+{% macro default__geography_from_geojson(feature_col) %}
+  ST_GEOGFROMGEOJSON(JSON_EXTRACT({{ feature_col }}, '$.geometry'))
+{% endmacro %}
+
+{% macro duckdb__geography_from_geojson(feature_col) %}
+  ST_GeomFromGeoJSON(json_extract({{ feature_col }}, '$.geometry'))
 {% endmacro %}
\ No newline at end of file
@@ -1,7 +1,29 @@
+{#
+  Give decimal station ids exactly two decimals ('6865.3' -> '6865.30'), so ids from
+  trips match silver_stations short names
+
+  Trip ingestion applies the same normalization (citibike.ingestion.station_ids), so
+  this is a no-op for trips loaded since; it stays for the ones loaded before
+
+  Args:
+    station_id_field: Column name containing a station id
+#}
 {% macro normalize_station_id(station_id_field) %}
+  {{ return(adapter.dispatch('normalize_station_id')(station_id_field)) }}
+{% endmacro %}
+
+{% macro default__normalize_station_id(station_id_field) %}
   CASE 
     WHEN REGEXP_CONTAINS({{ station_id_field }}, r'^\d+\.\d+$')
     THEN FORMAT("%.2f", CAST({{ station_id_field }} AS FLOAT64))
     ELSE {{ station_id_field }}
   END
+{% endmacro %}
+
+{% macro duckdb__normalize_station_id(station_id_field) %}
+  CASE
+    WHEN regexp_matches({{ station_id_field }}, '^\d+\.\d+$')
+    THEN printf('%.2f', CAST({{ station_id_field }} AS DOUBLE))
+    ELSE {{ station_id_field }}
+  END
 {% endmacro %}
\ No newline at end of file
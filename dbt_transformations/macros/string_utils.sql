@@ -0,0 +1,47 @@
+{#
+  Scalar value at a JSON path of a JSON string, as a string
+
+  Args:
+    json_col: Column name containing a JSON string
+    json_path: JSONPath, e.g. '$.name'
+#}
+{% macro json_value(json_col, json_path) %}
+  {{ return(adapter.dispatch('json_value')(json_col, json_path)) }}
+{% endmacro %}
+
+{% macro default__json_value(json_col, json_path) %}
+  JSON_VALUE({{ json_col }}, '{{ json_path }}')
+{% endmacro %}
+
+{% macro duckdb__json_value(json_col, json_path) %}
+  json_extract_string({{ json_col }}, '{{ json_path }}')
+{% endmacro %}
+
+{#
+  MD5 hash of a string, as lowercase hex
+
+  Args:
+    string_expr: String expression to hash
+#}
+{% macro md5_hex(string_expr) %}
+  {{ return(adapter.dispatch('md5_hex')(string_expr)) }}
+{% endmacro %}
+
+{% macro default__md5_hex(string_expr) %}
+  TO_HEX(MD5({{ string_expr }}))
+{% endmacro %}
+
+{% macro duckdb__md5_hex(string_expr) %}
+  md5({{ string_expr }})
+{% endmacro %}
+
+{#
+  64-bit float type name, for CASTs (FLOAT in DuckDB is 32 bits)
+#}
+{% macro type_float64() %}
+  {{ return(adapter.dispatch('type_float64')()) }}
+{% endmacro %}
+
+{% macro default__type_float64() %}FLOAT64{% endmacro %}
+
+{% macro duckdb__type_float64() %}DOUBLE{% endmacro %}
\ No newline at end of file
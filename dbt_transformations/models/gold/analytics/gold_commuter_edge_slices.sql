@@ -0,0 +1,44 @@
+{{ config(
+    materialized='table',
+    partition_by={
+        'field': 'week_start',
+        'data_type': 'date',
+        'granularity': 'day'
+    } if target.type == 'bigquery' else none,
+    cluster_by=['start_hour', 'start_station_id'],
+    description='Weekday station-to-station trips per week and hour of day, for time-sliced network analysis'
+) }}
+
+{#
+  Finest grain the time-sliced network analysis reads: it sums these rows into
+  windows of weeks and ranges of hours. total_duration is kept (not the average)
+  so slices can be added and subtracted.
+#}
+
+WITH latest_data_date AS (
+    SELECT MAX(DATE(started_at)) as max_date
+    FROM {{ ref('silver_trips') }}
+),
+
+date_range AS (
+    SELECT
+        max_date,
+        {{ date_sub(week_start('max_date'), var('edge_slice_weeks', 26), 'WEEK') }} as start_date
+    FROM latest_data_date
+)
+
+SELECT
+    {{ week_start('DATE(started_at)') }} AS week_start,
+    start_hour,
+    start_station_id,
+    end_station_id,
+    COUNT(*) AS num_trips,
+    SUM(trip_duration_seconds) AS total_duration
+FROM {{ ref('silver_trips') }}
+WHERE DATE(started_at) >= (SELECT start_date from date_range)
+    AND NOT is_round_trip -- no self loops
+    AND NOT is_weekend
+    AND NOT is_temporal_outlier
+    AND NOT is_data_integrity_issue
+    AND NOT is_geography_quality_issue
+GROUP BY week_start, start_hour, start_station_id, end_station_id
@@ -3,33 +3,16 @@
     description='Distinct station-to-station pairs during commuting times in last 90 days'
 ) }}
 
-WITH latest_data_date AS (
-    SELECT MAX(DATE(started_at)) as max_date
-    FROM {{ ref('silver_trips') }}
-),
-
-date_range AS (
-    SELECT 
-        max_date,
-        DATE_SUB(DATE_TRUNC(max_date, MONTH), INTERVAL 2 MONTH) as start_date
-    FROM latest_data_date
-),
+{%- set window = rollup_window(ref('gold_commuter_edges_daily')) %}
 
-commuter_edges AS (
+WITH commuter_edges AS (
     SELECT
         start_station_id,
         end_station_id,
-        COUNT(*) AS num_trips,
-        AVG(trip_duration_seconds) AS avg_duration
-    FROM {{ ref('silver_trips') }}
-    WHERE DATE(started_at) >= (SELECT start_date from date_range)
-        AND NOT is_round_trip -- no self loops
-        AND start_hour >= 7
-        AND start_hour <= 10
-        AND NOT is_weekend
-        AND NOT is_temporal_outlier
-        AND NOT is_data_integrity_issue
-        AND NOT is_geography_quality_issue
+        SUM(num_trips) AS num_trips,
+        SUM(total_duration) / NULLIF(SUM(num_durations), 0) AS avg_duration
+    FROM {{ ref('gold_commuter_edges_daily') }}
+    WHERE date_key >= {{ window.start_date }}
     GROUP BY start_station_id, end_station_id
 ),
 
@@ -46,7 +29,7 @@ SELECT
     s_end.lat AS end_lat,
     s_end.lon AS end_lon,
     e.num_trips,
-    ST_DISTANCE(ST_GEOGPOINT(s_start.lon, s_start.lat), ST_GEOGPOINT(s_end.lon, s_end.lat)) AS distance_meters,
+    {{ distance_meters('s_start.lon', 's_start.lat', 's_end.lon', 's_end.lat') }} AS distance_meters,
     e.avg_duration
 FROM commuter_edges e
 LEFT JOIN
@@ -0,0 +1,39 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='insert_overwrite' if target.type == 'bigquery' else 'delete+insert',
+    unique_key='date_key',
+    partition_by={
+        'field': 'date_key',
+        'data_type': 'date',
+        'granularity': 'day'
+    } if target.type == 'bigquery' else none,
+    cluster_by=['start_station_id', 'end_station_id'],
+    description='Weekday morning commute (7-10am) trips per day and station pair; gold_commuter_edges sums its last ~90 days'
+) }}
+
+{#
+  Incremental runs rebuild whole days: every day the processed months' trips can
+  start on (in_batch_month_dates) is recomputed from all of its trips in
+  silver_trips and replaces that day's rows. total_duration and num_durations are
+  kept (not the average) so days add up to the average over any range.
+#}
+
+SELECT
+    DATE(started_at) AS date_key,
+    start_station_id,
+    end_station_id,
+    COUNT(*) AS num_trips,
+    SUM(trip_duration_seconds) AS total_duration,
+    COUNT(trip_duration_seconds) AS num_durations
+FROM {{ ref('silver_trips') }}
+WHERE NOT is_round_trip -- no self loops
+    AND start_hour >= 7
+    AND start_hour <= 10
+    AND NOT is_weekend
+    AND NOT is_temporal_outlier
+    AND NOT is_data_integrity_issue
+    AND NOT is_geography_quality_issue
+    {% if is_incremental() %}
+    AND {{ in_batch_month_dates('DATE(started_at)') }}
+    {% endif %}
+GROUP BY date_key, start_station_id, end_station_id
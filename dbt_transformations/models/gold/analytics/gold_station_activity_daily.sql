@@ -0,0 +1,69 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='insert_overwrite' if target.type == 'bigquery' else 'delete+insert',
+    unique_key='date_key',
+    partition_by={
+        'field': 'date_key',
+        'data_type': 'date',
+        'granularity': 'day'
+    } if target.type == 'bigquery' else none,
+    cluster_by=['station_id'],
+    description='Trips started and ended and rush hour bike balances per day and station; gold_station_performance_dashboard rolls up its last ~90 days'
+) }}
+
+{#
+  Incremental runs rebuild whole days, as in gold_commuter_edges_daily. The bike
+  balance columns are the lowest / highest running bike balance of the station
+  after a trip started there in the morning (7-10am) and evening (5-8pm) rush,
+  NULL if no trip started then; they are NULL on days the station had no starts.
+#}
+
+WITH recent_trips AS (
+    SELECT *
+    FROM {{ ref('gold_fact_trips') }}
+    WHERE NOT is_data_integrity_issue
+        AND NOT is_geography_quality_issue
+        AND NOT is_temporal_outlier
+        AND NOT is_duplicate_ride
+        {% if is_incremental() %}
+        AND {{ in_batch_month_dates('date_key') }}
+        {% endif %}
+),
+
+station_starts AS (
+    SELECT
+        date_key,
+        start_station_id AS station_id,
+        COUNT(*) AS starts,
+        MIN(CASE WHEN start_hour BETWEEN 7 AND 10 THEN start_station_running_bike_balance END) AS morning_min_bike_balance,
+        MAX(CASE WHEN start_hour BETWEEN 7 AND 10 THEN start_station_running_bike_balance END) AS morning_max_bike_balance,
+        MIN(CASE WHEN start_hour BETWEEN 17 AND 20 THEN start_station_running_bike_balance END) AS evening_min_bike_balance,
+        MAX(CASE WHEN start_hour BETWEEN 17 AND 20 THEN start_station_running_bike_balance END) AS evening_max_bike_balance
+    FROM recent_trips
+    WHERE start_station_id IS NOT NULL
+    GROUP BY date_key, start_station_id
+),
+
+station_ends AS (
+    SELECT
+        date_key,
+        end_station_id AS station_id,
+        COUNT(*) AS ends
+    FROM recent_trips
+    WHERE end_station_id IS NOT NULL
+    GROUP BY date_key, end_station_id
+)
+
+SELECT
+    COALESCE(s.date_key, e.date_key) AS date_key,
+    COALESCE(s.station_id, e.station_id) AS station_id,
+    COALESCE(s.starts, 0) AS starts,
+    COALESCE(e.ends, 0) AS ends,
+    s.morning_min_bike_balance,
+    s.morning_max_bike_balance,
+    s.evening_min_bike_balance,
+    s.evening_max_bike_balance
+FROM station_starts s
+FULL OUTER JOIN station_ends e
+ON s.date_key = e.date_key
+    AND s.station_id = e.station_id
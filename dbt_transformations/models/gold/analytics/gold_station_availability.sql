@@ -0,0 +1,72 @@
+{{ config(
+    materialized='table',
+    description='Bikes and docks actually available at each station during weekday morning commutes (7-10am), over the last 90 days of station_status history'
+) }}
+
+{#
+  raw_station_status only gets a row when a station's status changes, so each
+  row is weighted by how long it held: until the station's next report, capped
+  at an hour so a gap in polling doesn't count as a long steady state. The hold
+  is measured over every report, in service or not, before out-of-service rows
+  are dropped, so time out of service isn't credited to the state before it.
+  effective_capacity (bikes + docks usable at once) is what the network flow
+  analysis can use in place of the static GBFS capacity.
+#}
+
+WITH latest_status AS (
+    SELECT MAX(last_reported) AS max_reported
+    FROM {{ source('raw', 'raw_station_status') }}
+),
+
+status_intervals AS (
+    SELECT
+        station_id,
+        {{ to_nyc_datetime('last_reported') }} AS reported_at,
+        num_bikes_available,
+        num_docks_available,
+        is_installed,
+        is_renting,
+        is_returning,
+        LEAST(
+            {{ timestamp_diff(
+                'LEAD(last_reported) OVER (PARTITION BY station_id ORDER BY last_reported)',
+                'last_reported',
+                'SECOND'
+            ) }},
+            3600
+        ) AS held_seconds
+    FROM {{ source('raw', 'raw_station_status') }}
+    WHERE last_reported >= {{ timestamp_sub('(SELECT max_reported FROM latest_status)', 90, 'DAY') }}
+),
+
+commute_intervals AS (
+    SELECT *
+    FROM status_intervals
+    WHERE held_seconds > 0
+        AND is_installed
+        AND is_renting
+        AND is_returning
+        AND EXTRACT(HOUR FROM reported_at) BETWEEN 7 AND 10
+        AND {{ day_of_week('reported_at') }} NOT IN (1, 7)
+),
+
+station_availability AS (
+    SELECT
+        station_id,
+        SUM(num_bikes_available * held_seconds) / SUM(held_seconds) AS avg_bikes_available,
+        SUM(num_docks_available * held_seconds) / SUM(held_seconds) AS avg_docks_available,
+        SUM(held_seconds) AS observed_seconds
+    FROM commute_intervals
+    GROUP BY station_id
+)
+
+SELECT
+    s.short_name AS station_id,
+    a.avg_bikes_available,
+    a.avg_docks_available,
+    CAST(ROUND(a.avg_bikes_available + a.avg_docks_available) AS INT64) AS effective_capacity,
+    a.observed_seconds
+FROM station_availability a
+JOIN {{ ref('silver_stations') }} s
+ON a.station_id = s.station_id
+WHERE s.short_name IS NOT NULL
@@ -4,53 +4,12 @@
     description='Station performance metrics for Network Optimization Team dashboard'
 ) }}
 
-WITH latest_data_date AS (
-    SELECT MAX(DATE(started_at)) AS max_date
-    FROM {{ ref('gold_fact_trips') }}
-),
-
-data_start_date AS (
-    SELECT
-        max_date,
-        DATE_SUB(DATE_TRUNC(max_date, MONTH), INTERVAL 2 MONTH) AS start_date
-    FROM
-        latest_data_date
-),
+{%- set window = rollup_window(ref('gold_station_activity_daily')) %}
 
-date_range AS (
-    SELECT
-        max_date,
-        start_date, 
-        DATE_DIFF(max_date, start_date, DAY) AS actual_days
-    FROM data_start_date
-),
-
-recent_trips AS (
-    SELECT * 
-    FROM {{ ref('gold_fact_trips') }}
-    WHERE date_key >= (SELECT start_date FROM date_range)
-        AND NOT is_data_integrity_issue
-        AND NOT is_geography_quality_issue
-        AND NOT is_temporal_outlier
-        AND NOT is_duplicate_ride
-),
-
-station_activity AS (
-    SELECT 
-        start_station_id AS station_id, 
-        COUNT(*) AS starts, 
-        0 AS ends,
-    FROM recent_trips
-    GROUP BY 1
-    
-    UNION ALL
-    
-    SELECT 
-        end_station_id AS station_id, 
-        0 AS starts, 
-        COUNT(*) AS ends,
-    FROM recent_trips
-    GROUP BY 1
+WITH station_activity AS (
+    SELECT *
+    FROM {{ ref('gold_station_activity_daily') }}
+    WHERE date_key >= {{ window.start_date }}
 ),
 
 aggregated_activity AS (
@@ -65,33 +24,19 @@ aggregated_activity AS (
 ),
 
 daily_rush_hour_patterns AS (
+    -- Weekdays the station had trips start; no start in a rush counts as a balance of 0
     SELECT 
-        rt.start_station_id AS station_id,
-        rt.date_key,
-        dd.day_of_week,
-        -- Morning rush daily min/max per station
-        COALESCE(
-            MIN(CASE WHEN rt.start_hour BETWEEN 7 AND 10 THEN rt.start_station_running_bike_balance END),
-            0
-         ) AS daily_morning_min,
-        COALESCE(
-            MAX(CASE WHEN rt.start_hour BETWEEN 7 AND 10 THEN rt.start_station_running_bike_balance END),
-            0
-        ) AS daily_morning_max,
-        -- Evening rush daily min/max per station  
-        COALESCE(
-            MIN(CASE WHEN rt.start_hour BETWEEN 17 AND 20 THEN rt.start_station_running_bike_balance END),
-            0
-        ) AS daily_evening_min,
-        COALESCE(
-            MAX(CASE WHEN rt.start_hour BETWEEN 17 AND 20 THEN rt.start_station_running_bike_balance END),
-            0
-        ) AS daily_evening_max
-    FROM recent_trips rt
+        sa.station_id,
+        sa.date_key,
+        COALESCE(sa.morning_min_bike_balance, 0) AS daily_morning_min,
+        COALESCE(sa.morning_max_bike_balance, 0) AS daily_morning_max,
+        COALESCE(sa.evening_min_bike_balance, 0) AS daily_evening_min,
+        COALESCE(sa.evening_max_bike_balance, 0) AS daily_evening_max
+    FROM station_activity sa
     JOIN {{ ref('gold_dim_dates') }} dd 
-    ON rt.date_key = dd.date_key
+    ON sa.date_key = dd.date_key
     WHERE NOT dd.is_weekend
-    GROUP BY rt.start_station_id, rt.date_key, dd.day_of_week
+        AND sa.starts > 0
 ),
 
 station_rush_hour_metrics AS (
@@ -106,7 +51,6 @@ station_rush_hour_metrics AS (
         AVG(daily_morning_max - daily_morning_min) AS avg_morning_daily_swing,
         AVG(daily_evening_max - daily_evening_min) AS avg_evening_daily_swing
     FROM daily_rush_hour_patterns
-    WHERE daily_morning_min IS NOT NULL OR daily_evening_min IS NOT NULL
     GROUP BY station_id
 )
 
@@ -127,13 +71,13 @@ SELECT
     
     -- Performance metrics
     CASE 
-        WHEN (SELECT actual_days FROM date_range) > 0 
-        THEN ROUND(COALESCE(aa.total_activity, 0) / (SELECT actual_days FROM date_range), 1)
+        WHEN {{ window.actual_days }} > 0 
+        THEN ROUND(COALESCE(aa.total_activity, 0) / {{ window.actual_days }}, 1)
         ELSE NULL 
     END AS avg_daily_activity,
     CASE 
-        WHEN ds.capacity > 0 AND (SELECT actual_days FROM date_range) > 0
-        THEN ROUND(COALESCE(aa.total_activity, 0) / ((SELECT actual_days FROM date_range) * ds.capacity), 2)
+        WHEN ds.capacity > 0 AND {{ window.actual_days }} > 0
+        THEN ROUND(COALESCE(aa.total_activity, 0) / ({{ window.actual_days }} * ds.capacity), 2)
         ELSE NULL 
     END AS activity_per_dock_per_day,
     
@@ -31,7 +31,7 @@ WITH reconstructed_stations AS (
         tm.avg_daily_activity,
         tm.net_flow,
         tm.imbalance_ratio,
-        CAST(NULL AS FLOAT64) AS activity_per_dock_per_day
+        CAST(NULL AS {{ type_float64() }}) AS activity_per_dock_per_day
     FROM {{ ref('stg_reconstructed_station_metadata') }} r
     LEFT JOIN {{ ref('stg_combined_trip_metrics') }} tm 
         ON r.station_id = tm.station_id
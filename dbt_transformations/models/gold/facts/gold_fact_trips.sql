@@ -4,7 +4,7 @@
     partition_by={
         "field": "date_key",
         "data_type": "date"
-    },
+    } if target.type == 'bigquery' else none,
     cluster_by=['start_station_id']
 ) }}
 
@@ -44,7 +44,7 @@ WITH trip_base AS (
         is_round_trip,
         CASE
             WHEN is_geography_quality_issue = true THEN NULL
-            ELSE ST_DISTANCE(ST_GEOGPOINT(start_lng, start_lat), ST_GEOGPOINT(end_lng, end_lat))
+            ELSE {{ distance_meters('start_lng', 'start_lat', 'end_lng', 'end_lat') }}
         END AS distance_meters,
 
         CASE WHEN
@@ -61,7 +61,7 @@ WITH trip_base AS (
 
         FROM {{ ref('silver_trips') }}
         {% if is_incremental() %}
-            WHERE _batch_key LIKE '{{ var("month_key") }}%'
+            WHERE {{ in_batch_months('_batch_key') }}
         {% endif %}
 ),
 
@@ -3,15 +3,18 @@
     cluster_by=['borough_code']
 ) }}
 
+-- raw_nyc_borough_boundaries holds one row per borough, replaced when a boundary
+-- changes; tables loaded before that may still hold one row per borough per run
 SELECT
     borough_code,
     borough_name,
-    ST_GEOGFROMGEOJSON(JSON_EXTRACT(feature_geojson, '$.geometry')) AS boundary_polygon,
+    {{ geography_from_geojson('feature_geojson') }} AS boundary_polygon,
+    min_lng,
+    min_lat,
+    max_lng,
+    max_lat,
     _ingested_at
 FROM
     {{ source('raw', 'raw_nyc_borough_boundaries' )}}
-WHERE
-    _ingested_at = (
-        SELECT MAX(_ingested_at)
-        FROM {{ source('raw', 'raw_nyc_borough_boundaries' )}}
-    )
+QUALIFY
+    ROW_NUMBER() OVER (PARTITION BY borough_code ORDER BY _ingested_at DESC) = 1
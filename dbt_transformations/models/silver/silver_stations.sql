@@ -3,17 +3,17 @@
 WITH parsed_stations AS (
     SELECT
         station_id,
-        JSON_VALUE(station_data, '$.name') AS name,
-        JSON_VALUE(station_data, '$.short_name') AS short_name,
-        JSON_VALUE(station_data, '$.region_id') AS region_id,
-        CAST(JSON_VALUE(station_data, '$.lat') AS FLOAT64) AS lat,
-        CAST(JSON_VALUE(station_data, '$.lon') AS FLOAT64) AS lon,
-        JSON_VALUE(station_data, '$.external_id') AS external_id,
-        CAST(JSON_VALUE(station_data, '$.has_kiosk') AS BOOL) AS has_kiosk,
-        CAST(JSON_VALUE(station_data, '$.eightd_has_key_dispenser') AS BOOL) AS eightd_has_key_dispenser,
-        CAST(JSON_VALUE(station_data, '$.electric_bike_surcharge_waiver') AS BOOL) AS electric_bike_surcharge_waiver,
-        CAST(JSON_VALUE(station_data, '$.capacity') AS INT64) AS capacity,
-        JSON_VALUE(station_data, '$.station_type') AS station_type,
+        {{ json_value('station_data', '$.name') }} AS name,
+        {{ json_value('station_data', '$.short_name') }} AS short_name,
+        {{ json_value('station_data', '$.region_id') }} AS region_id,
+        CAST({{ json_value('station_data', '$.lat') }} AS {{ type_float64() }}) AS lat,
+        CAST({{ json_value('station_data', '$.lon') }} AS {{ type_float64() }}) AS lon,
+        {{ json_value('station_data', '$.external_id') }} AS external_id,
+        CAST({{ json_value('station_data', '$.has_kiosk') }} AS BOOL) AS has_kiosk,
+        CAST({{ json_value('station_data', '$.eightd_has_key_dispenser') }} AS BOOL) AS eightd_has_key_dispenser,
+        CAST({{ json_value('station_data', '$.electric_bike_surcharge_waiver') }} AS BOOL) AS electric_bike_surcharge_waiver,
+        CAST({{ json_value('station_data', '$.capacity') }} AS INT64) AS capacity,
+        {{ json_value('station_data', '$.station_type') }} AS station_type,
         station_data,
         api_last_updated,
         api_version,
@@ -62,9 +62,11 @@ deduplicated_stations AS (
     ) = 1
 ),
 
-max_ingestion_time AS (
-    SELECT MAX(_ingested_at) as max_ingested_at
-    FROM latest_stations
+-- Stations in the latest GBFS feed. Station ingestion can write only changed
+-- stations, so the latest _ingested_at no longer marks the active ones
+current_feed_stations AS (
+    SELECT station_id
+    FROM {{ source('raw', 'raw_station_fingerprints') }}
 ),
 
 stations_with_boroughs AS (
@@ -77,13 +79,16 @@ stations_with_boroughs AS (
                 ELSE 'Unknown' END
             )
         ) AS borough,
-        l._ingested_at = (SELECT max_ingested_at FROM max_ingestion_time) AS is_active,
+        l.station_id IN (SELECT station_id FROM current_feed_stations) AS is_active,
     FROM
         deduplicated_stations l
     LEFT JOIN
         {{ ref('silver_nyc_borough_boundaries') }} bb
     ON
-        ST_WITHIN(ST_GEOGPOINT(l.lon, l.lat), bb.boundary_polygon)
+        -- bounding boxes first, so the polygon test only runs for the boroughs around a station
+        l.lon BETWEEN bb.min_lng AND bb.max_lng
+        AND l.lat BETWEEN bb.min_lat AND bb.max_lat
+        AND {{ point_within('l.lon', 'l.lat', 'bb.boundary_polygon') }}
 ),
 
 stations_with_data_quality_flags AS (
@@ -5,7 +5,7 @@
         'field': 'started_at',
         'data_type': 'datetime',
         'granularity': 'day'
-    },
+    } if target.type == 'bigquery' else none,
     cluster_by=['start_station_id', 'started_at']
 ) }}
 
@@ -23,6 +23,12 @@ WITH unified_base AS (
         start_lng,
         end_lat,
         end_lng,
+        start_point_borough,
+        end_point_borough,
+        ingest_temporal_outlier,
+        ingest_geography_quality_issue,
+        ingest_data_integrity_issue,
+        ingest_duplicate_ride,
         member_casual,
         gender,
         bike_id,
@@ -35,7 +41,7 @@ WITH unified_base AS (
         _batch_key
     FROM {{ ref('stg_trips_legacy') }}
     {% if is_incremental() %}
-    WHERE _batch_key LIKE '{{ var("month_key") }}%'
+    WHERE {{ in_batch_months('_batch_key') }}
     {% endif %}
 
     UNION ALL
@@ -53,6 +59,12 @@ WITH unified_base AS (
         start_lng,
         end_lat,
         end_lng,
+        start_point_borough,
+        end_point_borough,
+        ingest_temporal_outlier,
+        ingest_geography_quality_issue,
+        ingest_data_integrity_issue,
+        ingest_duplicate_ride,
         member_casual,
         gender,
         bike_id,
@@ -65,7 +77,7 @@ WITH unified_base AS (
         _batch_key
     FROM {{ ref('stg_trips_current') }}
     {% if is_incremental() %}
-    WHERE _batch_key LIKE '{{ var("month_key") }}%'
+    WHERE {{ in_batch_months('_batch_key') }}
     {% endif %}
 ),
 
@@ -75,12 +87,12 @@ trips_enriched AS (
 
         -- Temporal enrichments
         EXTRACT(HOUR FROM started_at) as start_hour,
-        EXTRACT(DAYOFWEEK FROM started_at) as start_day_of_week,
+        {{ day_of_week('started_at') }} as start_day_of_week,
         EXTRACT(MONTH FROM started_at) as start_month,
         {{ derive_season('started_at') }} as start_season,
 
         -- Boolean flags
-        EXTRACT(DAYOFWEEK FROM started_at) IN (1,7) as is_weekend,
+        {{ day_of_week('started_at') }} IN (1,7) as is_weekend,
         start_station_id = end_station_id as is_round_trip
 
     FROM unified_base
@@ -89,8 +101,10 @@ trips_enriched AS (
 trips_with_geography AS (
     SELECT
         t.*,
-        start_station.borough AS start_borough,
-        end_station.borough AS end_borough
+        -- Trips from stations missing in silver_stations fall back to the borough
+        -- of their coordinates, when ingestion assigned one
+        COALESCE(start_station.borough, t.start_point_borough) AS start_borough,
+        COALESCE(end_station.borough, t.end_point_borough) AS end_borough
 
     FROM trips_enriched t
 
@@ -102,38 +116,44 @@ trips_with_geography AS (
 ),
 
 duplicate_ride_ids AS (
+    -- Ride ids ingestion flagged as repeated within their month; trips loaded
+    -- before ingestion flagged them are still grouped here
     SELECT ride_id
     FROM trips_with_geography
+    WHERE ingest_duplicate_ride IS NOT FALSE
     GROUP BY ride_id
-    HAVING COUNT(*) > 1
+    HAVING COUNT(CASE WHEN ingest_duplicate_ride THEN 1 END) > 0 OR COUNT(*) > 1
 ),
 
 trips_with_data_quality_flags AS (
     SELECT
         t.*,
+        -- The flags come from ingestion (citibike.ingestion.quality); the expressions
+        -- below only run for trips loaded without them
+
         -- flag for temporal outliers
-        CASE WHEN
+        COALESCE(t.ingest_temporal_outlier, CASE WHEN
             t.trip_duration_seconds < 60 OR
             t.trip_duration_seconds > (60 * 60 * 24) OR
             t.started_at > {{ now_nyc_datetime() }} OR
             t.started_at < {{ citibike_inception_date() }} OR
             ended_at < started_at
-        THEN TRUE ELSE FALSE END AS is_temporal_outlier,
+        THEN TRUE ELSE FALSE END) AS is_temporal_outlier,
 
         -- flag for geographic issues (impossible lat/lng or null lat/lng)
-        (t.start_lat IS NULL OR
+        COALESCE(t.ingest_geography_quality_issue, (t.start_lat IS NULL OR
         t.start_lng IS NULL OR
         t.end_lat IS NULL OR
         t.end_lng IS NULL OR
         {{ is_geographic_outlier('t.start_lat', 't.start_lng') }} OR
-        {{ is_geographic_outlier('t.end_lat', 't.end_lng') }}) AS is_geography_quality_issue,
+        {{ is_geographic_outlier('t.end_lat', 't.end_lng') }})) AS is_geography_quality_issue,
 
         -- flag for data integrity issues
-        CASE WHEN
+        COALESCE(t.ingest_data_integrity_issue, CASE WHEN
             t.start_station_id IS NULL OR
             t.end_station_id IS NULL OR
             t.ride_id LIKE '%test%'
-        THEN TRUE ELSE FALSE END AS is_data_integrity_issue,
+        THEN TRUE ELSE FALSE END) AS is_data_integrity_issue,
 
         -- flag for potential duplicates
         (d.ride_id IS NOT NULL) AS is_duplicate_ride
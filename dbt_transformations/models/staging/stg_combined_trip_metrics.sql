@@ -10,7 +10,7 @@ WITH all_station_trip_metrics AS (
         AVG(CASE WHEN NOT is_temporal_outlier THEN trip_duration_seconds END) AS avg_trip_duration,
         MIN(DATE(station_event_time)) AS first_seen_in_trips,
         MAX(DATE(station_event_time)) AS last_seen_in_trips,
-        DATE_DIFF(MAX(DATE(station_event_time)), MIN(DATE(station_event_time)), DAY) + 1 AS days_in_trip_data
+        {{ date_diff('MAX(DATE(station_event_time))', 'MIN(DATE(station_event_time))', 'DAY') }} + 1 AS days_in_trip_data
     FROM (
         SELECT 
             start_station_id AS station_id,
@@ -31,8 +31,8 @@ missing_station_ids AS (
     WHERE s.short_name IS NULL
 ),
 
--- Reconstruct metadata for missing stations, except borough
-reconstructed_stations_without_boroughs AS (
+-- Reconstruct metadata for missing stations
+reconstructed_stations AS (
     SELECT 
         m.station_id,
         ANY_VALUE(CASE WHEN t.start_station_id = m.station_id THEN t.start_station_name END) AS station_name,
@@ -44,6 +44,10 @@ reconstructed_stations_without_boroughs AS (
                 THEN t.start_lat END) AS lat,
         AVG(CASE WHEN t.start_station_id = m.station_id AND NOT t.is_geography_quality_issue 
                 THEN t.start_lng END) AS lon,
+        -- silver_trips falls back to the borough of the start coordinates (if assigned at
+        -- ingestion) for stations missing in silver_stations
+        ANY_VALUE(CASE WHEN t.start_station_id = m.station_id AND NOT t.is_geography_quality_issue
+                THEN t.start_borough END) AS trip_borough,
         NULL AS capacity,
         CAST(NULL AS STRING) AS region_id,
         CAST(NULL AS STRING) AS station_type,
@@ -57,12 +61,17 @@ reconstructed_stations_without_boroughs AS (
 
 SELECT
     r.*,
-    COALESCE(bb.borough_name, 'Unknown') AS borough
+    COALESCE(r.trip_borough, bb.borough_name, 'Unknown') AS borough
 FROM
-    reconstructed_stations_without_boroughs r
+    reconstructed_stations r
 LEFT JOIN
     {{ ref('silver_nyc_borough_boundaries') }} bb
 ON
-    ST_WITHIN(ST_GEOGPOINT(r.lon, r.lat), bb.boundary_polygon)
+    -- only stations whose trips have no borough need the polygon test;
+    -- bounding boxes first, so it only runs for the boroughs around a station
+    r.trip_borough IS NULL
+    AND r.lon BETWEEN bb.min_lng AND bb.max_lng
+    AND r.lat BETWEEN bb.min_lat AND bb.max_lat
+    AND {{ point_within('r.lon', 'r.lat', 'bb.boundary_polygon') }}
 
 
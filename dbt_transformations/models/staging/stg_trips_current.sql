@@ -7,7 +7,7 @@ SELECT
     -- Timing (calculate duration from timestamps)
     started_at,
     ended_at, 
-    DATETIME_DIFF(ended_at, started_at, SECOND) as trip_duration_seconds,
+    {{ datetime_diff('ended_at', 'started_at', 'SECOND') }} as trip_duration_seconds,
     
     -- Station information (already in correct format)
     start_station_id,
@@ -20,6 +20,16 @@ SELECT
     start_lng,
     end_lat,
     end_lng,
+
+    -- Boroughs of the coordinates, if assigned at ingestion
+    start_borough as start_point_borough,
+    end_borough as end_point_borough,
+
+    -- Data-quality flags computed at ingestion (null for trips loaded before)
+    is_temporal_outlier as ingest_temporal_outlier,
+    is_geography_quality_issue as ingest_geography_quality_issue,
+    is_data_integrity_issue as ingest_data_integrity_issue,
+    is_duplicate_ride as ingest_duplicate_ride,
     
     -- User information
     member_casual,
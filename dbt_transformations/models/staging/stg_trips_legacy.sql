@@ -1,15 +1,20 @@
 {{ config(materialized='view') }}
 
+{# Trip fields hashed into the generated ride_id #}
+{% set ride_key -%}
+    CONCAT(
+        CAST(starttime AS STRING),
+        CAST(stoptime AS STRING),
+        CAST({{ adapter.quote('start station id') }} AS STRING),
+        CAST({{ adapter.quote('end station id') }} AS STRING),
+        CAST(bikeid AS STRING)
+    )
+{%- endset %}
+
 WITH legacy_trips_normalized AS (
     SELECT
         -- Generated deterministic ride_id
-        CONCAT('legacy_', TO_HEX(MD5(CONCAT(
-            CAST(starttime AS STRING),
-            CAST(stoptime AS STRING),
-            CAST(`start station id` AS STRING),
-            CAST(`end station id` AS STRING),
-            CAST(bikeid AS STRING)
-        )))) as ride_id,
+        CONCAT('legacy_', {{ md5_hex(ride_key) }}) as ride_id,
 
         -- Standardized timing columns
         starttime as started_at,
@@ -17,14 +22,24 @@ WITH legacy_trips_normalized AS (
         tripduration as trip_duration_seconds,
 
         -- Station information (standardized column names)
-        `start station name` as start_station_name,
-        `end station name` as end_station_name,
+        {{ adapter.quote('start station name') }} as start_station_name,
+        {{ adapter.quote('end station name') }} as end_station_name,
 
         -- Coordinates (standardized names to match current schema)
-        `start station latitude` as start_lat,
-        `start station longitude` as start_lng,
-        `end station latitude` as end_lat,
-        `end station longitude` as end_lng,
+        {{ adapter.quote('start station latitude') }} as start_lat,
+        {{ adapter.quote('start station longitude') }} as start_lng,
+        {{ adapter.quote('end station latitude') }} as end_lat,
+        {{ adapter.quote('end station longitude') }} as end_lng,
+
+        -- Boroughs of the coordinates, if assigned at ingestion
+        start_borough as start_point_borough,
+        end_borough as end_point_borough,
+
+        -- Data-quality flags computed at ingestion (null for trips loaded before)
+        is_temporal_outlier as ingest_temporal_outlier,
+        is_geography_quality_issue as ingest_geography_quality_issue,
+        is_data_integrity_issue as ingest_data_integrity_issue,
+        is_duplicate_ride as ingest_duplicate_ride,
 
         -- User information transformation to member_casual format
         CASE usertype
@@ -41,7 +56,7 @@ WITH legacy_trips_normalized AS (
         END as gender,
 
         CAST(bikeid AS STRING) as bike_id,
-        `birth year` as birth_year,
+        {{ adapter.quote('birth year') }} as birth_year,
 
         -- Columns found only in current schema
         CAST(NULL AS STRING) as rideable_type,
@@ -49,8 +64,8 @@ WITH legacy_trips_normalized AS (
         -- Debugging columns (preserve original station IDs)
         -- These will be fallback values in next step when we try to
         -- infer the post-2020 station id for the legacy trips
-        `start station id` as legacy_start_station_id,
-        `end station id` as legacy_end_station_id,
+        {{ adapter.quote('start station id') }} as legacy_start_station_id,
+        {{ adapter.quote('end station id') }} as legacy_end_station_id,
 
         -- Metadata
         'legacy' as data_source_schema,
@@ -74,6 +89,12 @@ legacy_trips_with_enriched_ids AS (
         t.start_lng,
         t.end_lat,
         t.end_lng,
+        t.start_point_borough,
+        t.end_point_borough,
+        t.ingest_temporal_outlier,
+        t.ingest_geography_quality_issue,
+        t.ingest_data_integrity_issue,
+        t.ingest_duplicate_ride,
         t.member_casual,
         t.gender,
         t.bike_id,
@@ -0,0 +1,73 @@
+import os
+from citibike.config import load_env_config
+from citibike.database.bigquery import initialize_bigquery_client
+import sys
+from glob import glob
+from pathlib import Path
+
+from create_tables import ENV_NAMES, TABLE_SUFFIXES, populate_create_table_query
+
+# Changes to tables created by an earlier version of the DDL templates, applied in
+# file name order. Unlike create_tables.py they keep the data already loaded, and
+# each can be rerun safely.
+MIGRATION_PATHS = sorted(glob("sql/migrations/templates/*.sql"))
+
+def run() -> None:
+    if len(sys.argv) < 2 or not sys.argv[1] in ENV_NAMES:
+        raise SystemExit("Usage: python migrate_tables.py <dev|prod>")
+    else:
+        env_name = sys.argv[1]
+
+    # Load environment configuration
+    load_env_config(env_name)
+
+    dataset_name = os.environ.get("BQ_DATASET")
+    project_id = os.environ.get("GCP_PROJECT_ID")
+
+    if not dataset_name or not project_id:
+        raise SystemExit(f"Missing required environment variables BQ_DATASET or GCP_PROJECT_ID. BQ_DATASET={dataset_name}, GCP_PROJECT_ID={project_id}")
+
+    client = initialize_bigquery_client()
+
+    print(f"The following migrations will be offered in env {env_name}, for the main and {TABLE_SUFFIXES[1:]} tables:")
+    for migration_path in MIGRATION_PATHS:
+        print(Path(migration_path).stem)
+
+    for migration_path in MIGRATION_PATHS:
+        migration_name = Path(migration_path).stem
+
+        with open(migration_path, "r") as f_in:
+            template_string = f_in.read()
+
+        for suffix in TABLE_SUFFIXES:
+            query = populate_create_table_query(template_string, project_id, dataset_name, suffix)
+
+            print("\n========================================")
+            print(f"{migration_name} ({dataset_name}, table suffix '{suffix}')")
+            print("========================================\n")
+
+            print("The following SQL will be run on BigQuery:")
+            for line in query.split("\n"):
+                print(line)
+
+            print("Does this look right? Enter y to proceed, or enter any other key to skip.")
+            proceed = input()
+
+            if proceed != 'y':
+                print("Skipping migration")
+                continue # move on to next table suffix
+
+            try:
+                job = client.query(query)
+                job.result() # Wait for completion, raise exception if failed
+                print(f"Successfully applied {migration_name}")
+
+            except Exception as e:
+                # Later migrations build on this one, so don't go on without it
+                raise SystemExit(f"Failed to apply {migration_name}: {e}")
+
+    print("Migrations complete.")
+
+
+if __name__ == "__main__":
+    run()
@@ -16,5 +16,8 @@ CREATE OR REPLACE TABLE `{project_id}.{dataset_name}.gold_network_node_analysis{
   pagerank_score FLOAT64,
   betweenness_centrality FLOAT64,
   closeness_centrality FLOAT64,
-  degree_centrality FLOAT64
+  degree_centrality FLOAT64,
+  pagerank_error_bound FLOAT64,
+  betweenness_standard_error FLOAT64,
+  closeness_error_bound FLOAT64
 );
\ No newline at end of file
@@ -0,0 +1,11 @@
+CREATE OR REPLACE TABLE `{project_id}.{dataset_name}.raw_free_bike_status{suffix}` (
+  bike_id STRING,
+  lat FLOAT64,
+  lon FLOAT64,
+  is_reserved BOOL,
+  is_disabled BOOL,
+  vehicle_type_id STRING,
+  api_last_updated TIMESTAMP,
+  _ingested_at TIMESTAMP
+)
+PARTITION BY DATE(_ingested_at);
\ No newline at end of file
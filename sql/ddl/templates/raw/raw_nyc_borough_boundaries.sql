@@ -2,7 +2,12 @@ CREATE OR REPLACE TABLE `{project_id}.{dataset_name}.raw_nyc_borough_boundaries{
   borough_code INT64 NOT NULL,
   borough_name STRING NOT NULL,
   feature_geojson STRING NOT NULL,      -- Complete GEOJSON feature as string
+  min_lng FLOAT64,                      -- Bounding box of the borough polygon (slightly padded)
+  min_lat FLOAT64,
+  max_lng FLOAT64,
+  max_lat FLOAT64,
+  _fingerprint STRING,                  -- Hash of the feature, to skip unchanged boroughs on re-ingestion
   _ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
 )
 PARTITION BY DATE(_ingested_at)
-CLUSTER BY borough_code;
\ No newline at end of file
+CLUSTER BY borough_code;
@@ -0,0 +1,5 @@
+CREATE OR REPLACE TABLE `{project_id}.{dataset_name}.raw_station_fingerprints{suffix}` (
+  station_id STRING,
+  fingerprint STRING,
+  last_changed_at DATETIME
+);
\ No newline at end of file
@@ -0,0 +1,16 @@
+CREATE OR REPLACE TABLE `{project_id}.{dataset_name}.raw_station_status{suffix}` (
+  station_id STRING,
+  num_bikes_available INT64,
+  num_ebikes_available INT64,
+  num_bikes_disabled INT64,
+  num_docks_available INT64,
+  num_docks_disabled INT64,
+  is_installed BOOL,
+  is_renting BOOL,
+  is_returning BOOL,
+  last_reported TIMESTAMP,
+  api_last_updated TIMESTAMP,
+  _ingested_at TIMESTAMP
+)
+PARTITION BY DATE(_ingested_at)
+CLUSTER BY station_id;
\ No newline at end of file
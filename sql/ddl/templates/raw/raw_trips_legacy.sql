@@ -15,7 +15,14 @@ CREATE OR REPLACE TABLE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}` (
   `birth year` INT64,                    -- Year of birth (nullable)
   gender INT64,                          -- 0=unknown, 1=male, 2=female (nullable)
   _ingested_at DATETIME DEFAULT CURRENT_DATETIME("America/New_York"),
-  _batch_key STRING                      -- YYYY-MM-batch_num
+  _batch_key STRING,                     -- YYYY-MM-batch_num
+  _batch_date DATE,                      -- DATE(_batch_key): one daily partition per batch
+  start_borough STRING,                  -- Borough of the start coordinates, if assigned at ingestion
+  end_borough STRING,                    -- Borough of the end coordinates, if assigned at ingestion
+  is_temporal_outlier BOOL,              -- Data-quality flags computed at ingestion (see silver_trips)
+  is_geography_quality_issue BOOL,
+  is_data_integrity_issue BOOL,
+  is_duplicate_ride BOOL                 -- Ride key repeated within the month's batches
 )
-PARTITION BY DATE(_ingested_at)
+PARTITION BY _batch_date
 CLUSTER BY `start station id`, starttime;
\ No newline at end of file
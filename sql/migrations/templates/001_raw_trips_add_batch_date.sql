@@ -0,0 +1,16 @@
+-- Raw trip tables created before _batch_date existed: add the column the trip
+-- loaders replace batches by, and fill it for the rows already loaded.
+-- Safe to rerun.
+ALTER TABLE `{project_id}.{dataset_name}.raw_trips_current{suffix}`
+  ADD COLUMN IF NOT EXISTS _batch_date DATE;
+
+UPDATE `{project_id}.{dataset_name}.raw_trips_current{suffix}`
+SET _batch_date = DATE(_batch_key)
+WHERE _batch_date IS NULL;
+
+ALTER TABLE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}`
+  ADD COLUMN IF NOT EXISTS _batch_date DATE;
+
+UPDATE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}`
+SET _batch_date = DATE(_batch_key)
+WHERE _batch_date IS NULL;
@@ -0,0 +1,39 @@
+-- Repartition raw trip tables created with PARTITION BY DATE(_ingested_at) on
+-- _batch_date, as TRIP_REPLACE_STRATEGY=partition_overwrite needs. Each table is
+-- copied into a new one partitioned on _batch_date, then the two are swapped;
+-- the original is kept as <table>__by_ingested_at until you drop it. Run after
+-- 001, and not while trips are being ingested. Skips tables already partitioned
+-- on _batch_date, so it is safe to rerun.
+IF NOT EXISTS (
+  SELECT 1 FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.COLUMNS`
+  WHERE table_name = 'raw_trips_current{suffix}' AND column_name = '_batch_date' AND is_partitioning_column = 'YES'
+) THEN
+  CREATE TABLE `{project_id}.{dataset_name}.raw_trips_current{suffix}__by_batch_date`
+  PARTITION BY _batch_date
+  CLUSTER BY start_station_id, started_at
+  AS SELECT * FROM `{project_id}.{dataset_name}.raw_trips_current{suffix}`;
+
+  ALTER TABLE `{project_id}.{dataset_name}.raw_trips_current{suffix}__by_batch_date`
+    ALTER COLUMN _ingested_at SET DEFAULT CURRENT_DATETIME("America/New_York");
+  ALTER TABLE `{project_id}.{dataset_name}.raw_trips_current{suffix}`
+    RENAME TO `raw_trips_current{suffix}__by_ingested_at`;
+  ALTER TABLE `{project_id}.{dataset_name}.raw_trips_current{suffix}__by_batch_date`
+    RENAME TO `raw_trips_current{suffix}`;
+END IF;
+
+IF NOT EXISTS (
+  SELECT 1 FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.COLUMNS`
+  WHERE table_name = 'raw_trips_legacy{suffix}' AND column_name = '_batch_date' AND is_partitioning_column = 'YES'
+) THEN
+  CREATE TABLE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}__by_batch_date`
+  PARTITION BY _batch_date
+  CLUSTER BY `start station id`, starttime
+  AS SELECT * FROM `{project_id}.{dataset_name}.raw_trips_legacy{suffix}`;
+
+  ALTER TABLE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}__by_batch_date`
+    ALTER COLUMN _ingested_at SET DEFAULT CURRENT_DATETIME("America/New_York");
+  ALTER TABLE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}`
+    RENAME TO `raw_trips_legacy{suffix}__by_ingested_at`;
+  ALTER TABLE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}__by_batch_date`
+    RENAME TO `raw_trips_legacy{suffix}`;
+END IF;
@@ -0,0 +1,10 @@
+-- Raw trip tables created before start_borough / end_borough existed: add them,
+-- nullable, so batches with boroughs assigned can be loaded. Rows already loaded
+-- keep null boroughs until their month is re-ingested. Safe to rerun.
+ALTER TABLE `{project_id}.{dataset_name}.raw_trips_current{suffix}`
+  ADD COLUMN IF NOT EXISTS start_borough STRING,
+  ADD COLUMN IF NOT EXISTS end_borough STRING;
+
+ALTER TABLE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}`
+  ADD COLUMN IF NOT EXISTS start_borough STRING,
+  ADD COLUMN IF NOT EXISTS end_borough STRING;
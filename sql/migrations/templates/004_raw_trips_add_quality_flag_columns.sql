@@ -0,0 +1,14 @@
+-- Raw trip tables created before ingestion computed the data-quality flags: add
+-- the flag columns, nullable. silver_trips computes the flags of rows already
+-- loaded itself, so they can stay null. Safe to rerun.
+ALTER TABLE `{project_id}.{dataset_name}.raw_trips_current{suffix}`
+  ADD COLUMN IF NOT EXISTS is_temporal_outlier BOOL,
+  ADD COLUMN IF NOT EXISTS is_geography_quality_issue BOOL,
+  ADD COLUMN IF NOT EXISTS is_data_integrity_issue BOOL,
+  ADD COLUMN IF NOT EXISTS is_duplicate_ride BOOL;
+
+ALTER TABLE `{project_id}.{dataset_name}.raw_trips_legacy{suffix}`
+  ADD COLUMN IF NOT EXISTS is_temporal_outlier BOOL,
+  ADD COLUMN IF NOT EXISTS is_geography_quality_issue BOOL,
+  ADD COLUMN IF NOT EXISTS is_data_integrity_issue BOOL,
+  ADD COLUMN IF NOT EXISTS is_duplicate_ride BOOL;